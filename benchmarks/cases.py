@@ -0,0 +1,153 @@
+from typing import Callable, Any
+from json import JSONDecodeError, dumps, loads
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pypdf import PdfReader, PdfWriter
+
+from libs.managers._outline_manager import _parse_and_get_raw_outlines, _organize_outlines, _process_raw_outlines
+from libs.managers.core_pdf_manager import CorePdfManager
+from libs.managers.types import Outline
+from benchmarks.suites import API_CASES
+
+VERSION = "benchmark"
+
+_EDIT_OPERATIONS = 10
+
+# content json.loads rejects, which the streaming content reader has to reject as well
+_MALFORMED_CONTENTS = (
+    '[{"page_num" 1, "title" "x", "child_nodes": null} {"page_num": 2, "title": "y", "child_nodes": null}]',
+    '[{"page_num": 1 "title": "x", "child_nodes": null}]',
+    '[{"page_num": 1, "title": "x", "child_nodes": null},]',
+    '[{"page_num": 1, "title": "x",}]',
+    '[{"page_num": 1, "title": "x", "child_nodes": [}]]',
+    '[{"page_num": 1, "title": "x", "child_nodes": null}] []',
+    '[{"page_num": 1, "title": "x", "child_nodes": null}',
+)
+
+# A case prepares its state from the corpus path and returns the operation to time
+Case = Callable[[str], Callable[[], Any]]
+
+
+def _load(path: str):
+    return lambda: CorePdfManager(path, VERSION).close()
+
+
+def _parse(path: str):
+    reader = PdfReader(path)
+    return lambda: sum(1 for _ in _parse_and_get_raw_outlines(reader))
+
+
+def _organize(path: str):
+    raw_outlines = [Outline(**outline) for outline in _parse_and_get_raw_outlines(PdfReader(path))]
+    return lambda: _organize_outlines(_process_raw_outlines(raw_outlines))
+
+
+def _jsonify(path: str):
+    manager = CorePdfManager(path, VERSION)
+    return manager.outlines.jsonify
+
+
+def _load_from_json(path: str):
+    manager = CorePdfManager(path, VERSION)
+    content = manager.outlines.jsonify()
+    assert content == dumps(loads(content), indent=2), "streamed content differs from json.dumps"
+    for malformed_content in _MALFORMED_CONTENTS:
+        try:
+            manager.outlines.load_from_json(malformed_content)
+        except JSONDecodeError:
+            continue
+
+        raise AssertionError(f"malformed content was read: {malformed_content}")
+
+    return lambda: manager.outlines.load_from_json(content)
+
+
+def _insert(path: str):
+    manager = CorePdfManager(path, VERSION)
+    page_count = manager.pages.count()
+
+    def run():
+        for i in range(_EDIT_OPERATIONS):
+            manager.outlines.insert(f"Inserted {i}", i * page_count // _EDIT_OPERATIONS + 1)
+
+    return run
+
+
+def _remove(path: str):
+    manager = CorePdfManager(path, VERSION)
+    outline_count = len(manager.outlines.snapshot())
+
+    def run():
+        # the last outline in page order is always a leaf
+        for outline_id in range(outline_count, max(0, outline_count - _EDIT_OPERATIONS), -1):
+            manager.outlines.remove(outline_id)
+
+    return run
+
+
+def _save(path: str):
+    manager = CorePdfManager(path, VERSION)
+    writer = PdfWriter()
+    manager.pages.save(writer)
+    return lambda: manager.outlines.save(writer)
+
+
+def _verify_saved_document(path: str, page_count: int, outline_count: int):
+    from pypdfium2 import PdfDocument
+
+    with open(path, "rb") as f:
+        reader = PdfReader(f)
+        # pypdf renumbers a cross-reference table that does not start at object 0 on every open
+        assert reader.xref_index == 0, "saved document cross-reference table is not zero-indexed"
+        assert len(reader.pages) == page_count, "saved document page count mismatch (pypdf)"
+        assert sum(1 for _ in _parse_and_get_raw_outlines(reader)) == outline_count, \
+            "saved document outline count mismatch (pypdf)"
+
+    pdfium_document = PdfDocument(path)
+    try:
+        assert len(pdfium_document) == page_count, "saved document page count mismatch (pdfium)"
+    finally:
+        pdfium_document.close()
+
+
+def _save_incremental(path: str):
+    manager = CorePdfManager(path, VERSION)
+    manager.outlines.insert("Inserted", 1)
+    output_dir = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, output_dir, True)
+    output = os.path.join(output_dir, "output.pdf")
+    # saves only read back the end of the update, so the whole output is opened with both libraries once here
+    manager.save(output, incremental=True)
+    _verify_saved_document(output, manager.pages.count(), len(manager.outlines.get_all()))
+    return lambda: manager.save(output, incremental=True)
+
+
+CASES: dict[str, Case] = {
+    "load": _load,
+    "outline.parse": _parse,
+    "outline.organize": _organize,
+    "outline.jsonify": _jsonify,
+    "outline.load_from_json": _load_from_json,
+    "outline.insert": _insert,
+    "outline.remove": _remove,
+    "outline.save": _save,
+    "save.incremental": _save_incremental,
+}
+assert tuple(CASES.keys()) == API_CASES, "benchmark cases are out of sync with the suite definition"
+
+
+def run_case(case: str, path: str):
+    operation = CASES[case](path)
+    started = time.perf_counter()
+    operation()
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    # invoked by the runner in a fresh process per measurement: python -m benchmarks.cases <case> <pdf>
+    print(dumps({"elapsed": run_case(sys.argv[1], sys.argv[2])}))
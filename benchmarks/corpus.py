@@ -0,0 +1,162 @@
+from random import Random
+import os
+import zlib
+
+import click
+from pypdf import PdfWriter
+from pypdf.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    NumberObject,
+    StreamObject,
+    create_string_object,
+)
+
+from benchmarks.suites import CorpusSpec
+
+_PAGE_WIDTH = 612
+_PAGE_HEIGHT = 792
+_IMAGE_SIZE = 128
+
+
+def _outline_levels(spec: CorpusSpec, rng: Random):
+    """
+    Pre-order outline levels. The first `depth` outlines form a chain so the requested depth is always reached,
+    the rest pick a random level no deeper than one below the previous outline.
+    """
+    levels: list[int] = []
+    for i in range(spec.outlines):
+        if i < spec.depth:
+            levels.append(i)
+        else:
+            levels.append(rng.randint(0, min(levels[-1] + 1, spec.depth - 1)))
+
+    return levels
+
+
+def _add_image(writer: PdfWriter, rng: Random):
+    image = StreamObject()
+    image.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Image"),
+        NameObject("/Width"): NumberObject(_IMAGE_SIZE),
+        NameObject("/Height"): NumberObject(_IMAGE_SIZE),
+        NameObject("/ColorSpace"): NameObject("/DeviceRGB"),
+        NameObject("/BitsPerComponent"): NumberObject(8),
+        NameObject("/Filter"): NameObject("/FlateDecode"),
+    })
+    image.set_data(zlib.compress(rng.randbytes(_IMAGE_SIZE * _IMAGE_SIZE * 3)))
+    return writer._add_object(image)
+
+
+def _add_pages(writer: PdfWriter, spec: CorpusSpec, rng: Random):
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    page_refs: list[IndirectObject] = []
+    for page_num in range(spec.pages):
+        page = writer.add_blank_page(_PAGE_WIDTH, _PAGE_HEIGHT)
+        resources = DictionaryObject({NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})})
+        operations = [f"BT /F1 24 Tf 72 720 Td (Page {page_num + 1}) Tj ET"]
+        operations.extend(
+            f"BT /F1 10 Tf 72 {690 - 14 * line} Td (Line {line} {rng.getrandbits(64):016x}) Tj ET"
+            for line in range(40)
+        )
+        if spec.images:
+            resources[NameObject("/XObject")] = DictionaryObject({NameObject("/Im1"): _add_image(writer, rng)})
+            operations.append(f"q {_IMAGE_SIZE * 2} 0 0 {_IMAGE_SIZE * 2} 72 72 cm /Im1 Do Q")
+
+        content = DecodedStreamObject()
+        content.set_data("\n".join(operations).encode())
+        page[NameObject("/Resources")] = resources
+        page[NameObject("/Contents")] = writer._add_object(content)
+        page_refs.append(page.indirect_reference)
+
+    return page_refs
+
+
+def _add_outlines(writer: PdfWriter, spec: CorpusSpec, rng: Random, page_refs: list[IndirectObject]):
+    """
+    Builds the outline dictionaries directly, since `PdfWriter.add_outline_item` updates every ancestor's count
+    recursively and gets slow (and eventually overflows the stack) for large and deep trees.
+    """
+    root = DictionaryObject({NameObject("/Type"): NameObject("/Outlines")})
+    root_ref = writer._add_object(root)
+    # (outline, reference, descendant count) from the root to the last added outline
+    path: list[list] = [[root, root_ref, 0]]
+    for index, level in enumerate(_outline_levels(spec, rng)):
+        while len(path) > level + 1:
+            _set_count(path.pop())
+
+        parent, parent_ref, _ = path[-1]
+        page_num = index * spec.pages // spec.outlines
+        outline = DictionaryObject({
+            NameObject("/Title"): create_string_object(f"Section {index + 1} (level {level + 1})"),
+            NameObject("/Parent"): parent_ref,
+            NameObject("/Dest"): ArrayObject([page_refs[page_num], NameObject("/Fit")]),
+        })
+        outline_ref = writer._add_object(outline)
+        if "/Last" in parent:
+            previous_ref = parent.raw_get("/Last")
+            previous_ref.get_object()[NameObject("/Next")] = outline_ref
+            outline[NameObject("/Prev")] = previous_ref
+        else:
+            parent[NameObject("/First")] = outline_ref
+
+        parent[NameObject("/Last")] = outline_ref
+        for ancestor in path:
+            ancestor[2] += 1
+
+        path.append([outline, outline_ref, 0])
+
+    while len(path) > 0:
+        _set_count(path.pop())
+
+    writer._root_object[NameObject("/Outlines")] = root_ref
+
+
+def _set_count(entry: list):
+    outline, _, count = entry
+    if count > 0:
+        outline[NameObject("/Count")] = NumberObject(count)
+
+
+def generate_pdf(spec: CorpusSpec, path: str):
+    """
+    Writes the document described by `spec` to `path`. The output only depends on `spec`, so the same spec always
+    produces the same bytes.
+    """
+    assert spec.pages > 0, "corpus needs at least one page"
+    assert spec.depth > 0, "outline depth should be greater than 0"
+    rng = Random(spec.seed)
+    writer = PdfWriter()
+    page_refs = _add_pages(writer, spec, rng)
+    if spec.outlines > 0:
+        _add_outlines(writer, spec, rng, page_refs)
+
+    writer.add_metadata({"/Title": f"Synthetic corpus {spec.name}", "/Author": "quick-pdf-editor benchmarks"})
+    temp_path = f"{path}.part"
+    with open(temp_path, "wb") as f:
+        writer.write(f)
+
+    os.replace(temp_path, path)
+
+
+@click.command()
+@click.option("--output", "-o", type=click.Path(), required=True, help="PDF output path")
+@click.option("--pages", type=click.IntRange(min=1), default=10, help="Number of pages")
+@click.option("--outlines", type=click.IntRange(min=0), default=10, help="Number of bookmarks")
+@click.option("--depth", type=click.IntRange(min=1), default=1, help="Bookmark tree depth")
+@click.option("--images", is_flag=True, default=False, help="Embed an image in every page")
+@click.option("--seed", type=int, default=0, help="Random seed")
+def cli_app(output, pages, outlines, depth, images, seed):
+    generate_pdf(CorpusSpec(pages=pages, outlines=outlines, depth=depth, images=images, seed=seed), output)
+
+
+if __name__ == '__main__':
+    cli_app()
@@ -0,0 +1,203 @@
+from typing import Optional, TypedDict
+from datetime import datetime, timezone
+from json import dumps, loads
+from statistics import median
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+
+from benchmarks.suites import API_CASES, CLI_CASES, SUITES, CorpusSpec
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS_DIR = os.path.join(REPO_ROOT, "benchmarks", ".corpus")
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "baseline.json")
+
+# timings below this many seconds are too noisy to flag as regressions
+_MIN_COMPARED_SECONDS = 0.05
+
+
+class BenchmarkResult(TypedDict):
+    case: str
+    corpus: str
+    file_bytes: int
+    wall_seconds: float
+    runs: list[float]
+    peak_rss_bytes: int
+
+
+class BenchmarkRegression(TypedDict):
+    case: str
+    corpus: str
+    metric: str
+    baseline: float
+    current: float
+    ratio: float
+
+
+def _rusage_bytes(max_rss: int):
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def _run_measured(command: list[str]):
+    """
+    Runs `command` to completion and returns (wall seconds, peak RSS bytes, stdout). The child is reaped with
+    `os.wait4` so the peak RSS is the child's own rather than the maximum over every child of this process.
+
+    Linux carries the high-water mark of the forking process over into the child's peak RSS, which is why this
+    module never imports pypdf or the managers and generates the corpus in a child process as well.
+    """
+    with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+        started = time.perf_counter()
+        process = subprocess.Popen(command, cwd=REPO_ROOT, stdout=stdout, stderr=stderr)
+        _, status, rusage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - started
+        process.returncode = os.waitstatus_to_exitcode(status)
+        stdout.seek(0)
+        stderr.seek(0)
+        assert process.returncode == 0, f"{' '.join(command)} failed: {stderr.read().decode(errors='replace')}"
+        return elapsed, _rusage_bytes(rusage.ru_maxrss), stdout.read().decode()
+
+
+def ensure_corpus(spec: CorpusSpec, corpus_dir: str):
+    path = os.path.join(corpus_dir, f"{spec.name}.pdf")
+    if not os.path.exists(path):
+        os.makedirs(corpus_dir, exist_ok=True)
+        _run_measured([
+            sys.executable, "-m", "benchmarks.corpus", "-o", path, "--pages", str(spec.pages),
+            "--outlines", str(spec.outlines), "--depth", str(spec.depth), "--seed", str(spec.seed),
+            *(["--images"] if spec.images else [])
+        ])
+
+    return path
+
+
+def _case_command(case: str, pdf_path: str, work_dir: str):
+    match case:
+        case "cli.export":
+            return [sys.executable, "main.py", "EXPORT-CONTENT", "--no-daemon", "-f", pdf_path,
+                    "-o", os.path.join(work_dir, "content.json")]
+        case "cli.update":
+            return [sys.executable, "main.py", "UPDATE-CONTENT", "--no-daemon", "-f", pdf_path,
+                    "-c", os.path.join(work_dir, "content.json"), "-o", os.path.join(work_dir, "output.pdf")]
+        case _:
+            return [sys.executable, "-m", "benchmarks.cases", case, pdf_path]
+
+
+def run_benchmark(case: str, spec: CorpusSpec, pdf_path: str, work_dir: str, repeat: int):
+    runs: list[float] = []
+    peak_rss = 0
+    for _ in range(repeat):
+        elapsed, rss, stdout = _run_measured(_case_command(case, pdf_path, work_dir))
+        # API cases report the timed operation alone, CLI cases are timed as a whole process
+        runs.append(loads(stdout).get("elapsed") if case not in CLI_CASES else elapsed)
+        peak_rss = max(peak_rss, rss)
+
+    return BenchmarkResult(
+        case=case,
+        corpus=spec.name,
+        file_bytes=os.path.getsize(pdf_path),
+        wall_seconds=round(median(runs), 6),
+        runs=[round(run, 6) for run in runs],
+        peak_rss_bytes=peak_rss
+    )
+
+
+def compare(results: list[BenchmarkResult], baseline: list[BenchmarkResult], time_threshold: float,
+            memory_threshold: float):
+    baseline_results = {(result.get("case"), result.get("corpus")): result for result in baseline}
+    regressions: list[BenchmarkRegression] = []
+    for result in results:
+        baseline_result = baseline_results.get((result.get("case"), result.get("corpus")))
+        if baseline_result is None:
+            continue
+
+        for metric, threshold in (("wall_seconds", time_threshold), ("peak_rss_bytes", memory_threshold)):
+            baseline_value, current_value = baseline_result.get(metric), result.get(metric)
+            if metric == "wall_seconds" and max(baseline_value, current_value) < _MIN_COMPARED_SECONDS:
+                continue
+
+            ratio = current_value / baseline_value if baseline_value > 0 else float("inf")
+            if ratio > 1 + threshold:
+                regressions.append(BenchmarkRegression(
+                    case=result.get("case"),
+                    corpus=result.get("corpus"),
+                    metric=metric,
+                    baseline=baseline_value,
+                    current=current_value,
+                    ratio=round(ratio, 3)
+                ))
+
+    return regressions
+
+
+def _format_result(result: BenchmarkResult, baseline: Optional[BenchmarkResult]):
+    line = f"{result.get('corpus'):<28} {result.get('case'):<24} {result.get('wall_seconds'):>10.4f}s " \
+           f"{result.get('peak_rss_bytes') / 1024 / 1024:>8.1f} MiB"
+    if baseline is not None and baseline.get("wall_seconds") > 0:
+        line += f"  ({result.get('wall_seconds') / baseline.get('wall_seconds'):.2f}x baseline)"
+
+    return line
+
+
+@click.command()
+@click.option("--suite", type=click.Choice(list(SUITES.keys())), default="quick", help="Corpus set to run")
+@click.option("--case", "case_filter", multiple=True, help="Only run cases starting with this prefix")
+@click.option("--repeat", type=click.IntRange(min=1), default=5, help="Runs per case, the median is reported")
+@click.option("--corpus-dir", type=click.Path(), default=DEFAULT_CORPUS_DIR, help="Generated corpus directory")
+@click.option("--output", "-o", type=click.Path(), help="Results JSON output path")
+@click.option("--baseline", type=click.Path(), default=DEFAULT_BASELINE, help="Baseline results JSON path")
+@click.option("--update-baseline", is_flag=True, default=False, help="Write the results as the new baseline")
+@click.option("--time-threshold", type=float, default=0.25, help="Allowed relative wall time increase")
+@click.option("--memory-threshold", type=float, default=0.10, help="Allowed relative peak RSS increase")
+def cli_app(suite, case_filter, repeat, corpus_dir, output, baseline, update_baseline, time_threshold,
+            memory_threshold):
+    cases = [case for case in (*API_CASES, *CLI_CASES) if
+             len(case_filter) == 0 or any(case.startswith(prefix) for prefix in case_filter)]
+    baseline_results: list[BenchmarkResult] = []
+    if os.path.exists(baseline) and not update_baseline:
+        with open(baseline, "r") as f:
+            baseline_results = loads(f.read()).get("results")
+
+    baseline_by_key = {(result.get("case"), result.get("corpus")): result for result in baseline_results}
+    results: list[BenchmarkResult] = []
+    for spec in SUITES[suite]:
+        pdf_path = ensure_corpus(spec, corpus_dir)
+        with tempfile.TemporaryDirectory() as work_dir:
+            # cli.update reads the content exported by cli.export
+            _run_measured(_case_command("cli.export", pdf_path, work_dir))
+            for case in cases:
+                result = run_benchmark(case, spec, pdf_path, work_dir, repeat)
+                results.append(result)
+                click.echo(_format_result(result, baseline_by_key.get((case, spec.name))), err=True)
+
+    report = {
+        "suite": suite,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results
+    }
+    for path in [output, baseline if update_baseline else None]:
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(dumps(report, indent=2) + "\n")
+
+    regressions = compare(results, baseline_results, time_threshold, memory_threshold)
+    for regression in regressions:
+        click.echo(
+            f"REGRESSION {regression.get('corpus')} {regression.get('case')} {regression.get('metric')}: "
+            f"{regression.get('baseline')} -> {regression.get('current')} ({regression.get('ratio')}x)",
+            err=True
+        )
+
+    if len(regressions) > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    cli_app()
@@ -0,0 +1,110 @@
+from typing import Optional, TypedDict, Callable, Any
+from random import Random
+import sys
+import time
+
+import click
+
+from benchmarks.corpus import _outline_levels
+from benchmarks.suites import CorpusSpec
+from libs.managers._outline_manager import _OutlineManager
+from libs.managers._outline_tree import _OutlineTree
+from libs.managers.types import Outline
+
+_PAGE_COUNT = 1000
+
+
+class ScalingResult(TypedDict):
+    operation: str
+    outlines: int
+    seconds: float
+
+
+def _raw_outlines(outline_count: int, depth: int, seed: int):
+    """
+    Raw outlines shaped like the benchmark corpus bookmarks, spread evenly over `_PAGE_COUNT` pages.
+    """
+    spec = CorpusSpec(pages=_PAGE_COUNT, outlines=outline_count, depth=depth, seed=seed)
+    parent_ids: list[Optional[int]] = [None] * depth
+    raw_outlines: list[Outline] = []
+    for index, level in enumerate(_outline_levels(spec, Random(seed))):
+        outline_id = index + 1
+        raw_outlines.append(Outline(
+            id=outline_id, title=f"Section {outline_id}", page_num=index * _PAGE_COUNT // outline_count,
+            parent_id=parent_ids[level - 1] if level > 0 else None
+        ))
+        parent_ids[level] = outline_id
+
+    return raw_outlines
+
+
+def _measure(operation: Callable[[], Any], repeat: int, prepare: Callable[[], Any] = lambda: None):
+    # the fastest run is the least disturbed by the rest of the machine
+    best = float("inf")
+    for _ in range(repeat):
+        prepare()
+        started = time.perf_counter()
+        operation()
+        best = min(best, time.perf_counter() - started)
+
+    return best
+
+
+def run_scaling(outline_count: int, depth: int, repeat: int, seed: int):
+    raw_outlines = _raw_outlines(outline_count, depth, seed)
+    manager = _OutlineManager(lambda: _PAGE_COUNT, _OutlineTree())
+
+    def reload():
+        manager.load_raw(raw_outlines)
+
+    # the last outline in page order is always a leaf
+    operations: dict[str, tuple[Callable[[], Any], Callable[[], Any]]] = {
+        "load": (reload, lambda: None),
+        "jsonify": (manager.jsonify, reload),
+        "insert": (lambda: manager.insert("Inserted", _PAGE_COUNT // 2), reload),
+        "remove": (lambda: manager.remove(outline_count), reload),
+    }
+    return [
+        ScalingResult(operation=operation, outlines=outline_count, seconds=round(_measure(run, repeat, prepare), 6))
+        for operation, (run, prepare) in operations.items()
+    ]
+
+
+@click.command()
+@click.option("--sizes", type=click.IntRange(min=1), multiple=True, default=[10_000, 100_000],
+              help="Outline counts to measure, smallest first")
+@click.option("--depth", type=click.IntRange(min=1), default=3, help="Outline tree depth")
+@click.option("--repeat", type=click.IntRange(min=1), default=3, help="Runs per operation, the fastest is reported")
+@click.option("--seed", type=int, default=0, help="Random seed of the outline tree shape")
+@click.option("--max-excess", type=float, default=1.0,
+              help="Allowed growth beyond linear between two sizes, 1.0 allows twice the linear growth")
+def cli_app(sizes, depth, repeat, seed, max_excess):
+    """
+    Measures how the outline operations scale with the number of outlines, and fails when any of them grows more
+    than near-linearly from one size to the next. Quadratic bookkeeping grows 100x from 10k to 100k outlines,
+    while the expected O(n log n) grows about 12x.
+    """
+    sizes = sorted(sizes)
+    results = [result for size in sizes for result in run_scaling(size, depth, repeat, seed)]
+    failed = False
+    for operation in dict.fromkeys(result.get("operation") for result in results):
+        timings = [result for result in results if result.get("operation") == operation]
+        line = f"{operation:<10}" + "".join(
+            f" {timing.get('outlines'):>8}: {timing.get('seconds'):>8.4f}s" for timing in timings
+        )
+        for smaller, larger in zip(timings, timings[1:]):
+            growth = larger.get("seconds") / max(smaller.get("seconds"), 1e-9)
+            linear_growth = larger.get("outlines") / smaller.get("outlines")
+            line += f"  ({growth:.1f}x for {linear_growth:.0f}x outlines)"
+            if growth > linear_growth * (1 + max_excess):
+                failed = True
+                line += " REGRESSION"
+
+        click.echo(line, err=True)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    cli_app()
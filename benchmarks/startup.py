@@ -0,0 +1,194 @@
+from typing import TypedDict
+from datetime import datetime, timezone
+from json import dumps, loads
+from statistics import median
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+
+from benchmarks.run import REPO_ROOT, DEFAULT_CORPUS_DIR, ensure_corpus
+from benchmarks.suites import STARTUP_CASES, SUITES
+
+DEFAULT_STARTUP_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "startup_baseline.json")
+
+# startup is short enough that timings below this many seconds are still worth comparing
+_MIN_COMPARED_SECONDS = 0.01
+
+
+class StartupResult(TypedDict):
+    case: str
+    wall_seconds: float
+    import_seconds: float
+    modules: int
+    heavy_modules: list[str]
+    runs: list[float]
+
+
+class StartupRegression(TypedDict):
+    case: str
+    metric: str
+    baseline: float
+    current: float
+    ratio: float
+
+
+def _startup_command(case: str, pdf_path: str, work_dir: str):
+    match case:
+        case "startup.help":
+            return ["main.py", "--help"]
+        case "startup.export":
+            return ["main.py", "EXPORT-CONTENT", "--no-daemon", "-f", pdf_path,
+                    "-o", os.path.join(work_dir, "content.json")]
+        case "startup.export.cached":
+            return ["main.py", "EXPORT-CONTENT", "--no-daemon", "-f", pdf_path,
+                    "-o", os.path.join(work_dir, "content.json"), "--cache-dir", os.path.join(work_dir, "cache")]
+        case _:
+            raise AssertionError(f"unsupported case '{case}'")
+
+
+def _run(arguments: list[str]):
+    started = time.perf_counter()
+    process = subprocess.run([sys.executable, *arguments], cwd=REPO_ROOT, capture_output=True)
+    elapsed = time.perf_counter() - started
+    assert process.returncode == 0, f"{' '.join(arguments)} failed: {process.stderr.decode(errors='replace')}"
+    return elapsed, process.stderr.decode(errors="replace")
+
+
+def _read_import_times(report: str):
+    """
+    Returns the total import time in seconds and the imported modules from a `-X importtime` report, whose lines
+    read `import time: <self us> | <cumulative us> | <indented module name>`.
+    """
+    total = 0
+    modules: list[str] = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        self_us, _, module = line[len("import time:"):].split("|")
+        total += int(self_us)
+        modules.append(module.strip())
+
+    return total / 1_000_000, modules
+
+
+def run_startup_benchmark(case: str, command: list[str], repeat: int):
+    # the first run compiles the bytecode and fills the parse cache of the cached case
+    _run(command)
+    runs: list[float] = []
+    import_runs: list[float] = []
+    modules: list[str] = []
+    for _ in range(repeat):
+        runs.append(_run(command)[0])
+        # timed apart, as the report itself slows the imports down
+        import_seconds, modules = _read_import_times(_run(["-X", "importtime", *command])[1])
+        import_runs.append(import_seconds)
+
+    return StartupResult(
+        case=case,
+        wall_seconds=round(median(runs), 6),
+        import_seconds=round(median(import_runs), 6),
+        modules=len(modules),
+        heavy_modules=sorted({module.split(".")[0] for module in modules} & set(STARTUP_CASES[case])),
+        runs=[round(run, 6) for run in runs]
+    )
+
+
+def compare(results: list[StartupResult], baseline: list[StartupResult], time_threshold: float):
+    baseline_results = {result.get("case"): result for result in baseline}
+    regressions: list[StartupRegression] = []
+    for result in results:
+        baseline_result = baseline_results.get(result.get("case"))
+        if baseline_result is None:
+            continue
+
+        for metric in ("wall_seconds", "import_seconds"):
+            baseline_value, current_value = baseline_result.get(metric), result.get(metric)
+            if max(baseline_value, current_value) < _MIN_COMPARED_SECONDS:
+                continue
+
+            ratio = current_value / baseline_value if baseline_value > 0 else float("inf")
+            if ratio > 1 + time_threshold:
+                regressions.append(StartupRegression(
+                    case=result.get("case"),
+                    metric=metric,
+                    baseline=baseline_value,
+                    current=current_value,
+                    ratio=round(ratio, 3)
+                ))
+
+    return regressions
+
+
+def _format_result(result: StartupResult):
+    line = f"{result.get('case'):<24} {result.get('wall_seconds'):>8.4f}s wall {result.get('import_seconds'):>8.4f}s " \
+           f"imports {result.get('modules'):>5} modules"
+    if len(result.get("heavy_modules")) > 0:
+        line += f"  (imports {', '.join(result.get('heavy_modules'))})"
+
+    return line
+
+
+@click.command()
+@click.option("--case", "case_filter", multiple=True, help="Only run cases starting with this prefix")
+@click.option("--repeat", type=click.IntRange(min=1), default=10, help="Runs per case, the median is reported")
+@click.option("--corpus-dir", type=click.Path(), default=DEFAULT_CORPUS_DIR, help="Generated corpus directory")
+@click.option("--output", "-o", type=click.Path(), help="Results JSON output path")
+@click.option("--baseline", type=click.Path(), default=DEFAULT_STARTUP_BASELINE, help="Baseline results JSON path")
+@click.option("--update-baseline", is_flag=True, default=False, help="Write the results as the new baseline")
+@click.option("--time-threshold", type=float, default=0.25, help="Allowed relative wall and import time increase")
+def cli_app(case_filter, repeat, corpus_dir, output, baseline, update_baseline, time_threshold):
+    """
+    Measures how long the command line takes to start: the wall time of whole runs in fresh processes, and the
+    import time reported by `-X importtime`. Fails when either regresses against the baseline, or when a case
+    imports a module it should not (see `STARTUP_CASES`).
+    """
+    cases = [case for case in STARTUP_CASES if
+             len(case_filter) == 0 or any(case.startswith(prefix) for prefix in case_filter)]
+    baseline_results: list[StartupResult] = []
+    if os.path.exists(baseline) and not update_baseline:
+        with open(baseline, "r") as f:
+            baseline_results = loads(f.read()).get("results")
+
+    pdf_path = ensure_corpus(SUITES["quick"][0], corpus_dir)
+    results: list[StartupResult] = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for case in cases:
+            result = run_startup_benchmark(case, _startup_command(case, pdf_path, work_dir), repeat)
+            results.append(result)
+            click.echo(_format_result(result), err=True)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results
+    }
+    for path in [output, baseline if update_baseline else None]:
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(dumps(report, indent=2) + "\n")
+
+    regressions = compare(results, baseline_results, time_threshold)
+    for regression in regressions:
+        click.echo(
+            f"REGRESSION {regression.get('case')} {regression.get('metric')}: "
+            f"{regression.get('baseline')} -> {regression.get('current')} ({regression.get('ratio')}x)",
+            err=True
+        )
+
+    heavy_results = [result for result in results if len(result.get("heavy_modules")) > 0]
+    for result in heavy_results:
+        click.echo(f"REGRESSION {result.get('case')} imports {', '.join(result.get('heavy_modules'))}", err=True)
+
+    if len(regressions) > 0 or len(heavy_results) > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    cli_app()
@@ -0,0 +1,49 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class CorpusSpec:
+    pages: int
+    outlines: int
+    depth: int = 1
+    images: bool = False
+    seed: int = 0
+
+    @property
+    def name(self):
+        return f"p{self.pages}-o{self.outlines}-d{self.depth}{'-img' if self.images else ''}-s{self.seed}"
+
+
+API_CASES = (
+    "load",
+    "outline.parse",
+    "outline.organize",
+    "outline.jsonify",
+    "outline.load_from_json",
+    "outline.insert",
+    "outline.remove",
+    "outline.save",
+    "save.incremental",
+)
+CLI_CASES = ("cli.export", "cli.update")
+# startup cases and the modules each of them must not import: --help loads no PDF library, and exporting an outline
+# loads neither the renderer nor the process pool and, without a parse cache, not the cache database either
+STARTUP_CASES: dict[str, tuple[str, ...]] = {
+    "startup.help": ("pypdf", "pypdfium2", "PIL", "multiprocessing", "sqlite3"),
+    "startup.export": ("pypdfium2", "multiprocessing", "sqlite3"),
+    "startup.export.cached": ("pypdfium2", "multiprocessing"),
+}
+
+SUITES: dict[str, list[CorpusSpec]] = {
+    "quick": [
+        CorpusSpec(pages=50, outlines=200, depth=3),
+        CorpusSpec(pages=20, outlines=20, depth=2, images=True),
+    ],
+    "full": [
+        CorpusSpec(pages=50, outlines=200, depth=3),
+        CorpusSpec(pages=20, outlines=20, depth=2, images=True),
+        CorpusSpec(pages=2000, outlines=10000, depth=4),
+        CorpusSpec(pages=200, outlines=2000, depth=500),
+        CorpusSpec(pages=1000, outlines=100000, depth=3),
+    ],
+}
@@ -0,0 +1,80 @@
+from typing import Literal, Optional, get_args
+
+from libs.core_quick_pdf import CoreQuickPdf
+from libs.managers._heading_detector import HeadingOptions
+from libs.managers._outline_json import ContentFormat
+from libs.managers._outline_manager import DeletedPagePolicy
+from libs.managers._output_optimizer import OptimizeProfile
+from libs.managers._page_manager import parse_page_ranges
+
+DocumentAction = Literal["EXPORT-CONTENT", "UPDATE-CONTENT", "PATCH-CONTENT"]
+PageAction = Literal["REORDER-PAGES", "DELETE-PAGES", "INSERT-PAGES"]
+
+DOCUMENT_ACTIONS: tuple[DocumentAction, ...] = get_args(DocumentAction)
+PAGE_ACTIONS: tuple[PageAction, ...] = get_args(PageAction)
+
+
+def run_document_action(core: CoreQuickPdf, action: DocumentAction, file: str, output: str,
+                        content: Optional[str] = None, incremental: bool = False,
+                        content_format: Optional[ContentFormat] = None, optimize: Optional[OptimizeProfile] = None):
+    """
+    Returns the `SaveReport` of actions that save a document.
+    """
+    match action:
+        case "EXPORT-CONTENT":
+            core.load_pdf(file)
+            core.export_pdf_content(output, content_format)
+        case "UPDATE-CONTENT":
+            assert content is not None, "content file is required"
+            core.load_pdf(file)
+            core.load_pdf_content(content, content_format)
+            return core.export_pdf(output, incremental=incremental, optimize=optimize or "none")
+        case "PATCH-CONTENT":
+            assert content is not None, "content file is required"
+            core.load_pdf(file)
+            core.patch_pdf_content(content, content_format)
+            return core.export_pdf(output, incremental=incremental, optimize=optimize or "none")
+        case _:
+            raise AssertionError(f"unsupported action '{action}'")
+
+
+def run_page_action(core: CoreQuickPdf, action: PageAction, file: str, output: str, page_ranges: Optional[str] = None,
+                    source: Optional[str] = None, position: Optional[int] = None,
+                    deleted_page_policy: DeletedPagePolicy = "drop", incremental: bool = False,
+                    optimize: Optional[OptimizeProfile] = None):
+    """
+    For INSERT-PAGES `page_ranges` selects the pages of `source`, otherwise the pages of `file`.
+    """
+    core.load_pdf(file)
+    match action:
+        case "REORDER-PAGES":
+            assert page_ranges is not None, "page order is required"
+            page_nums = parse_page_ranges(page_ranges, core.pages.count())
+            assert sorted(page_nums) == list(range(1, core.pages.count() + 1)), \
+                "page order should list every page exactly once"
+            core.reorder_pages(page_nums, deleted_page_policy)
+        case "DELETE-PAGES":
+            assert page_ranges is not None, "pages to delete are required"
+            core.delete_pages(parse_page_ranges(page_ranges, core.pages.count()), deleted_page_policy)
+        case "INSERT-PAGES":
+            assert source is not None, "source file is required"
+            core.insert_pages(source, page_ranges, position)
+        case _:
+            raise AssertionError(f"unsupported action '{action}'")
+
+    return core.export_pdf(output, incremental=incremental, optimize=optimize or "none")
+
+
+def run_generate_action(core: CoreQuickPdf, file: str, output: str, options: HeadingOptions = HeadingOptions(),
+                        workers: Optional[int] = None, incremental: bool = False,
+                        content_format: Optional[ContentFormat] = None, optimize: Optional[OptimizeProfile] = None):
+    """
+    Generates the outlines of `file` from its headings and saves them to `output`: as a document with the new
+    outlines when `output` is a PDF file, otherwise as content. Returns the `SaveReport` of a saved document.
+    """
+    core.load_pdf(file)
+    core.generate_pdf_content(options, workers)
+    if output.lower().endswith(".pdf"):
+        return core.export_pdf(output, incremental=incremental, optimize=optimize or "none")
+
+    core.export_pdf_content(output, content_format)
@@ -0,0 +1,174 @@
+from typing import Optional, Callable, TypeVar, Any
+from asyncio import AbstractEventLoop, Future, Lock, Semaphore
+from concurrent.futures import Executor, ProcessPoolExecutor
+from weakref import WeakKeyDictionary
+import asyncio
+import os
+
+from libs.core_actions import DocumentAction, run_document_action
+from libs.core_quick_pdf import CoreQuickPdf
+from libs.managers._outline_json import ContentFormat, _content_format
+from libs.managers._output_optimizer import OptimizeProfile
+from libs.managers._parse_cache import _DEFAULT_PARSE_CACHE_BYTES
+
+T = TypeVar("T")
+
+_max_concurrency = os.cpu_count() or 1
+# asyncio primitives belong to the loop they are first used on, so every loop gets its own limit
+_semaphores: WeakKeyDictionary[AbstractEventLoop, Semaphore] = WeakKeyDictionary()
+
+
+def set_max_concurrency(max_concurrency: int):
+    """
+    Limits how many operations of all `AsyncQuickPdf` instances run at once on every event loop (the number of CPU
+    cores by default). Operations over the limit wait for a running one to finish.
+    """
+    global _max_concurrency
+    assert max_concurrency > 0, "max concurrency should be greater than 0"
+    _max_concurrency = max_concurrency
+    _semaphores.clear()
+
+
+def _get_semaphore():
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = Semaphore(_max_concurrency)
+
+    return semaphore
+
+
+def _temp_output(output: str):
+    return f"{output}.part"
+
+
+def _run_action(version: str, cache_dir: Optional[str], cache_max_bytes: int, action: DocumentAction, file: str,
+                output: str, content: Optional[str], incremental: bool, content_format: Optional[ContentFormat],
+                optimize: Optional[OptimizeProfile]):
+    core = CoreQuickPdf(version, cache_dir=cache_dir, cache_max_bytes=cache_max_bytes)
+    try:
+        return run_document_action(core, action, file, output, content, incremental, content_format, optimize)
+    finally:
+        core.close()
+
+
+class AsyncQuickPdf:
+    """
+    An asyncio facade of `CoreQuickPdf`. Every call runs on an executor, so parsing and writing never block the
+    event loop:
+
+        async with AsyncQuickPdf(VERSION) as pdf:
+            await pdf.load_pdf(path)
+            await pdf.export_pdf_content(output)
+
+    The document state lives in this process, so the methods that work on the loaded document run on `executor`,
+    a thread pool (the loop's default executor by default), one at a time per instance. `run` performs a whole
+    document action without touching that state and runs on `run_executor`, which can be a process pool.
+
+    Outputs are written to a temporary file that replaces the output once the write succeeds. A cancelled call
+    returns right away, but a write that already started cannot be interrupted: it keeps the instance and its
+    concurrency slot until it finishes, and its temporary file is removed instead of replacing the output.
+    """
+
+    def __init__(self, version: str, executor: Optional[Executor] = None, run_executor: Optional[Executor] = None,
+                 cache_dir: Optional[str] = None, cache_max_bytes: int = _DEFAULT_PARSE_CACHE_BYTES):
+        assert not isinstance(executor, ProcessPoolExecutor), \
+            "document state cannot be shared with other processes, use run_executor for process pools"
+        self._version = version
+        self._executor = executor
+        self._run_executor = run_executor or executor
+        self._cache_options = (cache_dir, cache_max_bytes)
+        self._core = CoreQuickPdf(version, cache_dir=cache_dir, cache_max_bytes=cache_max_bytes)
+        self._lock = Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+    async def _submit(self, executor: Optional[Executor], function: Callable[..., T], *args: Any,
+                      lock: Optional[Lock] = None, output: Optional[str] = None) -> T:
+        """
+        Runs `function` on `executor` once `lock` and a concurrency slot are free. With `output`, `function` writes
+        to the temporary output, which replaces `output` unless the call failed or was cancelled.
+        """
+        semaphore = _get_semaphore()
+        if lock is not None:
+            await lock.acquire()
+
+        try:
+            await semaphore.acquire()
+        except BaseException:
+            if lock is not None:
+                lock.release()
+            raise
+
+        cancelled = False
+
+        def finish(future: Future):
+            semaphore.release()
+            if lock is not None:
+                lock.release()
+
+            if output is None:
+                return
+            if not cancelled and not future.cancelled() and future.exception() is None:
+                os.replace(_temp_output(output), output)
+            elif os.path.exists(_temp_output(output)):
+                os.remove(_temp_output(output))
+
+        try:
+            future = asyncio.get_running_loop().run_in_executor(executor, function, *args)
+        except BaseException:
+            semaphore.release()
+            if lock is not None:
+                lock.release()
+            raise
+
+        # registered before the caller awaits the future, so the output is in place by the time the caller resumes
+        future.add_done_callback(finish)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+
+    async def _call(self, function: Callable[..., T], *args: Any, output: Optional[str] = None) -> T:
+        return await self._submit(self._executor, function, *args, lock=self._lock, output=output)
+
+    async def load_pdf(self, path: str):
+        await self._call(self._core.load_pdf, path)
+
+    async def load_pdf_content(self, path: str, content_format: Optional[ContentFormat] = None):
+        await self._call(self._core.load_pdf_content, path, content_format)
+
+    async def patch_pdf_content(self, path: str, content_format: Optional[ContentFormat] = None):
+        await self._call(self._core.patch_pdf_content, path, content_format)
+
+    async def export_pdf_content(self, path: str, content_format: Optional[ContentFormat] = None):
+        # the format is picked from the real output path, not the temporary one
+        await self._call(
+            self._core.export_pdf_content, _temp_output(path), _content_format(path, content_format), output=path
+        )
+
+    async def export_pdf(self, path: str, incremental: bool = False, optimize: OptimizeProfile = "none"):
+        return await self._call(self._core.export_pdf, _temp_output(path), incremental, optimize, output=path)
+
+    async def run(self, action: DocumentAction, file: str, output: str, content: Optional[str] = None,
+                  incremental: bool = False, content_format: Optional[ContentFormat] = None,
+                  optimize: Optional[OptimizeProfile] = None):
+        """
+        Runs a whole document action (see `run_document_action`) on `run_executor`, independently of the document
+        loaded in this instance.
+        """
+        if action == "EXPORT-CONTENT":
+            content_format = _content_format(output, content_format)
+
+        return await self._submit(
+            self._run_executor, _run_action, self._version, *self._cache_options, action, file, _temp_output(output),
+            content, incremental, content_format, optimize, output=output
+        )
+
+    async def close(self):
+        await self._call(self._core.close)
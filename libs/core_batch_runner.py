@@ -0,0 +1,183 @@
+from typing import Optional, TypedDict, Iterable, Iterator, NotRequired, get_args
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from json import loads, JSONDecodeError
+from time import perf_counter
+import os
+
+from libs.core_actions import DocumentAction, DOCUMENT_ACTIONS, run_document_action
+from libs.core_quick_pdf import CoreQuickPdf
+from libs.managers._outline_json import ContentFormat, _content_format
+from libs.managers._output_optimizer import OptimizeProfile
+from libs.managers._parse_cache import _DEFAULT_PARSE_CACHE_BYTES
+
+
+class BatchJob(TypedDict):
+    action: DocumentAction
+    input: str
+    output: str
+    content: NotRequired[Optional[str]]
+    incremental: NotRequired[bool]
+    format: NotRequired[Optional[ContentFormat]]
+    optimize: NotRequired[Optional[OptimizeProfile]]
+
+
+class BatchResult(TypedDict):
+    index: int
+    action: Optional[str]
+    input: Optional[str]
+    output: Optional[str]
+    status: str
+    error: Optional[str]
+    elapsed: float
+    bytes_written: int
+
+
+def _result(index: int, job: dict, status: str, error: Optional[str] = None, elapsed: float = 0,
+            bytes_written: int = 0):
+    return BatchResult(
+        index=index,
+        action=job.get("action"),
+        input=job.get("input"),
+        output=job.get("output"),
+        status=status,
+        error=error,
+        elapsed=round(elapsed, 6),
+        bytes_written=bytes_written
+    )
+
+
+def _verify_job(job: dict):
+    assert isinstance(job, dict), "job should be a JSON object"
+    assert job.get("action") in DOCUMENT_ACTIONS, f"action should be one of {', '.join(DOCUMENT_ACTIONS)}"
+    assert isinstance(job.get("input"), str), "input is required"
+    assert isinstance(job.get("output"), str), "output is required"
+    assert job.get("action") not in ("UPDATE-CONTENT", "PATCH-CONTENT") or isinstance(job.get("content"), str), \
+        "content is required"
+    assert job.get("format") in (None, *get_args(ContentFormat)), "format should be json or jsonl"
+    assert job.get("optimize") in (None, *get_args(OptimizeProfile)), "optimize should be none, fast or max"
+    return BatchJob(**job)
+
+
+def _run_job(index: int, job: BatchJob, version: str, cache_dir: Optional[str], cache_max_bytes: int):
+    started_at = perf_counter()
+    temp_output = f"{job.get('output')}.part"
+    # exported content takes the format of the real output path, not the temporary one
+    content_format = _content_format(job.get("output"), job.get("format")) \
+        if job.get("action") == "EXPORT-CONTENT" else job.get("format")
+    core = CoreQuickPdf(version, cache_dir=cache_dir, cache_max_bytes=cache_max_bytes)
+    try:
+        run_document_action(
+            core, job.get("action"), job.get("input"), temp_output, job.get("content"), job.get("incremental", False),
+            content_format, job.get("optimize")
+        )
+        core.close()
+        os.replace(temp_output, job.get("output"))
+        return _result(index, job, "ok", elapsed=perf_counter() - started_at,
+                       bytes_written=os.path.getsize(job.get("output")))
+    except Exception as e:
+        core.close()
+        if os.path.exists(temp_output):
+            os.remove(temp_output)
+
+        return _result(index, job, "error", error=f"{type(e).__name__}: {e}", elapsed=perf_counter() - started_at)
+
+
+def read_manifest(lines: Iterable[str]):
+    for index, line in enumerate(lines):
+        if len(line.strip()) == 0:
+            continue
+
+        try:
+            yield index, loads(line)
+        except JSONDecodeError as e:
+            yield index, e
+
+
+class CoreBatchRunner:
+    """
+    Runs document jobs on a process pool, keeping at most `max_in_flight` jobs submitted at a time.
+
+    Every job writes to a temporary file that replaces its output once the job succeeds, so an existing output
+    always belongs to a completed job and `resume` can skip it. A job that crashes its worker process is retried
+    on a fresh pool up to `max_retries` times before it is reported as failed.
+    """
+
+    def __init__(self, version: str, workers: Optional[int] = None, max_in_flight: Optional[int] = None,
+                 resume: bool = False, max_retries: int = 1, cache_dir: Optional[str] = None,
+                 cache_max_bytes: int = _DEFAULT_PARSE_CACHE_BYTES):
+        # the arguments every job runs with after its index and job
+        self._job_options = (version, cache_dir, cache_max_bytes)
+        self._workers = workers or os.cpu_count() or 1
+        self._max_in_flight = max_in_flight or self._workers * 2
+        self._resume = resume
+        self._max_retries = max_retries
+        assert self._workers > 0, "workers should be greater than 0"
+        assert self._max_in_flight > 0, "max in-flight jobs should be greater than 0"
+
+    def run(self, manifest: Iterable[tuple[int, dict | Exception]]) -> Iterator[BatchResult]:
+        manifest = iter(manifest)
+        retries: deque[tuple[int, BatchJob, int]] = deque()
+        in_flight: dict[Future, tuple[int, BatchJob, int]] = {}
+        executor = ProcessPoolExecutor(max_workers=self._workers)
+        try:
+            while True:
+                while len(in_flight) < self._max_in_flight:
+                    if len(retries) > 0:
+                        # jobs caught in a crashed pool run one at a time, so a repeated crash is attributable
+                        if len(in_flight) > 0:
+                            break
+
+                        index, job, attempt = retries.popleft()
+                        in_flight[executor.submit(_run_job, index, job, *self._job_options)] = (index, job, attempt)
+                        break
+
+                    entry = next(manifest, None)
+                    if entry is None:
+                        break
+
+                    index, raw_job = entry
+                    if isinstance(raw_job, Exception):
+                        yield _result(index, {}, "error", error=f"{type(raw_job).__name__}: {raw_job}")
+                        continue
+
+                    try:
+                        job = _verify_job(raw_job)
+                    except AssertionError as e:
+                        yield _result(index, raw_job if isinstance(raw_job, dict) else {}, "error", error=str(e))
+                        continue
+
+                    if self._resume and os.path.exists(job.get("output")):
+                        yield _result(index, job, "skipped")
+                        continue
+
+                    in_flight[executor.submit(_run_job, index, job, *self._job_options)] = (index, job, 0)
+
+                if len(in_flight) == 0:
+                    break
+
+                done, _ = wait(in_flight.keys(), return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        continue
+
+                    in_flight.pop(future)
+                    yield result
+
+                if broken:
+                    for index, job, attempt in in_flight.values():
+                        if attempt < self._max_retries:
+                            retries.append((index, job, attempt + 1))
+                        else:
+                            yield _result(index, job, "error", error="worker process crashed")
+
+                    in_flight.clear()
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    executor = ProcessPoolExecutor(max_workers=self._workers)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,118 @@
+from typing import Optional, TypedDict, Iterator
+from threading import Event
+from time import perf_counter
+import os
+
+from libs.core_quick_pdf import CoreQuickPdf
+from libs.managers._outline_json import ContentFormat
+from libs.managers._output_optimizer import OptimizeProfile
+from libs.managers._parse_cache import _DEFAULT_PARSE_CACHE_BYTES
+
+_DEFAULT_POLL_INTERVAL = 0.2
+
+
+class WatchCycle(TypedDict):
+    cycle: int
+    status: str
+    error: Optional[str]
+    inserted: int
+    updated: int
+    moved: int
+    removed: int
+    # outlines put back in the order of the content after the edits, see `_OutlineManager.sync`
+    reordered: int
+    incremental: bool
+    # from reading the changed content to the output being in place
+    elapsed: float
+
+
+def _content_stamp(path: str):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        # editors that save by replacing the file remove it for a moment
+        return None
+
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class CoreContentWatcher:
+    """
+    Keeps a document loaded and saves it with the outlines of a content file every time the file changes, so
+    iterating on the content of a large document never reloads it.
+
+    The content file is polled every `interval` seconds, and a change is applied once the file has stayed the same
+    for a whole interval, so a file that is still being written is not read. Only the outlines that differ from
+    the current ones are edited (see `_OutlineManager.sync`), and the output is saved incrementally whenever the
+    document allows it, which only appends the outlines to the original bytes. Every save goes to a temporary file
+    that replaces the output, so the output is always a complete document.
+    """
+
+    def __init__(self, version: str, interval: float = _DEFAULT_POLL_INTERVAL, cache_dir: Optional[str] = None,
+                 cache_max_bytes: int = _DEFAULT_PARSE_CACHE_BYTES):
+        assert interval > 0, "poll interval should be greater than 0"
+        self._interval = interval
+        self._core = CoreQuickPdf(version, cache_dir=cache_dir, cache_max_bytes=cache_max_bytes)
+
+    def _apply(self, cycle: int, content: str, output: str, content_format: Optional[ContentFormat],
+               optimize: Optional[OptimizeProfile], save: bool):
+        started_at = perf_counter()
+        snapshot = self._core.outlines.snapshot()
+        # optimizing needs a full rewrite
+        incremental = optimize in (None, "none") and self._core.supports_incremental_save
+        status = "unchanged"
+        try:
+            changes = self._core.sync_pdf_content(content, content_format)
+            if save or any(changes.values()):
+                # saves replace the output once it is complete, so it is never seen half written
+                self._core.export_pdf(output, incremental=incremental, optimize=optimize or "none")
+                status = "saved"
+        except Exception:
+            # the outlines of a change that could not be saved are edited again along with the next change
+            self._core.outlines.restore(snapshot)
+            raise
+
+        return WatchCycle(
+            cycle=cycle,
+            status=status,
+            error=None,
+            inserted=changes.get("insert"),
+            updated=changes.get("update"),
+            moved=changes.get("move"),
+            removed=changes.get("remove"),
+            reordered=changes.get("reorder"),
+            incremental=incremental,
+            elapsed=round(perf_counter() - started_at, 6)
+        )
+
+    def watch(self, pdf_path: str, content: str, output: str, content_format: Optional[ContentFormat] = None,
+              optimize: Optional[OptimizeProfile] = None, stop: Optional[Event] = None) -> Iterator[WatchCycle]:
+        """
+        Yields a `WatchCycle` per applied change until `stop` is set, starting with the content as it is. A change
+        that fails, such as invalid content, leaves the document and the output as they were.
+        """
+        stop = stop or Event()
+        self._core.load_pdf(pdf_path)
+        cycle = 0
+        saved = False
+        seen_stamp = applied_stamp = None
+        try:
+            while not stop.is_set():
+                stamp = _content_stamp(content)
+                if stamp is None or stamp != seen_stamp or stamp == applied_stamp:
+                    seen_stamp = stamp
+                    stop.wait(self._interval)
+                    continue
+
+                cycle += 1
+                applied_stamp = stamp
+                try:
+                    result = self._apply(cycle, content, output, content_format, optimize, not saved)
+                except Exception as e:
+                    result = WatchCycle(cycle=cycle, status="error", error=f"{type(e).__name__}: {e}", inserted=0,
+                                        updated=0, moved=0, removed=0, reordered=0, incremental=False, elapsed=0)
+
+                saved = saved or result.get("status") == "saved"
+                yield result
+        finally:
+            self._core.close()
@@ -0,0 +1,249 @@
+from typing import Optional, Any, TYPE_CHECKING
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from json import dumps, loads
+from socketserver import StreamRequestHandler
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+
+# only the server loads documents, so clients never import the PDF libraries
+if TYPE_CHECKING:
+    from libs.managers.core_pdf_manager import CorePdfManager, _ManagerSnapshot
+
+_DocumentKey = tuple[str, int, int]
+
+
+def default_socket_path():
+    user_id = os.getuid() if hasattr(os, "getuid") else "user"
+    return os.environ.get("QUICK_PDF_SOCKET") or os.path.join(
+        tempfile.gettempdir(), f"quick-pdf-editor-{user_id}.sock"
+    )
+
+
+def _document_key(path: str) -> _DocumentKey:
+    real_path = os.path.realpath(path)
+    stat = os.stat(real_path)
+    return real_path, stat.st_mtime_ns, stat.st_size
+
+
+@dataclass()
+class _CachedDocument:
+    manager: "CorePdfManager"
+    snapshot: "_ManagerSnapshot"
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    closed: bool = False
+
+
+@dataclass()
+class _DocumentCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class _DocumentCache:
+    """
+    LRU cache of loaded documents keyed by (real path, mtime, size), so a modified file is always reloaded.
+
+    Every checkout restores the document to the state it was loaded in, which lets mutating actions share the
+    cached instance with later requests.
+    """
+
+    def __init__(self, version: str, max_documents: int):
+        assert max_documents > 0, "document cache size should be greater than 0"
+        self._version = version
+        self._max_documents = max_documents
+        self._documents: OrderedDict[_DocumentKey, _CachedDocument] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = _DocumentCacheStats()
+
+    def _evict(self, key: _DocumentKey):
+        """
+        Removes a document from the cache while `_lock` is held. The caller closes it with `_close` once `_lock` is
+        released, as closing waits for the request still using the document.
+        """
+        self.stats.evictions += 1
+        return self._documents.pop(key)
+
+    @staticmethod
+    def _close(documents: list[_CachedDocument]):
+        for document in documents:
+            with document.lock:
+                document.closed = True
+                document.manager.close()
+
+    def _checkout(self, path: str):
+        from libs.managers.core_pdf_manager import CorePdfManager
+
+        key = _document_key(path)
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self.stats.hits += 1
+                self._documents.move_to_end(key)
+                return document
+
+            self.stats.misses += 1
+            evicted = [self._evict(k) for k in list(self._documents.keys()) if k[0] == key[0]]
+
+        self._close(evicted)
+        manager = CorePdfManager(key[0], self._version)
+        document = _CachedDocument(manager, manager.snapshot())
+        with self._lock:
+            document = self._documents.setdefault(key, document)
+            if document.manager is not manager:
+                manager.close()
+
+            evicted = [self._evict(next(iter(self._documents)))
+                       for _ in range(len(self._documents) - self._max_documents)]
+
+        self._close(evicted)
+        return document
+
+    @contextmanager
+    def open(self, path: str):
+        while True:
+            document = self._checkout(path)
+            with document.lock:
+                if document.closed:
+                    continue
+
+                document.manager.restore(document.snapshot)
+                yield document.manager
+                return
+
+    def close(self):
+        with self._lock:
+            evicted = [self._evict(key) for key in list(self._documents.keys())]
+
+        self._close(evicted)
+
+
+class _RequestHandler(StreamRequestHandler):
+    server: "_DaemonServer"
+
+    def handle(self):
+        for line in self.rfile:
+            if len(line.strip()) == 0:
+                continue
+
+            try:
+                with self.server.request_slots:
+                    response = {"status": "ok", "result": self.server.daemon.handle_request(loads(line))}
+            except Exception as e:
+                response = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+
+            self.wfile.write((dumps(response) + "\n").encode())
+            self.wfile.flush()
+
+
+class _DaemonServer(socketserver.ThreadingMixIn, getattr(socketserver, "UnixStreamServer", socketserver.TCPServer)):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, daemon: "CoreDaemonServer", max_concurrency: int):
+        self.daemon = daemon
+        self.request_slots = threading.BoundedSemaphore(max_concurrency)
+        super().__init__(socket_path, _RequestHandler)
+
+
+class CoreDaemonServer:
+    def __init__(self, version: str, socket_path: Optional[str] = None, cache_size: int = 8,
+                 max_concurrency: int = 4):
+        assert hasattr(socket, "AF_UNIX"), "daemon mode requires Unix domain sockets"
+        assert max_concurrency > 0, "max concurrency should be greater than 0"
+        self._version = version
+        self._socket_path = socket_path or default_socket_path()
+        self._max_concurrency = max_concurrency
+        self._cache = _DocumentCache(version, cache_size)
+        self._server: Optional[_DaemonServer] = None
+
+    def _run_document_action(self, request: dict[str, Any]):
+        from libs.core_actions import run_document_action
+        from libs.core_quick_pdf import CoreQuickPdf
+
+        with self._cache.open(request.get("file")) as manager:
+            core = CoreQuickPdf(self._version, pdf_loader=lambda _: manager)
+            return run_document_action(
+                core, request.get("action"), request.get("file"), request.get("output"), request.get("content"),
+                request.get("incremental", False), request.get("format"), request.get("optimize")
+            )
+
+    def _get_metadata(self, request: dict[str, Any]):
+        with self._cache.open(request.get("file")) as manager:
+            return manager.metadata.get_all()
+
+    def handle_request(self, request: dict[str, Any]):
+        from libs.core_actions import DOCUMENT_ACTIONS
+
+        action = request.get("action")
+        if action in DOCUMENT_ACTIONS:
+            return self._run_document_action(request)
+
+        match action:
+            case "PING":
+                return {"version": self._version, "pid": os.getpid()}
+            case "METADATA":
+                return self._get_metadata(request)
+            case "STATS":
+                return asdict(self._cache.stats)
+            case _:
+                raise AssertionError(f"unsupported action '{action}'")
+
+    def serve_forever(self):
+        if os.path.exists(self._socket_path):
+            assert not CoreDaemonClient(self._socket_path).is_running(), "daemon is already running"
+            os.remove(self._socket_path)
+
+        self._server = _DaemonServer(self._socket_path, self, self._max_concurrency)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._cache.close()
+            if os.path.exists(self._socket_path):
+                os.remove(self._socket_path)
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+
+class CoreDaemonClient:
+    def __init__(self, socket_path: Optional[str] = None):
+        self._socket_path = socket_path or default_socket_path()
+
+    def _connect(self):
+        if not hasattr(socket, "AF_UNIX"):
+            raise ConnectionRefusedError("unix sockets are not supported on this platform")
+
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client.connect(self._socket_path)
+        except OSError:
+            client.close()
+            raise
+
+        return client
+
+    def is_running(self):
+        if not hasattr(socket, "AF_UNIX") or not os.path.exists(self._socket_path):
+            return False
+
+        try:
+            self._connect().close()
+            return True
+        except OSError:
+            return False
+
+    def request(self, action: str, **options: Any):
+        with self._connect() as client, client.makefile("rwb") as stream:
+            stream.write((dumps({"action": action, **options}) + "\n").encode())
+            stream.flush()
+            response = loads(stream.readline() or b'{"status": "error", "error": "daemon closed the connection"}')
+
+        assert response.get("status") == "ok", response.get("error")
+        return response.get("result")
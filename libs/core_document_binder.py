@@ -0,0 +1,184 @@
+from typing import Optional, TypedDict, NotRequired, Iterable, Iterator, Callable, TextIO
+from bisect import bisect_right
+from json import loads
+import os
+
+from libs.managers._metadata_manager import _MetadataManager, _parse_raw_metadata, _read_metadata
+from libs.managers._outline_manager import _OutlineManager, _organize_outlines, _read_outline_tree
+from libs.managers._outline_tree import _OutlineTree
+from libs.managers._page_manager import _PageSource
+from libs.managers._streaming_writer import _StreamingWriter
+from libs.managers.core_profiler import span
+from libs.managers.types import Outline, Metadata
+
+_MAX_FILE_NAME_TITLE = 48
+
+
+class MergeSource(TypedDict):
+    file: str
+    title: NotRequired[Optional[str]]
+
+
+class SplitPart(TypedDict):
+    index: int
+    title: Optional[str]
+    output: str
+    first_page: int
+    last_page: int
+    outlines: int
+    bytes_written: int
+
+
+def read_merge_sources(fp: TextIO):
+    """
+    Reads a JSON list of source files, each either a path or an object with a `file` path and an optional `title`
+    for the outline entry the source's outlines are nested under (the file name by default).
+    """
+    raw_sources = loads(fp.read())
+    assert isinstance(raw_sources, list) and len(raw_sources) > 0, "merge sources should be a non-empty list"
+    sources: list[MergeSource] = []
+    for raw_source in raw_sources:
+        raw_source = {"file": raw_source} if isinstance(raw_source, str) else raw_source
+        assert isinstance(raw_source, dict) and isinstance(raw_source.get("file"), str), "source file is required"
+        assert raw_source.get("title") is None or isinstance(raw_source.get("title"), str), \
+            "source title should be a string"
+        sources.append(MergeSource(file=raw_source.get("file"), title=raw_source.get("title")))
+
+    return sources
+
+
+def _file_name_title(title: str):
+    return "-".join("".join(c if c.isalnum() else " " for c in title).split())[:_MAX_FILE_NAME_TITLE]
+
+
+def _split_outlines(outlines: _OutlineTree, page_count: int):
+    """
+    Cuts the document before the page of every top-level outline, with the pages before the first one as a part
+    of their own. Every part gets the outlines under the top-level outlines it starts with, rebased to its first
+    page; descendants pointing past the end of their part are moved to its last page.
+    """
+    first_pages = sorted({outline.get("page_num") for outline in outlines.children(None)})
+    assert len(first_pages) > 0, "document has no outlines to split at"
+    first_pages = first_pages if first_pages[0] == 0 else [0, *first_pages]
+    last_pages = [first_page - 1 for first_page in first_pages[1:]] + [page_count - 1]
+    part_outlines: list[list[Outline]] = [[] for _ in first_pages]
+    outline_parts: dict[int, int] = {}
+    for outline in outlines:
+        parent_id = outlines.effective_parent_id(outline)
+        part = outline_parts[parent_id] if parent_id is not None else \
+            bisect_right(first_pages, outline.get("page_num")) - 1
+        outline_parts[outline.get("id")] = part
+        part_outlines[part].append(Outline(**{
+            **outline,
+            "page_num": min(outline.get("page_num"), last_pages[part]) - first_pages[part],
+            "parent_id": parent_id
+        }))
+
+    return [
+        (first_page, last_page, _OutlineTree(_organize_outlines(outlines_of_part)))
+        for first_page, last_page, outlines_of_part in zip(first_pages, last_pages, part_outlines)
+    ]
+
+
+class CoreDocumentBinder:
+    """
+    Merges documents into one volume and splits volumes into parts. Documents are read one at a time and their
+    pages are written out as soon as they are copied (see `_StreamingWriter`), so memory use is bounded by the
+    largest single input rather than by the size of the output. Outputs are written to a temporary file first, so
+    a failed run never leaves a partial output behind.
+    """
+
+    def __init__(self, version: str):
+        self._version = version
+
+    def _write(self, output: str, add_pages: Callable[[_StreamingWriter], int],
+               outlines: Callable[[], _OutlineTree], metadata: Metadata):
+        temp_output = f"{output}.part"
+        try:
+            with open(temp_output, "wb") as f:
+                writer = _StreamingWriter(f)
+                page_count = add_pages(writer)
+                with span("outlines.save"):
+                    _OutlineManager(lambda: page_count, outlines()).save(writer)
+
+                with span("metadata.save"):
+                    _MetadataManager(metadata, self._version).save(writer)
+
+                with span("pdf.write"):
+                    writer.finish()
+
+            os.replace(temp_output, output)
+        finally:
+            if os.path.exists(temp_output):
+                os.remove(temp_output)
+
+    def merge(self, sources: Iterable[MergeSource], output: str):
+        """
+        Concatenates `sources` in order, nesting the outlines of every source under an entry on its first page.
+        """
+        outlines: list[Outline] = []
+
+        def add_pages(writer: _StreamingWriter):
+            page_count = 0
+            for source in sources:
+                with span("merge.source", file=source.get("file")):
+                    page_source = _PageSource(source.get("file"))
+                    try:
+                        source_outlines = _read_outline_tree(page_source.reader)
+                        source_page_count = writer.add_pages(page_source.reader, range(len(page_source.reader.pages)))
+                    finally:
+                        page_source.close()
+
+                entry_id = len(outlines) + 1
+                title = source.get("title") or os.path.splitext(os.path.basename(source.get("file")))[0]
+                outlines.append(Outline(id=entry_id, title=title, page_num=page_count, parent_id=None))
+                for outline in source_outlines:
+                    parent_id = source_outlines.effective_parent_id(outline)
+                    outlines.append(Outline(
+                        id=entry_id + outline.get("id"),
+                        title=outline.get("title"),
+                        page_num=page_count + outline.get("page_num"),
+                        parent_id=entry_id + parent_id if parent_id is not None else entry_id
+                    ))
+
+                page_count += source_page_count
+
+            return page_count
+
+        self._write(output, add_pages, lambda: _OutlineTree(outlines), _parse_raw_metadata({}))
+
+    def split(self, pdf_path: str, output_dir: str, prefix: str = "part") -> Iterator[SplitPart]:
+        """
+        Splits the document at its top-level outlines (see `_split_outlines`) into `output_dir`, yielding every
+        part as soon as it is written.
+        """
+        page_source = _PageSource(pdf_path)
+        try:
+            outlines = _read_outline_tree(page_source.reader)
+            metadata = _read_metadata(page_source.reader)
+            parts = _split_outlines(outlines, len(page_source.reader.pages))
+            os.makedirs(output_dir, exist_ok=True)
+            for index, (first_page, last_page, part_outlines) in enumerate(parts, start=1):
+                top_outlines = part_outlines.children(None)
+                title = top_outlines[0].get("title") if len(top_outlines) > 0 else None
+                file_name_parts = [prefix, f"{index:0{len(str(len(parts)))}d}", _file_name_title(title or "")]
+                output = os.path.join(output_dir, f"{'-'.join(filter(None, file_name_parts))}.pdf")
+                with span("split.part", index=index):
+                    self._write(
+                        output,
+                        lambda writer: writer.add_pages(page_source.reader, range(first_page, last_page + 1)),
+                        lambda: part_outlines,
+                        Metadata(**{**metadata, "title": title or metadata.get("title")})
+                    )
+
+                yield SplitPart(
+                    index=index,
+                    title=title,
+                    output=output,
+                    first_page=first_page + 1,
+                    last_page=last_page + 1,
+                    outlines=len(part_outlines),
+                    bytes_written=os.path.getsize(output)
+                )
+        finally:
+            page_source.close()
@@ -0,0 +1,96 @@
+from typing import Optional, Iterable, TYPE_CHECKING
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from libs.managers._heading_detector import HeadingOptions, _TextLine, _detect_headings, _read_page_lines
+from libs.managers._parse_cache import _ParseCache
+from libs.managers.core_profiler import span, count
+
+if TYPE_CHECKING:
+    from pypdfium2 import PdfDocument
+
+_MAX_CHUNK_SIZE = 16
+
+# the pdfium document of a pool worker, opened once by the pool initializer
+_worker_document: Optional["PdfDocument"] = None
+
+
+def _open_document(pdf_path: str):
+    from pypdfium2 import PdfDocument
+
+    return PdfDocument(pdf_path)
+
+
+def _init_worker(pdf_path: str):
+    global _worker_document
+    _worker_document = _open_document(pdf_path)
+
+
+def _read_pages(page_nums: list[int]):
+    return [_read_page_lines(_worker_document, page_num) for page_num in page_nums]
+
+
+class CoreHeadingDetector:
+    """
+    Builds outlines from the headings of a document, recognized by their typography (see `_detect_headings`).
+
+    The text lines of every page, with their font size and weight, are read through pdfium on a process pool, each
+    worker with its own copy of the document. With a `parse_cache`, the lines of every page are cached as soon as
+    they are read, so detecting headings again with other options, or after an interrupted run, only reads the
+    pages that are not cached yet.
+    """
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: Optional[int] = None,
+                 parse_cache: Optional[_ParseCache] = None):
+        self._workers = workers or os.cpu_count() or 1
+        self._chunk_size = chunk_size
+        self._parse_cache = parse_cache
+        assert self._workers > 0, "workers should be greater than 0"
+        assert self._chunk_size is None or self._chunk_size > 0, "chunk size should be greater than 0"
+
+    def _chunks(self, page_nums: list[int]):
+        chunk_size = self._chunk_size or max(1, min(_MAX_CHUNK_SIZE, len(page_nums) // (self._workers * 4)))
+        return [page_nums[i:i + chunk_size] for i in range(0, len(page_nums), chunk_size)]
+
+    def read_page_lines(self, pdf_path: str):
+        """
+        Returns the text lines of every page, `[i]` holding the lines of the 0-based page `i`.
+        """
+        document = _open_document(pdf_path)
+        try:
+            page_count = len(document)
+            cache_key = self._parse_cache.key(pdf_path) if self._parse_cache is not None else None
+            page_lines = self._parse_cache.get_page_lines(cache_key, range(page_count)) \
+                if self._parse_cache is not None else {}
+            chunks = self._chunks([page_num for page_num in range(page_count) if page_num not in page_lines])
+            with span("pages.analyze", pages=sum(len(chunk) for chunk in chunks), workers=self._workers):
+                if self._workers == 1 or len(chunks) <= 1:
+                    read_chunks = (
+                        [_read_page_lines(document, page_num) for page_num in chunk] for chunk in chunks
+                    )
+                    self._collect(page_lines, chunks, read_chunks, cache_key)
+                else:
+                    with ProcessPoolExecutor(max_workers=self._workers, initializer=_init_worker,
+                                             initargs=(pdf_path,)) as executor:
+                        self._collect(page_lines, chunks, executor.map(_read_pages, chunks), cache_key)
+        finally:
+            document.close()
+
+        return [page_lines[page_num] for page_num in range(page_count)]
+
+    def _collect(self, page_lines: dict[int, list[_TextLine]], chunks: list[list[int]],
+                 read_chunks: Iterable[list[list[_TextLine]]], cache_key: Optional[str]):
+        for chunk, lines_of_chunk in zip(chunks, read_chunks):
+            read_lines = dict(zip(chunk, lines_of_chunk))
+            page_lines.update(read_lines)
+            count("pages.analyzed", len(chunk))
+            if self._parse_cache is not None:
+                self._parse_cache.put_page_lines(cache_key, read_lines)
+
+    def detect(self, pdf_path: str, options: HeadingOptions = HeadingOptions()):
+        """
+        Returns raw outlines of the headings of the document, with 0-based page numbers.
+        """
+        page_lines = self.read_page_lines(pdf_path)
+        with span("headings.detect"):
+            return _detect_headings(page_lines, options)
@@ -0,0 +1,316 @@
+from typing import Optional, TypedDict, Literal, Iterable, Iterator, Callable, TextIO, Any, cast, get_args
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from itertools import islice
+from json import dumps, loads, JSONDecodeError
+from time import perf_counter
+import csv
+import os
+
+from pypdf import PdfReader
+
+from libs.managers._incremental_writer import _InfoUpdateWriter
+from libs.managers._metadata_manager import _MetadataManager, _RAW_METADATA_MAP, _output_raw_metadata, _pdf_date, \
+    _read_metadata
+from libs.managers.core_profiler import span, count
+from libs.managers.types import Metadata
+
+MetadataFormat = Literal["csv", "jsonl"]
+
+_METADATA_FIELDS: tuple[str, ...] = tuple(Metadata.__annotations__.keys())
+_RECORD_FIELDS = ("file", "status", "error", *_METADATA_FIELDS)
+_MAX_CHUNK_SIZE = 64
+
+
+class MetadataRecord(Metadata):
+    file: str
+    status: str
+    error: Optional[str]
+
+
+class MetadataUpdate(TypedDict):
+    index: int
+    file: str
+    # the fields to change, None removes a field
+    metadata: dict[str, Optional[str]]
+
+
+class MetadataUpdateResult(TypedDict):
+    index: int
+    file: Optional[str]
+    status: str
+    error: Optional[str]
+    elapsed: float
+    bytes_written: int
+
+
+def infer_metadata_format(path: Optional[str], metadata_format: Optional[MetadataFormat] = None) -> MetadataFormat:
+    return metadata_format or ("csv" if path is not None and path.lower().endswith(".csv") else "jsonl")
+
+
+def _record(pdf_path: str, status: str, error: Optional[str] = None, metadata: Optional[Metadata] = None):
+    metadata = metadata or {}
+    return MetadataRecord(
+        file=pdf_path,
+        status=status,
+        error=error,
+        **{field: str(metadata.get(field)) if metadata.get(field) is not None else None for field in _METADATA_FIELDS}
+    )
+
+
+def _update_result(index: int, pdf_path: Optional[str], status: str, error: Optional[str] = None,
+                   elapsed: float = 0, bytes_written: int = 0):
+    return MetadataUpdateResult(
+        index=index,
+        file=pdf_path,
+        status=status,
+        error=error,
+        elapsed=round(elapsed, 6),
+        bytes_written=bytes_written
+    )
+
+
+def iter_pdf_files(paths: Iterable[str]) -> Iterator[str]:
+    """
+    Yields the given files and the PDF files under the given directories, recursively and in name order.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+
+        for directory, directories, files in os.walk(path):
+            directories.sort()
+            for file in sorted(files):
+                if file.lower().endswith(".pdf"):
+                    yield os.path.join(directory, file)
+
+
+def _scan_file(pdf_path: str):
+    try:
+        # a plain file handle: only the trailer, the cross-reference sections and the information dictionary are read
+        with open(pdf_path, "rb") as f:
+            return _record(pdf_path, "ok", metadata=_read_metadata(PdfReader(f)))
+    except Exception as e:
+        return _record(pdf_path, "error", error=f"{type(e).__name__}: {e}")
+
+
+def _scan_files(pdf_paths: list[str]):
+    return [_scan_file(pdf_path) for pdf_path in pdf_paths]
+
+
+def _update_file(update: MetadataUpdate, version: str):
+    started_at = perf_counter()
+    try:
+        with open(update.get("file"), "r+b") as f:
+            reader = PdfReader(f)
+            raw_metadata = reader.metadata or {}
+            metadata = _read_metadata(reader)
+            if all(metadata.get(field) == value for field, value in update.get("metadata").items()):
+                return _update_result(update.get("index"), update.get("file"), "unchanged",
+                                      elapsed=perf_counter() - started_at)
+
+            manager = _MetadataManager(metadata, version)
+            for field, value in update.get("metadata").items():
+                manager.update(cast(Any, field), value)
+
+            if "mod_date" not in update.get("metadata"):
+                manager.update("mod_date", _pdf_date(datetime.now()))
+
+            writer = _InfoUpdateWriter(reader)
+            # entries this tool does not know about, such as custom properties, are kept
+            writer.add_metadata({
+                **{key: value for key, value in raw_metadata.items() if key not in _RAW_METADATA_MAP},
+                **_output_raw_metadata(manager.get_all())
+            })
+
+            input_size = f.seek(0, os.SEEK_END)
+            try:
+                writer.append(f)
+                f.flush()
+                f.seek(0)
+                updated_reader = PdfReader(f)
+                # a renumbered cross-reference table would make every later open re-read all object headers
+                assert updated_reader.xref_index == 0, "updated cross-reference table is not zero-indexed"
+                assert _read_metadata(updated_reader) == manager.get_all(), "updated metadata could not be read back"
+            except BaseException:
+                # the file is edited in place, so a failed update is cut off again
+                f.truncate(input_size)
+                raise
+
+            bytes_written = f.seek(0, os.SEEK_END) - input_size
+
+        return _update_result(update.get("index"), update.get("file"), "updated", elapsed=perf_counter() - started_at,
+                              bytes_written=bytes_written)
+    except Exception as e:
+        return _update_result(update.get("index"), update.get("file"), "error", error=f"{type(e).__name__}: {e}",
+                              elapsed=perf_counter() - started_at)
+
+
+def _update_files(updates: list[MetadataUpdate], version: str):
+    return [_update_file(update, version) for update in updates]
+
+
+def _verify_update(index: int, raw_update: dict):
+    assert isinstance(raw_update, dict), "update should be a JSON object"
+    assert isinstance(raw_update.get("file"), str) and len(raw_update.get("file")) > 0, "file is required"
+    metadata = {field: raw_update.get(field) for field in _METADATA_FIELDS if field in raw_update}
+    assert all(value is None or isinstance(value, str) for value in metadata.values()), \
+        "metadata values should be strings or null"
+    assert len(metadata) > 0, f"update should set at least one of {', '.join(_METADATA_FIELDS)}"
+    # documents store empty fields as missing ones
+    metadata = {field: value or None for field, value in metadata.items()}
+    return MetadataUpdate(index=index, file=raw_update.get("file"), metadata=metadata)
+
+
+def read_metadata_updates(fp: TextIO, metadata_format: MetadataFormat) -> Iterator[tuple[int, dict | Exception]]:
+    """
+    Reads a metadata update manifest in the format METADATA-EXPORT writes: a `file` and the metadata fields to
+    change. Other columns or keys, such as the `status` of an exported record, are ignored. Missing JSONL keys are
+    left unchanged, while empty CSV cells and JSON nulls remove the field.
+    """
+    assert metadata_format in get_args(MetadataFormat), "metadata format should be csv or jsonl"
+    if metadata_format == "csv":
+        for index, row in enumerate(csv.DictReader(fp)):
+            yield index, {key: value if value != "" else None for key, value in row.items() if key is not None}
+
+        return
+
+    for index, line in enumerate(fp):
+        if len(line.strip()) == 0:
+            continue
+
+        try:
+            yield index, loads(line)
+        except JSONDecodeError as e:
+            yield index, e
+
+
+def write_metadata_records(records: Iterable[MetadataRecord], fp: TextIO, metadata_format: MetadataFormat):
+    """
+    Writes `records` to `fp` as they come and returns the number of records that failed.
+    """
+    assert metadata_format in get_args(MetadataFormat), "metadata format should be csv or jsonl"
+    csv_writer = csv.DictWriter(fp, _RECORD_FIELDS, lineterminator="\n") if metadata_format == "csv" else None
+    if csv_writer is not None:
+        csv_writer.writeheader()
+
+    failed_records = 0
+    for record in records:
+        failed_records += record.get("status") == "error"
+        if csv_writer is not None:
+            csv_writer.writerow(record)
+        else:
+            fp.write(dumps(record) + "\n")
+
+        fp.flush()
+
+    return failed_records
+
+
+class CoreMetadataScanner:
+    """
+    Reads and edits document metadata without loading documents: only the trailer, the cross-reference sections and
+    the document information dictionary are read, and updates are appended to the files in place as incremental
+    update sections (see `_InfoUpdateWriter`) instead of rewriting them. Files are handled in chunks on a process
+    pool, and records come back in the order the chunks finish.
+    """
+
+    def __init__(self, version: str, workers: Optional[int] = None, max_in_flight: Optional[int] = None):
+        self._version = version
+        self._workers = workers or os.cpu_count() or 1
+        self._max_in_flight = max_in_flight or self._workers * 2
+        assert self._workers > 0, "workers should be greater than 0"
+        assert self._max_in_flight > 0, "max in-flight chunks should be greater than 0"
+
+    def _run_pool(self, function: Callable[..., list], items: Iterable, failed: Callable[[Any], Any], *args: Any):
+        items = iter(items)
+        in_flight: dict[Future, list] = {}
+        executor = ProcessPoolExecutor(max_workers=self._workers)
+        try:
+            while True:
+                while len(in_flight) < self._max_in_flight:
+                    chunk = list(islice(items, _MAX_CHUNK_SIZE))
+                    if len(chunk) == 0:
+                        break
+
+                    in_flight[executor.submit(function, chunk, *args)] = chunk
+
+                if len(in_flight) == 0:
+                    break
+
+                done, _ = wait(in_flight.keys(), return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    try:
+                        results = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        continue
+
+                    in_flight.pop(future)
+                    yield from results
+
+                if broken:
+                    for chunk in in_flight.values():
+                        yield from (failed(item) for item in chunk)
+
+                    in_flight.clear()
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    executor = ProcessPoolExecutor(max_workers=self._workers)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def scan(self, paths: Iterable[str]) -> Iterator[MetadataRecord]:
+        """
+        Reads the metadata of the given files and of the PDF files under the given directories.
+        """
+        pdf_paths = iter_pdf_files(paths)
+        with span("metadata.scan", workers=self._workers):
+            records = map(_scan_file, pdf_paths) if self._workers == 1 else self._run_pool(
+                _scan_files, pdf_paths, lambda pdf_path: _record(pdf_path, "error", error="worker process crashed")
+            )
+            for record in records:
+                count("files.scanned")
+                yield record
+
+    def update(self, manifest: Iterable[tuple[int, dict | Exception]]) -> Iterator[MetadataUpdateResult]:
+        """
+        Applies the updates of a manifest (see `read_metadata_updates`), each file at most once. Files whose
+        metadata already matches are left untouched; the others get the new fields and, unless the update sets
+        them, this tool as their producer and a new modification date.
+        """
+
+        def updates():
+            for index, raw_update in manifest:
+                try:
+                    assert not isinstance(raw_update, Exception), f"{type(raw_update).__name__}: {raw_update}"
+                    update = _verify_update(index, raw_update)
+                    # updates of one file in different chunks would append to it at the same time
+                    assert os.path.abspath(update.get("file")) not in updated_files, "file is updated more than once"
+                    updated_files.add(os.path.abspath(update.get("file")))
+                    yield update
+                except AssertionError as e:
+                    invalid_updates.append(_update_result(
+                        index, raw_update.get("file") if isinstance(raw_update, dict) else None, "error", error=str(e)
+                    ))
+
+        updated_files: set[str] = set()
+        # updates rejected before reaching a worker, reported along with the next result
+        invalid_updates: list[MetadataUpdateResult] = []
+        with span("metadata.update", workers=self._workers):
+            results = map(lambda update: _update_file(update, self._version), updates()) \
+                if self._workers == 1 else self._run_pool(
+                    _update_files, updates(),
+                    lambda update: _update_result(update.get("index"), update.get("file"), "error",
+                                                  error="worker process crashed"),
+                    self._version
+                )
+            for result in results:
+                yield from invalid_updates
+                invalid_updates.clear()
+                count("files.updated", result.get("status") == "updated")
+                yield result
+
+            yield from invalid_updates
@@ -0,0 +1,186 @@
+from typing import Optional, TypedDict, Literal, Iterator, TYPE_CHECKING
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from time import perf_counter
+import os
+
+from libs.managers._page_manager import _render_page, parse_page_ranges
+from libs.managers.core_profiler import span, count
+
+if TYPE_CHECKING:
+    from pypdfium2 import PdfDocument
+
+ImageFormat = Literal["png", "jpeg", "webp"]
+
+_PIL_FORMATS: dict[ImageFormat, str] = {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP"}
+_MAX_CHUNK_SIZE = 16
+
+# the pdfium document of a pool worker, opened once by the pool initializer
+_worker_document: Optional["PdfDocument"] = None
+
+
+class PageExportResult(TypedDict):
+    page_num: int
+    output: Optional[str]
+    status: str
+    error: Optional[str]
+    width: int
+    height: int
+    render_elapsed: float
+    write_elapsed: float
+    bytes_written: int
+
+
+def _result(page_num: int, status: str, output: Optional[str] = None, error: Optional[str] = None, width: int = 0,
+            height: int = 0, render_elapsed: float = 0, write_elapsed: float = 0, bytes_written: int = 0):
+    return PageExportResult(
+        page_num=page_num,
+        output=output,
+        status=status,
+        error=error,
+        width=width,
+        height=height,
+        render_elapsed=round(render_elapsed, 6),
+        write_elapsed=round(write_elapsed, 6),
+        bytes_written=bytes_written
+    )
+
+
+def _open_document(pdf_path: str):
+    from pypdfium2 import PdfDocument
+
+    return PdfDocument(pdf_path)
+
+
+def _init_worker(pdf_path: str):
+    global _worker_document
+    _worker_document = _open_document(pdf_path)
+
+
+def _output_path(output_dir: str, prefix: str, page_num: int, page_count: int, image_format: ImageFormat):
+    return os.path.join(output_dir, f"{prefix}-{page_num:0{len(str(page_count))}d}.{image_format}")
+
+
+def _export_page(document: "PdfDocument", page_num: int, page_count: int, output_dir: str, prefix: str,
+                 scale: float, image_format: ImageFormat, max_size: Optional[int]):
+    output = _output_path(output_dir, prefix, page_num, page_count, image_format)
+    temp_output = f"{output}.part"
+    started_at = perf_counter()
+    try:
+        if max_size is not None:
+            scale = max_size / max(document[page_num - 1].get_size())
+
+        image = _render_page(document, page_num - 1, scale)
+        rendered_at = perf_counter()
+        image.save(temp_output, format=_PIL_FORMATS[image_format])
+        os.replace(temp_output, output)
+        return _result(page_num, "ok", output, width=image.width, height=image.height,
+                       render_elapsed=rendered_at - started_at, write_elapsed=perf_counter() - rendered_at,
+                       bytes_written=os.path.getsize(output))
+    except Exception as e:
+        if os.path.exists(temp_output):
+            os.remove(temp_output)
+
+        return _result(page_num, "error", output, error=f"{type(e).__name__}: {e}",
+                       render_elapsed=perf_counter() - started_at)
+
+
+def _export_pages(page_nums: list[int], page_count: int, output_dir: str, prefix: str, scale: float,
+                  image_format: ImageFormat, max_size: Optional[int]):
+    return [
+        _export_page(_worker_document, page_num, page_count, output_dir, prefix, scale, image_format, max_size)
+        for page_num in page_nums
+    ]
+
+
+class CorePageExporter:
+    """
+    Renders pages to image files on a process pool. Every worker opens its own pdfium document once and renders
+    chunks of pages, writing each image to disk as soon as it is rendered, so only per-page results travel back.
+
+    `max_size` renders every page so its longer side is `max_size` pixels, which is how thumbnails are made, and
+    takes precedence over `scale`.
+    """
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: Optional[int] = None,
+                 max_in_flight: Optional[int] = None):
+        self._workers = workers or os.cpu_count() or 1
+        self._chunk_size = chunk_size
+        self._max_in_flight = max_in_flight or self._workers * 2
+        assert self._workers > 0, "workers should be greater than 0"
+        assert self._chunk_size is None or self._chunk_size > 0, "chunk size should be greater than 0"
+        assert self._max_in_flight > 0, "max in-flight chunks should be greater than 0"
+
+    def _chunks(self, page_nums: list[int]):
+        # small enough chunks to keep every worker busy until the end, large enough to amortize the round trips
+        chunk_size = self._chunk_size or max(1, min(_MAX_CHUNK_SIZE, len(page_nums) // (self._workers * 4)))
+        return [page_nums[i:i + chunk_size] for i in range(0, len(page_nums), chunk_size)]
+
+    def run(self, pdf_path: str, output_dir: str, page_ranges: Optional[str] = None, scale: float = 1,
+            image_format: ImageFormat = "png", max_size: Optional[int] = None,
+            prefix: str = "page") -> Iterator[PageExportResult]:
+        assert scale > 0, "scale should be greater than 0"
+        assert max_size is None or max_size > 0, "max size should be greater than 0"
+        assert image_format in _PIL_FORMATS, f"image format should be one of {', '.join(_PIL_FORMATS.keys())}"
+        document = _open_document(pdf_path)
+        page_count = len(document)
+        document.close()
+        page_nums = parse_page_ranges(page_ranges, page_count)
+        os.makedirs(output_dir, exist_ok=True)
+        options = (page_count, output_dir, prefix, scale, image_format, max_size)
+        with span("pages.export", pages=len(page_nums), workers=self._workers):
+            if self._workers == 1:
+                document = _open_document(pdf_path)
+                try:
+                    for page_num in page_nums:
+                        result = _export_page(document, page_num, *options)
+                        count("pages.rendered", result.get("status") == "ok")
+                        yield result
+                finally:
+                    document.close()
+
+                return
+
+            yield from self._run_pool(pdf_path, self._chunks(page_nums), options)
+
+    def _run_pool(self, pdf_path: str, chunks: list[list[int]], options: tuple):
+        chunks = iter(chunks)
+        in_flight: dict[Future, list[int]] = {}
+        executor = ProcessPoolExecutor(max_workers=self._workers, initializer=_init_worker, initargs=(pdf_path,))
+        try:
+            while True:
+                while len(in_flight) < self._max_in_flight:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+
+                    in_flight[executor.submit(_export_pages, chunk, *options)] = chunk
+
+                if len(in_flight) == 0:
+                    break
+
+                done, _ = wait(in_flight.keys(), return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    try:
+                        results = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        continue
+
+                    in_flight.pop(future)
+                    count("pages.rendered", sum(result.get("status") == "ok" for result in results))
+                    yield from results
+
+                if broken:
+                    for chunk in in_flight.values():
+                        for page_num in chunk:
+                            yield _result(page_num, "error", error="worker process crashed")
+
+                    in_flight.clear()
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    executor = ProcessPoolExecutor(
+                        max_workers=self._workers, initializer=_init_worker, initargs=(pdf_path,)
+                    )
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -1,13 +1,34 @@
-from typing import Optional
+from typing import Optional, Callable
+import os
 
+from libs.managers._heading_detector import HeadingOptions
+from libs.managers._outline_json import ContentFormat, _content_format
+from libs.managers._outline_manager import DeletedPagePolicy
+from libs.managers._output_optimizer import OptimizeProfile
+from libs.managers._parse_cache import _ParseCache, _DEFAULT_PARSE_CACHE_BYTES
 from libs.managers.core_pdf_manager import CorePdfManager
+from libs.managers.core_profiler import span, count
 
 
 class CoreQuickPdf:
-    def __init__(self, version: str):
+    def __init__(self, version: str, pdf_loader: Optional[Callable[[str], CorePdfManager]] = None,
+                 cache_dir: Optional[str] = None, cache_max_bytes: int = _DEFAULT_PARSE_CACHE_BYTES):
+        """
+        `pdf_loader` replaces opening a new `CorePdfManager` per `load_pdf` call. Managers returned by a custom
+        loader are owned by that loader and are not closed by `close`.
+
+        `cache_dir` keeps the parsed outlines, page count and metadata of every loaded document there, so loading
+        an unchanged document again does not parse it, see `_ParseCache`.
+        """
         self._version = version
+        self._pdf_loader = pdf_loader
+        self._parse_cache = _ParseCache(cache_dir, cache_max_bytes) if cache_dir is not None else None
         self._pdf_manager: Optional[CorePdfManager] = None
 
+    @property
+    def parse_cache_stats(self):
+        return self._parse_cache.stats if self._parse_cache is not None else None
+
     @property
     def pages(self):
         assert self._pdf_manager is not None
@@ -23,17 +44,71 @@ class CoreQuickPdf:
         assert self._pdf_manager is not None
         return self._pdf_manager.metadata
 
-    def load_pdf_content(self, path: str):
-        with open(path, "r") as f:
-            self.outlines.load_from_json(f.read())
+    def load_pdf_content(self, path: str, content_format: Optional[ContentFormat] = None):
+        with span("load_pdf_content"), open(path, "r") as f:
+            count("bytes.read", os.path.getsize(path))
+            self.outlines.load(f, _content_format(path, content_format))
+
+    def patch_pdf_content(self, path: str, content_format: Optional[ContentFormat] = None):
+        with span("patch_pdf_content"), open(path, "r") as f:
+            count("bytes.read", os.path.getsize(path))
+            self.outlines.patch(f, _content_format(path, content_format))
+
+    def sync_pdf_content(self, path: str, content_format: Optional[ContentFormat] = None):
+        with span("sync_pdf_content"), open(path, "r") as f:
+            count("bytes.read", os.path.getsize(path))
+            return self.outlines.sync(f, _content_format(path, content_format))
 
-    def export_pdf_content(self, path: str):
-        with open(path, "w") as f:
-            f.write(self.outlines.jsonify())
+    def generate_pdf_content(self, options: HeadingOptions = HeadingOptions(), workers: Optional[int] = None):
+        """
+        Replaces the outlines with ones generated from the headings of the document, see `CoreHeadingDetector`.
+        The text of its pages is cached in the parse cache, if there is one.
+        """
+        assert self._pdf_manager is not None
+        # the detector brings in the process pool machinery, which no other action needs
+        from libs.core_heading_detector import CoreHeadingDetector
+
+        with span("generate_pdf_content"):
+            detector = CoreHeadingDetector(workers=workers, parse_cache=self._parse_cache)
+            self.outlines.load_raw(detector.detect(self._pdf_manager.path, options))
+
+    def export_pdf_content(self, path: str, content_format: Optional[ContentFormat] = None):
+        with span("export_pdf_content"):
+            with open(path, "w") as f:
+                self.outlines.dump(f, _content_format(path, content_format))
+
+            count("bytes.written", os.path.getsize(path))
 
     def load_pdf(self, path: str):
-        self._pdf_manager = CorePdfManager(path, self._version)
+        self.close()
+        with span("load_pdf"):
+            self._pdf_manager = self._pdf_loader(path) if self._pdf_loader is not None else CorePdfManager(
+                path, self._version, parse_cache=self._parse_cache)
+
+    def reorder_pages(self, page_nums: list[int], deleted_page_policy: DeletedPagePolicy = "drop"):
+        assert self._pdf_manager is not None
+        self._pdf_manager.reorder_pages(page_nums, deleted_page_policy)
+
+    def delete_pages(self, page_nums: list[int], deleted_page_policy: DeletedPagePolicy = "drop"):
+        assert self._pdf_manager is not None
+        self._pdf_manager.delete_pages(page_nums, deleted_page_policy)
+
+    def insert_pages(self, source_path: str, page_ranges: Optional[str] = None, position: Optional[int] = None):
+        assert self._pdf_manager is not None
+        self._pdf_manager.insert_pages(source_path, page_ranges, position)
 
-    def export_pdf(self, path: str):
+    @property
+    def supports_incremental_save(self):
+        assert self._pdf_manager is not None
+        return self._pdf_manager.supports_incremental_save
+
+    def export_pdf(self, path: str, incremental: bool = False, optimize: OptimizeProfile = "none"):
         assert self._pdf_manager is not None
-        self._pdf_manager.save(path)
+        with span("export_pdf"):
+            return self._pdf_manager.save(path, incremental=incremental, optimize=optimize)
+
+    def close(self):
+        if self._pdf_manager is not None and self._pdf_loader is None:
+            self._pdf_manager.close()
+
+        self._pdf_manager = None
@@ -0,0 +1,197 @@
+from typing import Optional, TypedDict, TYPE_CHECKING
+from collections import Counter
+from dataclasses import dataclass
+from statistics import median
+import ctypes
+
+from libs.managers.types import Outline
+
+if TYPE_CHECKING:
+    from pypdfium2 import PdfDocument
+
+# font weight of bold text, and the font name parts that mean bold when a font has no weight (standard 14 fonts)
+_BOLD_WEIGHT = 600
+_BOLD_NAME_PARTS = ("bold", "black", "heavy", "semibold", "demi")
+# font sizes closer than this to each other belong to the same heading level
+_SIZE_TOLERANCE = 0.05
+
+
+class _TextLine(TypedDict):
+    text: str
+    # median font size and weight of the line's visible characters
+    size: float
+    weight: int
+    # top and bottom of the line's first character, in points from the bottom of the page
+    top: float
+    bottom: float
+
+
+@dataclass(frozen=True)
+class HeadingOptions:
+    """
+    Lines count as headings when their font is `min_size_ratio` times larger than body text, or when they are bold
+    and `bold` is set. Lines longer than `max_length` characters are never headings. Heading styles are ranked by
+    size, then weight, into at most `max_levels` nesting levels, and the styles beyond them are ignored.
+    """
+    min_size_ratio: float = 1.15
+    max_levels: int = 3
+    max_length: int = 120
+    bold: bool = True
+
+
+def _font_weight(text_object: ctypes.c_void_p):
+    import pypdfium2.raw as pdfium_c
+
+    font = pdfium_c.FPDFTextObj_GetFont(text_object)
+    weight = pdfium_c.FPDFFont_GetWeight(font)
+    if weight > 0:
+        return weight
+
+    name_length = pdfium_c.FPDFFont_GetBaseFontName(font, None, 0)
+    name = ctypes.create_string_buffer(name_length)
+    pdfium_c.FPDFFont_GetBaseFontName(font, name, name_length)
+    return 700 if any(part in name.value.decode(errors="ignore").lower() for part in _BOLD_NAME_PARTS) else 400
+
+
+def _read_page_lines(document: "PdfDocument", page_index: int):
+    """
+    Reads the text lines of a page in pdfium's reading order. The font of every text object is only looked at
+    once, since all its characters share it.
+    """
+    import pypdfium2.raw as pdfium_c
+
+    page = document[page_index]
+    text_page = page.get_textpage()
+    lines: list[_TextLine] = []
+    try:
+        chars: list[str] = []
+        sizes: list[float] = []
+        weights: list[int] = []
+        first_char: Optional[int] = None
+        text_object_address: Optional[int] = None
+        size, weight = 0.0, 0
+
+        def end_line():
+            text = "".join(chars).strip()
+            if len(text) > 0 and len(sizes) > 0:
+                _, bottom, _, top = text_page.get_charbox(first_char)
+                lines.append(_TextLine(text=text, size=round(median(sizes), 1), weight=int(median(weights)),
+                                       top=round(top, 1), bottom=round(bottom, 1)))
+
+            chars.clear()
+            sizes.clear()
+            weights.clear()
+
+        for index in range(text_page.count_chars()):
+            char = chr(pdfium_c.FPDFText_GetUnicode(text_page, index))
+            if char in "\r\n":
+                end_line()
+                continue
+
+            chars.append(char)
+            if char.isspace() or pdfium_c.FPDFText_IsGenerated(text_page, index):
+                continue
+
+            text_object = pdfium_c.FPDFText_GetTextObject(text_page, index)
+            address = ctypes.cast(text_object, ctypes.c_void_p).value
+            if address != text_object_address:
+                text_object_address = address
+                size = pdfium_c.FPDFText_GetFontSize(text_page, index)
+                weight = _font_weight(text_object)
+
+            if len(sizes) == 0:
+                first_char = index
+
+            sizes.append(size)
+            weights.append(weight)
+
+        end_line()
+    finally:
+        text_page.close()
+        page.close()
+
+    return lines
+
+
+def _body_size(page_lines: list[list[_TextLine]]):
+    """
+    The font size most of the text is set in, weighted by characters.
+    """
+    sizes = Counter[float]()
+    for lines in page_lines:
+        for line in lines:
+            sizes[line.get("size")] += len(line.get("text"))
+
+    return sizes.most_common(1)[0][0] if len(sizes) > 0 else 0
+
+
+def _is_heading(line: _TextLine, body_size: float, options: HeadingOptions):
+    if len(line.get("text")) > options.max_length or not any(c.isalpha() for c in line.get("text")):
+        return False
+
+    return line.get("size") >= body_size * options.min_size_ratio or \
+        (options.bold and line.get("weight") >= _BOLD_WEIGHT and line.get("size") >= body_size)
+
+
+def _heading_levels(headings: list[_TextLine], options: HeadingOptions):
+    """
+    Clusters the heading font sizes, so sizes that only differ by rounding or scaling end up on the same level,
+    then ranks the clusters from the largest, bold before regular within a cluster.
+    """
+    clusters: dict[float, float] = {}
+    cluster_size: Optional[float] = None
+    for size in sorted({heading.get("size") for heading in headings}, reverse=True):
+        if cluster_size is None or size < cluster_size * (1 - _SIZE_TOLERANCE):
+            cluster_size = size
+
+        clusters[size] = cluster_size
+
+    styles = sorted(
+        {(clusters[heading.get("size")], heading.get("weight") >= _BOLD_WEIGHT) for heading in headings},
+        reverse=True
+    )
+    return {style: level for level, style in enumerate(styles[:options.max_levels])}, clusters
+
+
+def _detect_headings(page_lines: list[list[_TextLine]], options: HeadingOptions):
+    """
+    Turns the heading lines of every page (`page_lines[i]` holding the lines of page `i`) into raw outlines,
+    nested by heading level. Consecutive lines of the same heading are joined, so wrapped titles stay whole.
+    """
+    assert options.min_size_ratio >= 1, "heading size ratio should be at least 1"
+    assert options.max_levels > 0, "heading levels should be greater than 0"
+    body_size = _body_size(page_lines)
+    headings = [line for lines in page_lines for line in lines if _is_heading(line, body_size, options)]
+    levels, clusters = _heading_levels(headings, options)
+
+    raw_outlines: list[Outline] = []
+    # the last outline of every level above the current one
+    parents: list[Optional[Outline]] = []
+    for page_num, lines in enumerate(page_lines):
+        previous: Optional[tuple[_TextLine, int]] = None
+        for line in lines:
+            level = levels.get((clusters.get(line.get("size")), line.get("weight") >= _BOLD_WEIGHT)) \
+                if _is_heading(line, body_size, options) else None
+            if level is None:
+                previous = None
+                continue
+
+            if previous is not None and previous[1] == level and \
+                    0 <= previous[0].get("bottom") - line.get("top") < line.get("size"):
+                raw_outlines[-1].update({"title": f"{raw_outlines[-1].get('title')} {line.get('text')}"})
+                previous = (line, level)
+                continue
+
+            del parents[level:]
+            parent = next((outline for outline in reversed(parents) if outline is not None), None)
+            raw_outlines.append(Outline(
+                id=len(raw_outlines) + 1,
+                title=line.get("text"),
+                page_num=page_num,
+                parent_id=parent.get("id") if parent is not None else None
+            ))
+            parents.extend([None] * (level - len(parents)))
+            parents.append(raw_outlines[-1])
+            previous = (line, level)
+
+    return raw_outlines
@@ -0,0 +1,269 @@
+from typing import Optional, BinaryIO, Any, cast
+from hashlib import md5
+from shutil import copyfileobj
+import os
+
+from pypdf import PdfReader, PageObject
+from pypdf.generic import (
+    ArrayObject,
+    ByteStringObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    NumberObject,
+    PdfObject,
+    create_string_object,
+)
+
+_STARTXREF_SEARCH_BYTES = 1024
+
+
+def _find_startxref(source: BinaryIO):
+    source.seek(0, os.SEEK_END)
+    source_size = source.tell()
+    source.seek(max(0, source_size - _STARTXREF_SEARCH_BYTES))
+    tail = source.read()
+    position = tail.rfind(b"startxref")
+    assert position >= 0, "startxref not found"
+    return int(tail[position + len(b"startxref"):].split()[0])
+
+
+def _uses_xref_stream(source: BinaryIO, startxref: int):
+    source.seek(startxref)
+    return not source.read(4).startswith(b"xref")
+
+
+def _write_object(stream: BinaryIO, reference: IndirectObject, obj: PdfObject):
+    offset = stream.tell()
+    stream.write(f"{reference.idnum} {reference.generation} obj\n".encode())
+    obj.write_to_stream(stream)
+    stream.write(b"\nendobj\n")
+    return offset
+
+
+def _group_xref_entries(offsets: dict[IndirectObject, int]):
+    sections: list[list[tuple[IndirectObject, int]]] = []
+    for reference, offset in sorted(offsets.items(), key=lambda _: _[0].idnum):
+        if len(sections) > 0 and sections[-1][-1][0].idnum + 1 == reference.idnum:
+            sections[-1].append((reference, offset))
+        else:
+            sections.append([(reference, offset)])
+
+    return sections
+
+
+def _write_xref_table(stream: BinaryIO, offsets: dict[IndirectObject, int], trailer: DictionaryObject):
+    xref_offset = stream.tell()
+    # the head of the free object list, written in update sections too: readers take a table that does not start at
+    # object 0 for a misnumbered one and check the header of every object it lists on each open
+    stream.write(b"xref\n0 1\n0000000000 65535 f \n")
+
+    for section in _group_xref_entries(offsets):
+        stream.write(f"{section[0][0].idnum} {len(section)}\n".encode())
+        for reference, offset in section:
+            stream.write(f"{offset:010} {reference.generation:05} n \n".encode())
+
+    stream.write(b"trailer\n")
+    trailer.write_to_stream(stream)
+    stream.write(f"\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+
+
+def _write_xref_stream(stream: BinaryIO, offsets: dict[IndirectObject, int], trailer: DictionaryObject,
+                       reference: IndirectObject):
+    xref_offset = stream.tell()
+    offsets = {**offsets, reference: xref_offset}
+    offset_width = max(4, (xref_offset.bit_length() + 7) // 8)
+    sections = _group_xref_entries(offsets)
+    xref_stream = DecodedStreamObject()
+    xref_stream.update(trailer)
+    xref_stream.update({
+        NameObject("/Type"): NameObject("/XRef"),
+        NameObject("/W"): ArrayObject([NumberObject(1), NumberObject(offset_width), NumberObject(2)]),
+        NameObject("/Index"): ArrayObject([
+            NumberObject(number) for section in sections for number in (section[0][0].idnum, len(section))
+        ]),
+    })
+    xref_stream.set_data(b"".join(
+        b"\x01" + offset.to_bytes(offset_width, "big") + reference.generation.to_bytes(2, "big")
+        for section in sections for reference, offset in section
+    ))
+    _write_object(stream, reference, xref_stream)
+    stream.write(f"startxref\n{xref_offset}\n%%EOF\n".encode())
+
+
+class _ObjectWriter:
+    """
+    The outline and document information parts of the `PdfWriter` interface used by the managers, kept as new
+    objects numbered from `next_id` until a subclass writes them out. Outline destinations point at
+    `_page_references`, which subclasses fill with the references of the written pages.
+    """
+
+    def __init__(self, next_id: int):
+        self._page_references: list[IndirectObject] = []
+        self._next_id = next_id
+        self._objects: dict[IndirectObject, DictionaryObject] = {}
+        self._outline_root: Optional[IndirectObject] = None
+        self._outline_parents: dict[IndirectObject, Optional[IndirectObject]] = {}
+        self._info: Optional[IndirectObject] = None
+
+    def _add_object(self, obj: DictionaryObject):
+        reference = IndirectObject(self._next_id, 0, self)
+        self._next_id += 1
+        self._objects[reference] = obj
+        return reference
+
+    def get_object(self, reference: IndirectObject):
+        return self._objects.get(reference)
+
+    def add_outline_item(self, title: str, page_number: int, parent: Optional[IndirectObject] = None):
+        if self._outline_root is None:
+            self._outline_root = self._add_object(DictionaryObject({NameObject("/Type"): NameObject("/Outlines")}))
+            self._outline_parents[self._outline_root] = None
+
+        parent = parent or self._outline_root
+        parent_obj = self._objects[parent]
+        outline_item = self._add_object(DictionaryObject({
+            NameObject("/Title"): create_string_object(title),
+            NameObject("/Parent"): parent,
+            NameObject("/Dest"): ArrayObject([self._page_references[page_number], NameObject("/Fit")]),
+        }))
+        self._outline_parents[outline_item] = parent
+
+        if "/Last" in parent_obj:
+            previous_item = cast(IndirectObject, parent_obj.raw_get("/Last"))
+            self._objects[previous_item][NameObject("/Next")] = outline_item
+            self._objects[outline_item][NameObject("/Prev")] = previous_item
+        else:
+            parent_obj[NameObject("/First")] = outline_item
+
+        parent_obj[NameObject("/Last")] = outline_item
+        return outline_item
+
+    def add_metadata(self, infos: dict[str, Any]):
+        info = DictionaryObject({
+            NameObject(key): create_string_object(str(value.get_object() if isinstance(value, PdfObject) else value))
+            for key, value in infos.items()
+        })
+        if self._info is None:
+            self._info = self._add_object(info)
+        else:
+            self._objects[self._info].update(info)
+
+    def _count_outlines(self):
+        counts: dict[IndirectObject, int] = {}
+        for outline_item in reversed(self._outline_parents.keys()):
+            parent = self._outline_parents.get(outline_item)
+            if parent is not None:
+                counts[parent] = counts.get(parent, 0) + counts.get(outline_item, 0) + 1
+
+        for outline_item, count in counts.items():
+            self._objects[outline_item][NameObject("/Count")] = NumberObject(count)
+
+
+class _UpdateWriter(_ObjectWriter):
+    """
+    Keeps new objects numbered after those of `reader` and writes them as an incremental update section whose
+    trailer points back at the original one, in the same kind of cross-reference section the document ends with.
+    """
+
+    def __init__(self, reader: PdfReader):
+        assert not reader.is_encrypted, "incremental save does not support encrypted documents"
+        super().__init__(int(cast(int, reader.trailer["/Size"])))
+        self._reader = reader
+
+    def _trailer(self, startxref: int, size: int):
+        trailer = DictionaryObject({
+            NameObject("/Size"): NumberObject(size),
+            NameObject("/Root"): self._reader.trailer.raw_get("/Root"),
+            NameObject("/Prev"): NumberObject(startxref),
+        })
+        info = self._info or (self._reader.trailer.raw_get("/Info") if "/Info" in self._reader.trailer else None)
+        if info is not None:
+            trailer[NameObject("/Info")] = info
+
+        original_id = self._reader.trailer.get("/ID")
+        original_id = original_id.get_object() if original_id is not None else None
+        update_id = ByteStringObject(md5(f"{startxref}:{size}:{len(self._objects)}".encode()).digest())
+        trailer[NameObject("/ID")] = ArrayObject([
+            original_id[0] if isinstance(original_id, ArrayObject) and len(original_id) > 0 else update_id, update_id
+        ])
+
+        return trailer
+
+    def _write_update(self, stream: BinaryIO, startxref: int, xref_stream: bool,
+                      offsets: dict[IndirectObject, int]):
+        for reference, obj in self._objects.items():
+            offsets[reference] = _write_object(stream, reference, obj)
+
+        if xref_stream:
+            xref_reference = IndirectObject(self._next_id, 0, self)
+            _write_xref_stream(stream, offsets, self._trailer(startxref, self._next_id + 1), xref_reference)
+        else:
+            _write_xref_table(stream, offsets, self._trailer(startxref, self._next_id))
+
+
+class _IncrementalWriter(_UpdateWriter):
+    """
+    Writes the original document byte for byte followed by an incremental update section that only holds the
+    new outline objects, the document information dictionary and the updated catalog.
+
+    It implements the parts of the `PdfWriter` interface used by the managers, so the managers save into it the
+    same way they save into a regular writer.
+    """
+
+    def __init__(self, reader: PdfReader, source: BinaryIO):
+        super().__init__(reader)
+        self._source = source
+        self._page_references = [page.indirect_reference for page in reader.pages]
+        self._added_pages = 0
+
+    def add_page(self, page: PageObject):
+        assert self._added_pages < len(self._page_references) and page.indirect_reference is not None and \
+               page.indirect_reference.pdf is self._reader and \
+               page.indirect_reference == self._page_references[self._added_pages], \
+            "incremental save requires the original page order"
+        self._added_pages += 1
+        return page
+
+    def _catalog(self):
+        catalog = self._reader.trailer["/Root"]
+        updated_catalog = DictionaryObject({key: catalog.raw_get(key) for key in catalog.keys()})
+        if self._outline_root is not None:
+            updated_catalog[NameObject("/Outlines")] = self._outline_root
+        elif "/Outlines" in updated_catalog:
+            del updated_catalog["/Outlines"]
+
+        return updated_catalog
+
+    def write(self, stream: BinaryIO):
+        assert self._added_pages in (0, len(self._page_references)), "incremental save requires all original pages"
+        self._count_outlines()
+        startxref = _find_startxref(self._source)
+        xref_stream = _uses_xref_stream(self._source, startxref)
+
+        self._source.seek(0)
+        copyfileobj(self._source, stream)
+        stream.write(b"\n")
+
+        root = cast(IndirectObject, self._reader.trailer.raw_get("/Root"))
+        self._write_update(stream, startxref, xref_stream, {root: _write_object(stream, root, self._catalog())})
+
+
+class _InfoUpdateWriter(_UpdateWriter):
+    """
+    Appends an incremental update section that only holds a new document information dictionary to the file the
+    document was read from, so the rest of the file is neither read nor rewritten. Neither the page tree nor the
+    catalog is loaded, which makes it suitable for editing the metadata of many documents.
+    """
+
+    def append(self, stream: BinaryIO):
+        """
+        Appends the update to `stream`, the document file opened for reading and writing.
+        """
+        assert self._info is not None, "no document information to append"
+        startxref = _find_startxref(stream)
+        xref_stream = _uses_xref_stream(stream, startxref)
+        stream.seek(0, os.SEEK_END)
+        stream.write(b"\n")
+        self._write_update(stream, startxref, xref_stream, {})
@@ -42,11 +42,28 @@ def _output_raw_metadata(metadata: Metadata):
     return {metadata_map_reversed.get(k): v for k, v in metadata.items() if v is not None}
 
 
+def _pdf_date(time: datetime):
+    return time.strftime("D\072%Y%m%d%H%M%S-05'00'")
+
+
+def _read_metadata(reader: PdfReader):
+    return _parse_raw_metadata(reader.metadata or {})
+
+
 class _MetadataManager:
-    def __init__(self, reader: PdfReader, version: str):
-        self._metadata = _parse_raw_metadata(reader.metadata or {})
+    def __init__(self, metadata: Metadata, version: str):
+        self._metadata = Metadata(**metadata)
         self.update("producer", f"Quick PDF Editor ({version})")
 
+    def snapshot(self):
+        return Metadata(**self._metadata)
+
+    def restore(self, metadata: Metadata):
+        self._metadata = Metadata(**metadata)
+
+    def get_all(self):
+        return Metadata(**self._metadata)
+
     def get(self, meta_prop: _MetaProp):
         return cast(dict[str, Optional[str]], self._metadata).get(meta_prop)
 
@@ -54,7 +71,7 @@ class _MetadataManager:
         self._metadata.update({meta_prop: meta_value})
 
     def save(self, writer: PdfWriter):
-        current_time = datetime.now().strftime("D\072%Y%m%d%H%M%S-05'00'")
+        current_time = _pdf_date(datetime.now())
         self.update("creation_date", current_time)
         self.update("mod_date", current_time)
         writer.add_metadata(_output_raw_metadata(self._metadata))
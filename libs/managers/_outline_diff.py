@@ -0,0 +1,77 @@
+from typing import Optional
+from difflib import SequenceMatcher
+
+from libs.managers._outline_transaction import OutlineOperation, OutlineOperationType
+from libs.managers._outline_tree import _OutlineTree
+
+
+def _diff_outlines(current: _OutlineTree, target: _OutlineTree):
+    """
+    The operations that turn `current` into `target`, in the form `_OutlineTransaction.apply` takes, and the
+    number of inserted, updated, moved and removed outlines.
+
+    Outlines are matched by aligning the titles of both trees in page order, and outlines at the same position of
+    a differing stretch are matched as well, so a renamed outline is updated rather than replaced. Moves first
+    detach every moved outline, so swapping a parent and its child never creates a cycle halfway, and removals
+    come last, after the outlines that stay have moved out from under removed parents.
+    """
+    current_outlines = list(current)
+    target_outlines = list(target)
+    matcher = SequenceMatcher(
+        None, [outline.get("title") for outline in current_outlines],
+        [outline.get("title") for outline in target_outlines], autojunk=False
+    )
+    # the current id of every matched target id
+    matched_ids: dict[int, int] = {}
+    for tag, current_start, current_end, target_start, target_end in matcher.get_opcodes():
+        if tag in ("equal", "replace"):
+            for current_index, target_index in zip(range(current_start, current_end), range(target_start, target_end)):
+                matched_ids[target_outlines[target_index].get("id")] = current_outlines[current_index].get("id")
+
+    operations: list[OutlineOperation] = []
+    changes: dict[OutlineOperationType, int] = {"insert": 0, "update": 0, "move": 0, "remove": 0}
+    # the transaction id of every target id, inserted outlines taking the ids after the greatest current id
+    transaction_ids = dict(matched_ids)
+    next_id = max((outline.get("id") for outline in current_outlines), default=0) + 1
+    moves: list[tuple[int, Optional[int]]] = []
+    for outline in target_outlines:
+        parent_id = transaction_ids.get(target.effective_parent_id(outline))
+        current_outline = current.find(matched_ids.get(outline.get("id")))
+        if current_outline is None:
+            operations.append(OutlineOperation(
+                op="insert", title=outline.get("title"), page_num=outline.get("page_num") + 1, parent_id=parent_id
+            ))
+            transaction_ids[outline.get("id")] = next_id
+            next_id += 1
+            changes["insert"] += 1
+            continue
+
+        if current_outline.get("title") != outline.get("title") or \
+                current_outline.get("page_num") != outline.get("page_num"):
+            operations.append(OutlineOperation(
+                op="update", id=current_outline.get("id"), title=outline.get("title"),
+                page_num=outline.get("page_num") + 1
+            ))
+            changes["update"] += 1
+
+        if current.effective_parent_id(current_outline) != parent_id:
+            moves.append((current_outline.get("id"), parent_id))
+
+    operations.extend(OutlineOperation(op="move", id=outline_id, parent_id=None) for outline_id, _ in moves)
+    operations.extend(
+        OutlineOperation(op="move", id=outline_id, parent_id=parent_id)
+        for outline_id, parent_id in moves if parent_id is not None
+    )
+    changes["move"] = len(moves)
+
+    kept_ids = set(matched_ids.values())
+    for outline in current_outlines:
+        if outline.get("id") in kept_ids:
+            continue
+
+        changes["remove"] += 1
+        # descendants go along with their removed parent, unless they moved away above
+        if current.effective_parent_id(outline) in kept_ids or current.effective_parent_id(outline) is None:
+            operations.append(OutlineOperation(op="remove", id=outline.get("id")))
+
+    return operations, changes
@@ -0,0 +1,271 @@
+from typing import Optional, TypedDict, Self, TextIO, Iterator, Any, Literal
+from json import JSONDecoder, JSONDecodeError, dumps, loads
+
+from libs.managers._outline_tree import _OutlineTree
+from libs.managers.types import Outline
+
+ContentFormat = Literal["json", "jsonl"]
+
+_READ_CHUNK_SIZE = 64 * 1024
+_JSON_WHITESPACE = " \t\n\r"
+_JSON_STRUCTURAL_CHARS = "{}[],:"
+# the messages `json.loads` raises for what `_iter_json_tokens` expected instead
+_SYNTAX_ERRORS = {
+    "value": "Expecting value",
+    "key": "Expecting property name enclosed in double quotes",
+    ":": "Expecting ':' delimiter",
+    "end": "Expecting ',' delimiter",
+    "done": "Extra data",
+}
+
+
+class _JSONOutlineNode(TypedDict):
+    title: str
+    page_num: int
+    child_nodes: Optional[list[Self]]
+
+
+class _JSONLOutline(TypedDict):
+    id: int
+    parent_id: Optional[int]
+    title: str
+    page_num: int
+
+
+def _content_format(path: str, content_format: Optional[ContentFormat] = None) -> ContentFormat:
+    return content_format or ("jsonl" if path.lower().endswith(".jsonl") else "json")
+
+
+def _syntax_error(message: str, buffer: str, position: int, buffer_offset: int, buffer_line: int,
+                  buffer_line_start: int):
+    """
+    A `JSONDecodeError` at `position` of the read buffer, reported at its place in the whole content. The buffer
+    starts `buffer_offset` characters and `buffer_line` lines into the content, in a line that starts at
+    `buffer_line_start`.
+    """
+    newline = buffer.rfind("\n", 0, position)
+    error = JSONDecodeError(message, buffer, position)
+    error.pos = buffer_offset + position
+    error.lineno = buffer_line + buffer.count("\n", 0, position) + 1
+    error.colno = error.pos - (buffer_offset + newline + 1 if newline >= 0 else buffer_line_start) + 1
+    error.args = (f"{message}: line {error.lineno} column {error.colno} (char {error.pos})",)
+    return error
+
+
+def _iter_json_tokens(fp: TextIO) -> Iterator[tuple[str, Any]]:
+    """
+    Tokenizes a JSON document read from `fp` in fixed-size chunks. Structural characters are yielded as they are,
+    strings, numbers and literals as ("value", decoded value). The tokens are checked against the JSON grammar as
+    they are read, so content `json.load` rejects raises a `JSONDecodeError` here as well.
+    """
+    decoder = JSONDecoder()
+    buffer = ""
+    position = 0
+    # where the buffer starts in the content, see `_syntax_error`
+    buffer_offset = buffer_line = buffer_line_start = 0
+    eof = False
+    # open objects and arrays, and what the grammar allows next: a "value", an object "key", the ":" after a key,
+    # the "," or closing bracket after a member, or nothing once the document is "done"
+    containers: list[str] = []
+    expected = "value"
+    empty = False
+
+    def refill():
+        nonlocal buffer, position, buffer_offset, buffer_line, buffer_line_start, eof
+        chunk = fp.read(_READ_CHUNK_SIZE)
+        newline = buffer.rfind("\n", 0, position)
+        buffer_line_start = buffer_offset + newline + 1 if newline >= 0 else buffer_line_start
+        buffer_line += buffer.count("\n", 0, position)
+        buffer_offset += position
+        buffer, position, eof = buffer[position:] + chunk, 0, len(chunk) == 0
+
+    def syntax_error(message: str):
+        return _syntax_error(message, buffer, position, buffer_offset, buffer_line, buffer_line_start)
+
+    while True:
+        while position < len(buffer) and buffer[position] in _JSON_WHITESPACE:
+            position += 1
+
+        if position == len(buffer):
+            if eof:
+                if expected != "done":
+                    raise syntax_error(_SYNTAX_ERRORS[expected])
+
+                return
+
+            refill()
+            continue
+
+        char = buffer[position]
+        if char in _JSON_STRUCTURAL_CHARS:
+            token, value = char, None
+            end = position + 1
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except JSONDecodeError:
+                if eof:
+                    raise syntax_error("Expecting value")
+
+                end = len(buffer)
+
+            if end == len(buffer) and not eof:
+                # the value may continue in the next chunk
+                refill()
+                continue
+
+            token = "value"
+
+        # the most frequent tokens first
+        if token == "value" and (expected == "value" or expected == "key" and isinstance(value, str)):
+            expected, empty = ":" if expected == "key" else "end", False
+        elif token == ":" and expected == ":":
+            expected = "value"
+        elif token == "," and expected == "end":
+            expected = "key" if containers[-1] == "{" else "value"
+        elif token in "{[" and expected == "value":
+            containers.append(token)
+            expected, empty = "key" if token == "{" else "value", True
+        elif len(containers) > 0 and token == ("}" if containers[-1] == "{" else "]") and \
+                (expected == "end" or empty and expected in ("key", "value")):
+            containers.pop()
+            expected, empty = "end", False
+        else:
+            raise syntax_error(_SYNTAX_ERRORS[expected])
+
+        if expected == "end" and len(containers) == 0:
+            expected = "done"
+
+        position = end
+        yield token, value
+
+
+def _read_json_outlines(fp: TextIO, page_count: int):
+    """
+    Reads nested `_JSONOutlineNode` content into raw outlines, numbering them in document order. Only the current
+    path from the root to the node being read is kept besides the outlines themselves.
+    """
+    raw_outlines: list[Outline] = []
+    # ("list", parent id) for node lists, ("node", outline, current key, expecting key) for nodes
+    frames: list[list[Any]] = []
+    skipped_depth = 0
+    started = False
+    for token, value in _iter_json_tokens(fp):
+        if skipped_depth > 0:
+            skipped_depth += 1 if token in "{[" else -1 if token in "}]" else 0
+            continue
+
+        frame = frames[-1] if len(frames) > 0 else None
+        if frame is None:
+            assert not started and token == "[", "content should be a list of nodes"
+            started = True
+            frames.append(["list", None])
+        elif frame[0] == "list":
+            if token == "{":
+                raw_outlines.append(Outline(id=len(raw_outlines) + 1, title=None, page_num=None, parent_id=frame[1]))
+                frames.append(["node", raw_outlines[-1], None, True])
+            elif token == "]":
+                frames.pop()
+            else:
+                assert token == ",", "content nodes should be objects"
+        elif token == "value" and frame[3]:
+            frame[2], frame[3] = value, False
+        elif token == "," or token == "}":
+            frame[3] = True
+            if token == "}":
+                outline = frames.pop()[1]
+                assert outline.get("title") is not None, "content node title is required"
+                assert outline.get("page_num") is not None, "content node page number is required"
+                outline.update({"page_num": min(int(outline.get("page_num")), page_count) - 1})
+        elif token == "value":
+            if frame[2] in ("title", "page_num"):
+                outline = frame[1]
+                outline.update({frame[2]: value})
+        elif token == "[" and frame[2] == "child_nodes":
+            frames.append(["list", frame[1].get("id")])
+        elif token in "{[":
+            skipped_depth = 1
+        else:
+            assert token == ":", "invalid content node"
+
+    assert started and len(frames) == 0, "unexpected end of JSON content"
+    return raw_outlines
+
+
+def _read_jsonl_outlines(fp: TextIO, page_count: int):
+    raw_outlines: list[Outline] = []
+    outline_ids: set[int] = set()
+    for line in fp:
+        if len(line.strip()) == 0:
+            continue
+
+        jsonl_outline: _JSONLOutline = loads(line)
+        outline_id = jsonl_outline.get("id")
+        assert isinstance(outline_id, int) and outline_id not in outline_ids, "content ids should be unique integers"
+        assert jsonl_outline.get("title") is not None, "content title is required"
+        outline_ids.add(outline_id)
+        raw_outlines.append(Outline(
+            id=outline_id,
+            title=jsonl_outline.get("title"),
+            page_num=min(int(jsonl_outline.get("page_num")), page_count) - 1,
+            parent_id=jsonl_outline.get("parent_id")
+        ))
+
+    return raw_outlines
+
+
+def _group_children(outlines: _OutlineTree):
+    children: dict[Optional[int], list[Outline]] = {}
+    for outline in outlines:
+        children.setdefault(outlines.effective_parent_id(outline), []).append(outline)
+
+    return children
+
+
+def _iter_json_chunks(outlines: _OutlineTree):
+    """
+    Serializes the outlines as nested `_JSONOutlineNode` content, formatted the same as `json.dumps(indent=2)`.
+    """
+    children = _group_children(outlines)
+    if len(children.get(None, [])) == 0:
+        yield "[]"
+        return
+
+    yield "["
+    pending_lists: list[list[Any]] = [[children.get(None), 0, 1]]
+    while len(pending_lists) > 0:
+        siblings, index, level = pending_lists[-1]
+        if index == len(siblings):
+            pending_lists.pop()
+            yield "\n" + "  " * (level - 1) + "]"
+            if len(pending_lists) > 0:
+                yield "\n" + "  " * (level - 2) + "}"
+
+            continue
+
+        pending_lists[-1][1] += 1
+        outline = siblings[index]
+        indent, field_indent = "  " * level, "  " * (level + 1)
+        yield "".join([
+            "," if index > 0 else "", "\n", indent, "{\n",
+            field_indent, '"page_num": ', dumps(outline.get("page_num") + 1), ",\n",
+            field_indent, '"title": ', dumps(outline.get("title")), ",\n",
+            field_indent, '"child_nodes": '
+        ])
+
+        child_outlines = children.get(outline.get("id"))
+        if child_outlines is not None:
+            yield "["
+            pending_lists.append([child_outlines, 0, level + 2])
+        else:
+            yield "null\n" + indent + "}"
+
+
+def _iter_jsonl_lines(outlines: _OutlineTree):
+    for outline in outlines:
+        yield dumps(_JSONLOutline(
+            id=outline.get("id"),
+            parent_id=outlines.effective_parent_id(outline),
+            title=outline.get("title"),
+            page_num=outline.get("page_num") + 1
+        )) + "\n"
@@ -1,139 +1,249 @@
-from typing import Optional, cast, TypedDict, Self
-from itertools import chain
-from json import dumps, loads
+from typing import Optional, cast, Iterable, Callable, TextIO, Literal, get_args
+from contextlib import contextmanager
+from io import StringIO
 
 from pypdf import PdfReader, PdfWriter
-from pypdf.generic import IndirectObject
-from pypdf.types import OutlineType
-
-from libs.managers._page_manager import _PageManager
+from pypdf.generic import IndirectObject, DictionaryObject, ArrayObject, PdfObject
+
+from libs.managers._outline_json import (
+    ContentFormat,
+    _iter_json_chunks,
+    _iter_jsonl_lines,
+    _read_json_outlines,
+    _read_jsonl_outlines,
+)
+from libs.managers._outline_diff import _diff_outlines
+from libs.managers._outline_transaction import _OutlineTransaction, read_outline_operations
+from libs.managers._outline_tree import _OutlineTree
+from libs.managers.core_profiler import span, count
 from libs.managers.types import Outline
 
+DeletedPagePolicy = Literal["drop", "previous", "next"]
 
-class _JSONOutlineNode(TypedDict):
-    title: str
-    page_num: int
-    child_nodes: Optional[list[Self]]
 
+def _organize_outlines(outlines: Iterable[Outline]):
+    new_outlines: list[Outline] = []
+    new_outline_ids: dict[int, int] = {}
+    for outline in sorted(outlines, key=lambda _: (_.get("page_num"), _.get("id"))):
+        new_outline_id = len(new_outlines) + 1
+        new_parent_id = new_outline_ids.get(outline.get("parent_id")) if outline.get("parent_id") is not None else None
+        new_outline_ids.setdefault(outline.get("id"), new_outline_id)
+        new_outlines.append(Outline(**{**outline, "id": new_outline_id, "parent_id": new_parent_id}))
 
-class _CreatedOutline(Outline):
-    indirect_ref: IndirectObject
+    return new_outlines
 
 
-def _organize_outlines(outlines: list[Outline]):
-    next_available_id = 1
+def _process_raw_outlines(raw_outlines: Iterable[Outline]):
+    def process_title(_title: str):
+        return "".join([c for c in _title if c.isprintable()]).strip()
 
-    def sort_outlines(_outlines: list[Outline]):
-        _sorted_outline_page_num_set = sorted(set([ol.get("page_num") for ol in _outlines]))
-        _sorted_outlines_list = [
-            [ol for ol in _outlines if ol.get("page_num") == page_num] for page_num in _sorted_outline_page_num_set
-        ]
+    root_outlines: list[Outline] = []
+    child_outlines: dict[int, list[Outline]] = {}
+    for raw_outline in raw_outlines:
+        if len(process_title(raw_outline.get("title"))) == 0:
+            continue
 
-        _sorted_id_ranked_outlines_list = [sorted(ols, key=lambda _: _.get('id')) for ols in _sorted_outlines_list]
-        return cast(list[Outline], list(chain(*_sorted_id_ranked_outlines_list)))
+        if raw_outline.get("parent_id") is None:
+            root_outlines.append(raw_outline)
+        else:
+            child_outlines.setdefault(raw_outline.get("parent_id"), []).append(raw_outline)
 
-    def organize_outlines(_outlines: list[Outline]):
-        nonlocal next_available_id
-        _new_outlines: list[Outline] = []
-        _id_map: list[tuple[int, int]] = []
-        for _outline in _outlines:
-            _new_parent_ids = [
-                _id_pair for _id_pair in _id_map if
-                _outline.get("parent_id") is not None and _id_pair[1] == _outline.get("parent_id")
-            ]
+    outlines: list[Outline] = []
+    parent_outlines: dict[int, Outline] = {}
+    pending_outlines = [iter(root_outlines)]
+    while len(pending_outlines) > 0:
+        outline = next(pending_outlines[-1], None)
+        if outline is None:
+            pending_outlines.pop()
+            continue
+
+        outlines.append(outline)
+        if outline.get("id") in parent_outlines:
+            continue
+
+        parent_outline = parent_outlines.setdefault(outline.get("id"), outline)
+        pending_outlines.append(iter([
+            ol for ol in child_outlines.get(outline.get("id"), []) if
+            ol.get("page_num") >= parent_outline.get("page_num")
+        ]))
 
-            _new_parent_id = _new_parent_ids[0][0] if len(_new_parent_ids) > 0 else None
-            _new_outline_id = next_available_id
-            _id_map.append((_new_outline_id, _outline.get("id")))
-            _new_outlines.append(Outline(**{**_outline, "id": _new_outline_id, "parent_id": _new_parent_id}))
-            next_available_id += 1
+    for outline in outlines:
+        outline.update({"title": process_title(outline.get("title")), "parent_id": outline.get("parent_id")})
 
-        return _new_outlines
+    return outlines
 
-    return organize_outlines(sort_outlines(outlines))
 
+def _resolve(obj: Optional[PdfObject]):
+    return obj.get_object() if obj is not None else None
+
+
+def _iter_named_destinations(catalog: DictionaryObject):
+    dests = _resolve(catalog.raw_get("/Dests")) if "/Dests" in catalog else None
+    if isinstance(dests, DictionaryObject):
+        yield from dests.items()
+
+    names = _resolve(catalog.raw_get("/Names")) if "/Names" in catalog else None
+    name_tree = _resolve(names.raw_get("/Dests")) if isinstance(names, DictionaryObject) and "/Dests" in names else None
+    pending_nodes = [name_tree] if isinstance(name_tree, DictionaryObject) else []
+    visited_nodes: set[int] = set()
+    while len(pending_nodes) > 0:
+        node = pending_nodes.pop()
+        if id(node) in visited_nodes:
+            continue
+
+        visited_nodes.add(id(node))
+        if "/Kids" in node:
+            kids = [_resolve(kid) for kid in cast(ArrayObject, node["/Kids"])]
+            pending_nodes.extend(reversed([kid for kid in kids if isinstance(kid, DictionaryObject)]))
+        elif "/Names" in node:
+            name_pairs = cast(ArrayObject, node["/Names"])
+            for i in range(0, len(name_pairs) - 1, 2):
+                yield _resolve(name_pairs[i]), name_pairs[i + 1]
+
+
+def _get_destination_page(destination: Optional[PdfObject], named_destinations: Callable[[], dict[str, PdfObject]]):
+    destination = _resolve(destination)
+    if isinstance(destination, str):
+        destination = _resolve(named_destinations().get(destination))
+
+    if isinstance(destination, DictionaryObject):
+        destination = _resolve(destination.raw_get("/D")) if "/D" in destination else None
+
+    if isinstance(destination, ArrayObject) and len(destination) > 0:
+        return destination[0]
+
+    return None
+
+
+def _parse_and_get_raw_outlines(pdf_reader: PdfReader):
+    """
+    Streams the outlines of a document in document order, walking the /First and /Next links of the outline
+    dictionaries directly. Outlines whose destination does not resolve to a page are skipped and their children
+    are attached to the closest resolved ancestor.
+    """
+    catalog = pdf_reader.root_object
+    outline_root = _resolve(catalog.raw_get("/Outlines")) if "/Outlines" in catalog else None
+    if not isinstance(outline_root, DictionaryObject) or "/First" not in outline_root:
+        return
+
+    page_indices: dict[tuple[int, int], int] = {}
+    for page_num, page in enumerate(pdf_reader.pages):
+        if page.indirect_reference is not None:
+            page_indices.setdefault((page.indirect_reference.idnum, page.indirect_reference.generation), page_num)
+
+    named_destinations: Optional[dict[str, PdfObject]] = None
+
+    def get_named_destinations():
+        nonlocal named_destinations
+        if named_destinations is None:
+            named_destinations = {}
+            for name, destination in _iter_named_destinations(catalog):
+                if isinstance(name, str):
+                    named_destinations.setdefault(name, destination)
+
+        return named_destinations
+
+    next_outline_id = 1
+    visited_nodes: set[int] = set()
+    pending_nodes: list[tuple[Optional[PdfObject], Optional[int]]] = [(outline_root.raw_get("/First"), None)]
+    while len(pending_nodes) > 0:
+        raw_node, parent_id = pending_nodes.pop()
+        node = _resolve(raw_node)
+        if not isinstance(node, DictionaryObject) or id(node) in visited_nodes:
+            continue
+
+        visited_nodes.add(id(node))
+        if "/A" in node:
+            action = _resolve(node.raw_get("/A"))
+            destination = action.raw_get("/D") if isinstance(action, DictionaryObject) and action.get(
+                "/S") == "/GoTo" else None
+        else:
+            destination = node.raw_get("/Dest") if "/Dest" in node else None
 
-def _process_raw_outlines(raw_outlines: list[Outline]):
-    def process_title(_title: str):
-        return "".join([c for c in _title if c.isprintable()]).strip()
+        page_ref = _get_destination_page(destination, get_named_destinations)
+        page_num = page_indices.get((page_ref.idnum, page_ref.generation)) if isinstance(
+            page_ref, IndirectObject) else None
 
-    def process_outlines(_new_outlines: list[Outline], _outlines: list[Outline], _parent_id: Optional[int] = None):
-        if _parent_id is None:
-            for _outline in [
-                ol for ol in _outlines if ol.get("parent_id") is None and len(process_title(ol.get("title"))) > 0
-            ]:
-                _new_outlines.append(_outline)
-                process_outlines(_new_outlines, _outlines, _parent_id=_outline.get("id"))
-            return _new_outlines
+        child_parent_id = parent_id
+        if page_num is not None:
+            title = _resolve(node.raw_get("/Title")) if "/Title" in node else None
+            yield Outline(id=next_outline_id, title=str(title or ""), page_num=page_num, parent_id=parent_id)
+            child_parent_id = next_outline_id
+            next_outline_id += 1
 
-        _parent_outlines = [ol for ol in _new_outlines if ol.get("id") == _parent_id]
-        _parent_outline = _parent_outlines[0] if len(_parent_outlines) > 0 else None
-        if _parent_outline is None:
-            return _new_outlines
+        if "/Next" in node:
+            pending_nodes.append((node.raw_get("/Next"), parent_id))
 
-        for _outline in [
-            ol for ol in _outlines if
-            ol.get("parent_id") == _parent_id and ol.get("page_num") >= _parent_outline.get("page_num") and len(
-                process_title(ol.get("title"))) > 0
-        ]:
-            _new_outlines.append(_outline)
-            process_outlines(_new_outlines, _outlines, _parent_id=_outline.get("id"))
+        if "/First" in node:
+            pending_nodes.append((node.raw_get("/First"), child_parent_id))
 
-        return _new_outlines
 
-    outlines = process_outlines([], raw_outlines)
-    for outline in outlines:
-        outline.update({"title": process_title(outline.get("title")), "parent_id": outline.get("parent_id")})
+def _deleted_page_targets(page_map: list[Optional[int]], policy: DeletedPagePolicy):
+    """
+    The new page index outlines on every removed page move to: the closest kept page before it for "previous",
+    after it for "next" (falling back to the other direction at either end of the document), None for "drop".
+    """
+    if policy == "drop":
+        return [None] * len(page_map)
 
-    return outlines
+    previous_pages: list[Optional[int]] = [None] * len(page_map)
+    previous_page: Optional[int] = None
+    for i in range(len(page_map)):
+        previous_page = previous_pages[i] = page_map[i] if page_map[i] is not None else previous_page
 
+    next_pages: list[Optional[int]] = [None] * len(page_map)
+    next_page: Optional[int] = None
+    for i in range(len(page_map) - 1, -1, -1):
+        next_page = next_pages[i] = page_map[i] if page_map[i] is not None else next_page
 
-def _parse_and_get_raw_outlines(
-        pdf_reader: PdfReader,
-        next_outline_id: int = 1,
-        next_origin_outlines: Optional[OutlineType] = None,
-        parent_id: Optional[int] = None,
-        page_indirect_refs: Optional[list[IndirectObject | None]] = None
-):
-    outlines: list[Outline] = []
-    outline_id = next_outline_id
-    origin_outlines = next_origin_outlines or pdf_reader.outline or []
-    page_indirect_references = page_indirect_refs or [page.indirect_reference for page in pdf_reader.pages]
+    preferred, fallback = (previous_pages, next_pages) if policy == "previous" else (next_pages, previous_pages)
+    return [p if p is not None else f for p, f in zip(preferred, fallback)]
 
-    for i in range(0, len(origin_outlines)):
-        origin_outline = origin_outlines[i]
 
-        if type(origin_outline) is not list:
-            title = origin_outline.title
-            page_num = page_indirect_references.index(origin_outline.page) if (
-                    page_indirect_references and origin_outline.page in page_indirect_references) else None
+def _build_outline_tree(raw_outlines: Iterable[Outline]):
+    with span("outlines.process"):
+        outlines = _process_raw_outlines(raw_outlines)
 
-            if title is not None and page_num is not None:
-                outlines.append(Outline(id=outline_id, title=title, page_num=page_num, parent_id=parent_id))
-                outline_id += 1
-        else:
-            children = _parse_and_get_raw_outlines(
-                pdf_reader,
-                next_outline_id=outline_id,
-                next_origin_outlines=origin_outline,
-                parent_id=outline_id - 1 if outline_id > 1 else None,
-                page_indirect_refs=page_indirect_references
-            )
+    count("outlines.processed", len(outlines))
+    with span("outlines.organize"):
+        return _OutlineTree(_organize_outlines(outlines))
 
-            outlines = [*outlines, *children]
-            outline_id += len(children)
 
-    return outlines
+def _outline_layout(outlines: _OutlineTree):
+    """
+    The title, page and parent position of every outline in document order, which are the same for trees that
+    look the same whatever their ids.
+    """
+    positions: dict[int, int] = {}
+    layout: list[tuple[str, int, Optional[int]]] = []
+    for position, outline in enumerate(outlines):
+        positions[outline.get("id")] = position
+        parent_position = positions.get(outlines.effective_parent_id(outline))
+        layout.append((outline.get("title"), outline.get("page_num"), parent_position))
+
+    return layout
+
+
+def _read_outline_tree(reader: PdfReader):
+    with span("outlines.parse"):
+        raw_outlines = list(_parse_and_get_raw_outlines(reader))
+
+    return _build_outline_tree(raw_outlines)
 
 
 class _OutlineManager:
-    def __init__(self, page_manager: _PageManager, initial_reader: PdfReader):
-        self._page_manager = page_manager
-        self._outlines = _organize_outlines(_process_raw_outlines(_parse_and_get_raw_outlines(initial_reader)))
+    def __init__(self, page_count: Callable[[], int], outlines: _OutlineTree):
+        self._page_count = page_count
+        self._outlines = outlines
 
     def _find(self, outline_id: int):
-        outlines: list[Outline] = list(filter(lambda outline: outline.get('id') == outline_id, self._outlines))
-        return outlines[0] if len(outlines) > 0 else None
+        return self._outlines.find(outline_id)
+
+    def snapshot(self):
+        return [Outline(**outline) for outline in self._outlines]
+
+    def restore(self, outlines: list[Outline]):
+        self._outlines = _OutlineTree([Outline(**outline) for outline in outlines])
 
     def get_all(self):
         return cast(list[Outline], [{**ol, "page_num": ol.get("page_num") + 1} for ol in self._outlines])
@@ -143,62 +253,124 @@ class _OutlineManager:
         assert outline is not None, error_message or "outline id not found"
         return cast(Outline, {**outline, "page_num": outline.get("page_num") + 1})
 
-    def jsonify(self):
-        outline_id_map: list[tuple[int, list[int]]] = []
-        json_obj: list[_JSONOutlineNode] = []
-        for outline in self.get_all():
-            current_node = _JSONOutlineNode(
-                page_num=outline.get("page_num"),
-                title=outline.get("title"),
-                child_nodes=None
+    def dump(self, fp: TextIO, content_format: ContentFormat = "json"):
+        with span("content.write", format=content_format):
+            fp.writelines(
+                _iter_jsonl_lines(self._outlines) if content_format == "jsonl" else _iter_json_chunks(self._outlines)
             )
 
-            parent_id_mapped_temp = [id_map for id_map in outline_id_map if id_map[0] == outline.get("parent_id")]
-            parent_id_mapped = parent_id_mapped_temp[0] if len(parent_id_mapped_temp) > 0 else None
-            if parent_id_mapped is not None:
-                parent_obj: Optional[_JSONOutlineNode] = None
-                for idx in parent_id_mapped[1]:
-                    parent_obj = parent_obj.get("child_nodes")[idx] if parent_obj is not None else json_obj[idx]
+    def load(self, fp: TextIO, content_format: ContentFormat = "json"):
+        with span("content.read", format=content_format):
+            raw_outlines = _read_jsonl_outlines(fp, self._page_count()) if content_format == "jsonl" else \
+                _read_json_outlines(fp, self._page_count())
+
+        self.load_raw(raw_outlines)
+
+    def load_raw(self, raw_outlines: Iterable[Outline]):
+        """
+        Replaces the outlines with raw outlines, such as generated ones, with 0-based page numbers.
+        """
+        self._outlines = _build_outline_tree(raw_outlines)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Applies the edits made through the yielded `_OutlineTransaction` with a single validation and organizing
+        pass when the block exits. Nothing changes if the block or the validation fails.
+        """
+        transaction = _OutlineTransaction(self._outlines, self._page_count())
+        yield transaction
+        with span("outlines.transaction", operations=transaction.operations):
+            outlines, ordered_ids = transaction.outlines()
+            organized_ids = {outline.get("id"): new_outline_id for new_outline_id, outline in enumerate(
+                sorted(outlines, key=lambda _: (_.get("page_num"), _.get("id"))), start=1
+            )}
+            self._outlines = _OutlineTree(_organize_outlines(outlines))
+
+        transaction.ids = {outline_id: organized_ids[ordered_id] for outline_id, ordered_id in ordered_ids.items()}
+
+    def remap_pages(self, page_map: list[Optional[int]], deleted_page_policy: DeletedPagePolicy = "drop"):
+        """
+        Moves every outline to the new index of its page in `page_map`, see `_PageManager.permute`. Outlines on
+        removed pages are dropped or moved to a neighbouring page according to `deleted_page_policy`. Children of
+        dropped outlines, and children that now come before their parent's page, move up to the closest ancestor
+        they can still be nested under.
+        """
+        assert deleted_page_policy in get_args(DeletedPagePolicy), \
+            "deleted page policy should be drop, previous or next"
+        deleted_page_targets = _deleted_page_targets(page_map, deleted_page_policy)
+        parent_ids: dict[int, Optional[int]] = {}
+        remapped_outlines: dict[int, Outline] = {}
+        for outline in self._outlines:
+            parent_id = self._outlines.effective_parent_id(outline)
+            parent_ids[outline.get("id")] = parent_id
+            page_num = page_map[outline.get("page_num")]
+            page_num = page_num if page_num is not None else deleted_page_targets[outline.get("page_num")]
+            if page_num is None:
+                continue
+
+            while parent_id is not None and (
+                    parent_id not in remapped_outlines or remapped_outlines[parent_id].get("page_num") > page_num):
+                parent_id = parent_ids.get(parent_id)
+
+            remapped_outlines[outline.get("id")] = Outline(
+                **{**outline, "page_num": page_num, "parent_id": parent_id}
+            )
 
-                if parent_obj is not None:
-                    parent_obj_child_nodes = parent_obj.get("child_nodes") or []
-                    outline_id_map.append((outline.get("id"), [*parent_id_mapped[1], len(parent_obj_child_nodes)]))
-                    parent_obj.update({"child_nodes": [*parent_obj_child_nodes, current_node]})
-            else:
-                outline_id_map.append((outline.get("id"), [len(json_obj)]))
-                json_obj.append(current_node)
+        self._outlines = _OutlineTree(_organize_outlines(remapped_outlines.values()))
+
+    def patch(self, fp: TextIO, content_format: ContentFormat = "json"):
+        with self.transaction() as transaction:
+            for index, operation in enumerate(read_outline_operations(fp, content_format == "jsonl")):
+                try:
+                    transaction.apply(operation)
+                except AssertionError as e:
+                    raise AssertionError(f"operation {index + 1}: {e}") from e
+
+    def sync(self, fp: TextIO, content_format: ContentFormat = "json") -> dict[str, int]:
+        """
+        Replaces the outlines with content like `load`, but only edits the outlines that differ from it in a single
+        transaction (see `_diff_outlines`). Returns the number of inserted, updated, moved and removed outlines.
+
+        A transaction orders siblings by page, and those on the same page by id, while content can list them in any
+        order, such as after inserting an outline before a sibling on its page or moving an outline past a sibling
+        by editing its page. The content then replaces the edited outlines as a whole, and "reorder" counts the
+        outlines that were out of place, 0 whenever the transaction alone matched the content.
+        """
+        with span("content.read", format=content_format):
+            raw_outlines = _read_jsonl_outlines(fp, self._page_count()) if content_format == "jsonl" else \
+                _read_json_outlines(fp, self._page_count())
+
+        target = _build_outline_tree(raw_outlines)
+        with span("outlines.diff"):
+            operations, changes = _diff_outlines(self._outlines, target)
+
+        if len(operations) > 0:
+            with self.transaction() as transaction:
+                for operation in operations:
+                    transaction.apply(operation)
+
+        layout, target_layout = _outline_layout(self._outlines), _outline_layout(target)
+        reordered = sum(1 for entry, target_entry in zip(layout, target_layout) if entry != target_entry) + \
+            abs(len(layout) - len(target_layout))
+        if reordered > 0:
+            count("outlines.reordered", reordered)
+            self._outlines = target
+
+        return {**changes, "reorder": reordered}
 
-        return dumps(json_obj, indent=2)
+    def jsonify(self):
+        json_buffer = StringIO()
+        self.dump(json_buffer)
+        return json_buffer.getvalue()
 
     def load_from_json(self, json_str: str):
-        next_outline_id = 0
-        raw_outlines: list[Outline] = []
-
-        def build_outlines(json_nodes: list[_JSONOutlineNode], parent_id: Optional[int] = None):
-            nonlocal next_outline_id
-            for json_node in json_nodes:
-                page_num = min(int(json_node.get("page_num")), self._page_manager.count()) - 1
-                next_outline_id = next_outline_id + 1
-                raw_outlines.append(
-                    Outline(
-                        id=next_outline_id,
-                        title=json_node.get("title"),
-                        page_num=page_num,
-                        parent_id=parent_id
-                    )
-                )
-
-                if json_node.get("child_nodes") is not None:
-                    build_outlines(json_node.get("child_nodes"), next_outline_id)
-
-        json_obj: list[_JSONOutlineNode] = loads(json_str)
-        build_outlines(json_obj)
-        self._outlines = _organize_outlines(_process_raw_outlines(raw_outlines))
+        self.load(StringIO(json_str))
 
     def insert(self, title: str, page_num: int, parent_id: Optional[int] = None):
         def increase_outlines_id(_outlines: list[Outline], _additional_value: Optional[int] = 1):
             _new_outlines: list[Outline] = []
-            _outline_ids = [_ol.get("id") for _ol in _outlines]
+            _outline_ids = set([_ol.get("id") for _ol in _outlines])
             for _outline in _outlines:
                 _parent_id_temp = _outline.get("parent_id")
                 _parent_id = _parent_id_temp + _additional_value if \
@@ -209,7 +381,7 @@ class _OutlineManager:
 
             return _new_outlines
 
-        assert 0 < page_num <= self._page_manager.count(), "page number exceeds the document page limit"
+        assert 0 < page_num <= self._page_count(), "page number exceeds the document page limit"
         real_page_num = page_num - 1
         parent = self._find(parent_id) if parent_id is not None else None
         assert (parent is not None and parent_id is not None) or (
@@ -222,11 +394,11 @@ class _OutlineManager:
         greater_page_num_outlines = [outline for outline in self._outlines if outline.get("page_num") > real_page_num]
         new_outline_id_temp = max([0, *[outline.get('id') for outline in smaller_page_num_outlines]]) + 1
         new_outline_id = min([new_outline_id_temp, *[outline.get('id') for outline in greater_page_num_outlines]])
-        self._outlines = _organize_outlines([
+        self._outlines = _OutlineTree(_organize_outlines([
             *smaller_page_num_outlines,
             Outline(id=new_outline_id, title=title, page_num=real_page_num, parent_id=parent_id),
             *increase_outlines_id(greater_page_num_outlines)
-        ])
+        ]))
 
         return self.get(new_outline_id, error_message="inserting outline failed")
 
@@ -235,7 +407,7 @@ class _OutlineManager:
         outline = self._find(outline_id)
         page_num = page_num or outline.get("page_num") + 1
         parent = self._find(parent_id) if parent_id is not None else None
-        assert 0 < page_num <= self._page_manager.count(), "page number exceeds the document page limit"
+        assert 0 < page_num <= self._page_count(), "page number exceeds the document page limit"
         assert outline is not None, "outline id not found"
         assert (parent is not None and parent_id is not None) or (
                 parent is None and parent_id is None), 'parent id not found'
@@ -246,40 +418,24 @@ class _OutlineManager:
 
         outline.update({
             "title": title or outline.get("title"),
-            "page_num": real_page_num,
-            "parent_id": parent_id
+            "page_num": real_page_num
         })
+        self._outlines.reparent(outline_id, parent_id)
 
         return self.get(outline_id, error_message="updating outline failed")
 
     def remove(self, outline_id: int):
-        def remove_outline_helper(_outline_id: int):
-            _outline_ids_to_remove: list[int] = []
-            for _child in [_outline for _outline in self._outlines if _outline_id == _outline.get('parent_id')]:
-                _outline_ids_to_remove = [*_outline_ids_to_remove, *remove_outline_helper(_child.get('id'))]
-
-            _outline_ids_to_remove.append(_outline_id)
-            return _outline_ids_to_remove
-
         removed_outline = self._find(outline_id)
         assert removed_outline is not None, "outline id not found"
-        self._outlines = _organize_outlines([outline for outline in self._outlines if
-                                             outline.get("id") not in remove_outline_helper(outline_id)])
+        for removed_outline_id in [outline_id, *self._outlines.descendants(outline_id)]:
+            self._outlines.discard(removed_outline_id)
+
+        self._outlines = _OutlineTree(_organize_outlines(self._outlines))
 
     def save(self, writer: PdfWriter):
-        created_outlines: list[_CreatedOutline] = []
-        for outline in sorted(self._outlines, key=lambda _: _.get('id')):
+        created_outlines: dict[int, IndirectObject] = {}
+        for outline in self._outlines:
             page_num = outline.get('page_num')
-            assert 0 <= page_num < self._page_manager.count(), "page number exceeds the document page limit"
-            title = outline.get('title')
-            parent_id = outline.get('parent_id')
-            parents = list(
-                filter(
-                    lambda parent_outline: parent_id is not None and parent_outline.get('id') == parent_id,
-                    created_outlines
-                )
-            )
-
-            parent = cast(_CreatedOutline, parents[0]).get('indirect_ref') if len(parents) > 0 else None
-            outline_indirect_ref = writer.add_outline_item(title, page_num, parent)
-            created_outlines.append(_CreatedOutline(**outline, indirect_ref=outline_indirect_ref))
+            assert 0 <= page_num < self._page_count(), "page number exceeds the document page limit"
+            parent = created_outlines.get(self._outlines.effective_parent_id(outline))
+            created_outlines[outline.get('id')] = writer.add_outline_item(outline.get('title'), page_num, parent)
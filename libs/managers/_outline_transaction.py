@@ -0,0 +1,146 @@
+from typing import Optional, Literal, TypedDict, NotRequired, Iterable, TextIO
+from json import loads
+
+from libs.managers._outline_tree import _OutlineTree
+from libs.managers.types import Outline
+
+OutlineOperationType = Literal["insert", "update", "move", "remove"]
+
+
+class OutlineOperation(TypedDict):
+    op: OutlineOperationType
+    id: NotRequired[int]
+    title: NotRequired[Optional[str]]
+    page_num: NotRequired[Optional[int]]
+    parent_id: NotRequired[Optional[int]]
+
+
+class _OutlineTransaction:
+    """
+    A working copy of the outlines that many edits are applied to before they are organized once.
+
+    Ids refer to the outlines as they were when the transaction started, and inserted outlines take the ids after
+    the greatest existing id, in order. Existence, page range and cycle checks happen per operation, while the
+    parent page order is only checked by `outlines`, so the operations can be given in any order.
+    """
+
+    def __init__(self, outlines: _OutlineTree, page_count: int):
+        self._page_count = page_count
+        self._outlines: dict[int, Outline] = {}
+        self._children: dict[Optional[int], set[int]] = {None: set()}
+        for outline in outlines:
+            parent_id = outlines.effective_parent_id(outline)
+            self._outlines[outline.get("id")] = Outline(**{**outline, "parent_id": parent_id})
+            self._children.setdefault(parent_id, set()).add(outline.get("id"))
+
+        self._next_id = max(self._outlines.keys(), default=0) + 1
+        self.operations = 0
+        # the final id of every transaction id, set once the transaction is committed
+        self.ids: dict[int, int] = {}
+
+    def _find(self, outline_id: Optional[int], error_message: str = "outline id not found"):
+        outline = self._outlines.get(outline_id)
+        assert outline is not None, error_message
+        return outline
+
+    def _verify_page_num(self, page_num: int):
+        assert isinstance(page_num, int) and 0 < page_num <= self._page_count, \
+            "page number exceeds the document page limit"
+        return page_num - 1
+
+    def insert(self, title: str, page_num: int, parent_id: Optional[int] = None):
+        assert isinstance(title, str) and len(title.strip()) > 0, "outline title is required"
+        real_page_num = self._verify_page_num(page_num)
+        if parent_id is not None:
+            self._find(parent_id, "parent id not found")
+
+        outline_id = self._next_id
+        self._next_id += 1
+        self._outlines[outline_id] = Outline(id=outline_id, title=title, page_num=real_page_num, parent_id=parent_id)
+        self._children.setdefault(parent_id, set()).add(outline_id)
+        self.operations += 1
+        return outline_id
+
+    def update(self, outline_id: int, title: Optional[str] = None, page_num: Optional[int] = None):
+        outline = self._find(outline_id)
+        assert title is None or isinstance(title, str), "outline title should be a string"
+        assert title is None or len(title.strip()) > 0, "outline title should not be empty"
+        outline.update({
+            "title": title or outline.get("title"),
+            "page_num": self._verify_page_num(page_num) if page_num is not None else outline.get("page_num")
+        })
+        self.operations += 1
+
+    def move(self, outline_id: int, parent_id: Optional[int] = None):
+        outline = self._find(outline_id)
+        ancestor_id = parent_id
+        while ancestor_id is not None:
+            assert ancestor_id != outline_id, "outline cannot be moved under itself or its descendants"
+            ancestor_id = self._find(ancestor_id, "parent id not found").get("parent_id")
+
+        self._children.get(outline.get("parent_id")).discard(outline_id)
+        self._children.setdefault(parent_id, set()).add(outline_id)
+        outline.update({"parent_id": parent_id})
+        self.operations += 1
+
+    def remove(self, outline_id: int):
+        outline = self._find(outline_id)
+        self._children.get(outline.get("parent_id")).discard(outline_id)
+        pending_ids = [outline_id]
+        while len(pending_ids) > 0:
+            removed_id = pending_ids.pop()
+            self._outlines.pop(removed_id)
+            pending_ids.extend(self._children.pop(removed_id, ()))
+
+        self.operations += 1
+
+    def apply(self, operation: OutlineOperation):
+        assert isinstance(operation, dict), "operation should be a JSON object"
+        match operation.get("op"):
+            case "insert":
+                return self.insert(operation.get("title"), operation.get("page_num"), operation.get("parent_id"))
+            case "update":
+                return self.update(operation.get("id"), operation.get("title"), operation.get("page_num"))
+            case "move":
+                return self.move(operation.get("id"), operation.get("parent_id"))
+            case "remove":
+                return self.remove(operation.get("id"))
+            case _:
+                raise AssertionError(f"unsupported operation '{operation.get('op')}'")
+
+    def outlines(self):
+        """
+        The edited outlines renumbered in pre-order (siblings in page order), so every parent has a smaller id than
+        its children as `_organize_outlines` expects. Returns the outlines and the new id of every transaction id.
+        """
+        ordered_outlines: list[Outline] = []
+        ordered_ids: dict[int, int] = {}
+        pending_ids = [sorted(self._children.get(None), key=self._sort_key, reverse=True)]
+        while len(pending_ids) > 0:
+            if len(pending_ids[-1]) == 0:
+                pending_ids.pop()
+                continue
+
+            outline = self._outlines[pending_ids[-1].pop()]
+            parent = self._outlines.get(outline.get("parent_id"))
+            assert parent is None or parent.get("page_num") <= outline.get("page_num"), \
+                f"page number of outline '{outline.get('title')}' should be greater or equal to parent's page number"
+            ordered_ids[outline.get("id")] = len(ordered_outlines) + 1
+            ordered_outlines.append(Outline(**{
+                **outline, "id": len(ordered_outlines) + 1, "parent_id": ordered_ids.get(outline.get("parent_id"))
+            }))
+            pending_ids.append(sorted(self._children.get(outline.get("id"), ()), key=self._sort_key, reverse=True))
+
+        return ordered_outlines, ordered_ids
+
+    def _sort_key(self, outline_id: int):
+        return self._outlines[outline_id].get("page_num"), outline_id
+
+
+def read_outline_operations(fp: TextIO, jsonl: bool = False) -> Iterable[OutlineOperation]:
+    if not jsonl:
+        operations = loads(fp.read())
+        assert isinstance(operations, list), "operations should be a list"
+        return operations
+
+    return (loads(line) for line in fp if len(line.strip()) > 0)
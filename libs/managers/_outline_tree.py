@@ -0,0 +1,83 @@
+from typing import Optional, Iterable
+from bisect import insort
+
+from libs.managers.types import Outline
+
+
+class _OutlineTree:
+    """
+    Outlines indexed by id, with the children of every parent id kept in id order.
+
+    After `_organize_outlines` the ids follow the (page number, id) order, so iterating the tree or the
+    children of a node yields the outlines in page order.
+    """
+
+    def __init__(self, outlines: Iterable[Outline] = ()):
+        self._nodes: dict[int, Outline] = {}
+        self._children: dict[Optional[int], list[int]] = {}
+        self._last_id = 0
+        self._ordered = True
+        for outline in outlines:
+            self.add(outline)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __iter__(self):
+        if not self._ordered:
+            self._nodes = dict(sorted(self._nodes.items()))
+            self._ordered = True
+
+        return iter(self._nodes.values())
+
+    def __contains__(self, outline_id: Optional[int]):
+        return outline_id in self._nodes
+
+    def find(self, outline_id: Optional[int]):
+        return self._nodes.get(outline_id)
+
+    def children(self, parent_id: Optional[int]):
+        return [self._nodes[child_id] for child_id in self._children.get(parent_id, [])]
+
+    def effective_parent_id(self, outline: Outline):
+        """
+        The parent id an outline is attached under when written out: parents always precede their children,
+        so a parent with a greater id (or a missing parent) leaves the outline at the top level.
+        """
+        parent_id = outline.get("parent_id")
+        return parent_id if parent_id is not None and parent_id in self._nodes and parent_id < outline.get(
+            "id") else None
+
+    def descendants(self, outline_id: int):
+        descendant_ids: list[int] = []
+        visited_ids = {outline_id}
+        pending_ids = [outline_id]
+        while len(pending_ids) > 0:
+            for child_id in self._children.get(pending_ids.pop(), []):
+                if child_id not in visited_ids:
+                    visited_ids.add(child_id)
+                    descendant_ids.append(child_id)
+                    pending_ids.append(child_id)
+
+        return descendant_ids
+
+    def add(self, outline: Outline):
+        outline_id = outline.get("id")
+        assert outline_id not in self._nodes, "outline id already exists"
+        self._ordered = self._ordered and outline_id > self._last_id
+        self._last_id = max(self._last_id, outline_id)
+        self._nodes[outline_id] = outline
+        insort(self._children.setdefault(outline.get("parent_id"), []), outline_id)
+
+    def discard(self, outline_id: int):
+        outline = self._nodes.pop(outline_id, None)
+        if outline is not None:
+            self._children.get(outline.get("parent_id")).remove(outline_id)
+
+        return outline
+
+    def reparent(self, outline_id: int, parent_id: Optional[int]):
+        outline = self._nodes[outline_id]
+        self._children.get(outline.get("parent_id")).remove(outline_id)
+        outline.update({"parent_id": parent_id})
+        insort(self._children.setdefault(parent_id, []), outline_id)
@@ -0,0 +1,47 @@
+from typing import Literal
+
+from pypdf import PdfWriter
+from pypdf.generic import StreamObject
+
+from libs.managers.core_profiler import span, count
+
+OptimizeProfile = Literal["none", "fast", "max"]
+
+# compression levels of uncompressed streams per profile
+_COMPRESSION_LEVELS: dict[OptimizeProfile, int] = {"fast": 1, "max": 9}
+# what "/Filter /FlateDecode" adds to a stream dictionary, so compressing tiny streams never grows them
+_FILTER_ENTRY_BYTES = 20
+
+
+def _compress_streams(writer: PdfWriter, level: int):
+    """
+    Flate-compresses every stream without a filter, such as content streams and embedded fonts written
+    uncompressed. Streams that already have a filter are left as they are, since re-encoding them would mean
+    decoding images and other streams with their own encodings.
+    """
+    for index, obj in enumerate(writer._objects):
+        if not isinstance(obj, StreamObject) or "/Filter" in obj:
+            continue
+
+        data = obj.get_data()
+        encoded = obj.flate_encode(level)
+        if len(encoded._data) + _FILTER_ENTRY_BYTES < len(data):
+            encoded.indirect_reference = obj.indirect_reference
+            writer._objects[index] = encoded
+            count("streams.compressed")
+
+
+def _optimize(writer: PdfWriter, profile: OptimizeProfile):
+    """
+    "fast" compresses uncompressed streams at the fastest level. "max" compresses them at the best level, then
+    merges identical objects (fonts and images shared by pages that were embedded once per page) and drops objects
+    nothing refers to anymore.
+    """
+    assert profile in ("none", *_COMPRESSION_LEVELS.keys()), "optimize profile should be none, fast or max"
+    if profile == "none":
+        return
+
+    with span("pdf.optimize", profile=profile):
+        _compress_streams(writer, _COMPRESSION_LEVELS[profile])
+        if profile == "max":
+            writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
@@ -1,37 +1,194 @@
-from typing import Optional, cast, Union, Callable
+from typing import Optional, Callable, TYPE_CHECKING
+from collections import OrderedDict
 from dataclasses import dataclass
+import mmap
+import os
 
-from PIL import Image
 from pypdf import PdfReader, PageObject, PdfWriter
-from pypdfium2 import PdfDocument
 
+from libs.managers.core_profiler import span, count
 
-@dataclass()
+if TYPE_CHECKING:
+    from PIL import Image
+    from pypdfium2 import PdfDocument
+
+_DEFAULT_RENDER_SCALE = 1
+_DEFAULT_RENDER_CACHE_BYTES = 256 * 1024 * 1024
+
+
+@dataclass(eq=False)
 class _Page:
     object: PageObject
-    image: Image
+    document: Callable[[], "PdfDocument"]
+    index: int
+
+
+@dataclass()
+class _RenderCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    bytes: int = 0
+    entries: int = 0
+
+
+def _image_size(image: "Image.Image"):
+    return image.width * image.height * len(image.getbands())
+
+
+def _render_page(pdfium_document: "PdfDocument", index: int, scale: float):
+    return pdfium_document[index].render(scale=scale, optimize_mode='lcd').to_pil()
+
+
+class _RenderCache:
+    def __init__(self, max_bytes: int):
+        assert max_bytes >= 0, "render cache size should not be negative"
+        self._max_bytes = max_bytes
+        self._images: OrderedDict[tuple[_Page, float], "Image.Image"] = OrderedDict()
+        self.stats = _RenderCacheStats()
+
+    def get(self, key: tuple[_Page, float]):
+        image = self._images.get(key)
+        if image is None:
+            self.stats.misses += 1
+            return None
+
+        self.stats.hits += 1
+        self._images.move_to_end(key)
+        return image
+
+    def put(self, key: tuple[_Page, float], image: "Image.Image"):
+        size = _image_size(image)
+        if size > self._max_bytes:
+            return
+
+        self.discard(key)
+        self._images[key] = image
+        self.stats.bytes += size
+        while self.stats.bytes > self._max_bytes:
+            _, evicted_image = self._images.popitem(last=False)
+            self.stats.bytes -= _image_size(evicted_image)
+            self.stats.evictions += 1
+
+        self.stats.entries = len(self._images)
+
+    def discard(self, key: tuple[_Page, float]):
+        image = self._images.pop(key, None)
+        if image is not None:
+            self.stats.bytes -= _image_size(image)
+            self.stats.entries = len(self._images)
+
+    def clear(self):
+        self._images.clear()
+        self.stats.bytes = 0
+        self.stats.entries = 0
+
+
+def parse_page_ranges(page_ranges: Optional[str], page_count: int):
+    """
+    Parses 1-based page ranges such as "1-10,15,20-" into page numbers. Open ranges run to the first or last page,
+    and no ranges select every page.
+    """
+    if page_ranges is None or len(page_ranges.strip()) == 0:
+        return list(range(1, page_count + 1))
+
+    page_nums: list[int] = []
+    for page_range in page_ranges.split(","):
+        start, separator, end = [part.strip() for part in page_range.partition("-")]
+        assert len(start + end) > 0 and all(len(part) == 0 or part.isdigit() for part in (start, end)), \
+            f"invalid page range '{page_range}'"
+        first_page = int(start) if len(start) > 0 else 1
+        last_page = (int(end) if len(end) > 0 else page_count) if separator else first_page
+        assert 0 < first_page <= last_page <= page_count, f"page range '{page_range}' exceeds the document page limit"
+        page_nums.extend(range(first_page, last_page + 1))
+
+    return page_nums
+
+
+class _PageSource:
+    """
+    A memory-mapped PDF file that pages are read from, with its pdfium document opened on first render.
+    """
+
+    def __init__(self, pdf_path: str):
+        pdf_size = os.path.getsize(pdf_path)
+        assert pdf_size > 0, "input file is empty"
+        count("bytes.read", pdf_size)
+        self._pdf_path = pdf_path
+        self._pdf_file = open(pdf_path, "rb")
+        self.buffer = mmap.mmap(self._pdf_file.fileno(), 0, access=mmap.ACCESS_READ)
+        with span("pdf.open"):
+            self.reader = PdfReader(self.buffer)
+
+        self._pdfium_document: Optional["PdfDocument"] = None
+
+    def get_pdfium_document(self):
+        if self._pdfium_document is None:
+            from pypdfium2 import PdfDocument
+
+            with span("pdfium.open"):
+                self._pdfium_document = PdfDocument(self._pdf_path)
+
+        return self._pdfium_document
+
+    def get_pages(self, page_ranges: Optional[str] = None):
+        return [
+            _Page(self.reader.pages[page_num - 1], self.get_pdfium_document, page_num - 1)
+            for page_num in parse_page_ranges(page_ranges, len(self.reader.pages))
+        ]
+
+    def close(self):
+        if self._pdfium_document is not None:
+            self._pdfium_document.close()
+            self._pdfium_document = None
+
+        if not self.buffer.closed:
+            self.buffer.close()
+
+        self._pdf_file.close()
 
 
 class _PageManager:
-    def __init__(self, pdfium_document: PdfDocument, reader: PdfReader):
-        self._lazy_pages: list[Union[Callable[[], _Page], _Page]] = [
-            (lambda page_num:
-             lambda: _Page(reader.pages[page_num],
-                           pdfium_document[page_num].render(scale=1, optimize_mode='lcd').to_pil())
-             )(page_num)
-            for page_num in range(len(reader.pages))
+    def __init__(self, pdfium_document: Callable[[], "PdfDocument"], reader: PdfReader,
+                 render_scale: float = _DEFAULT_RENDER_SCALE,
+                 render_cache_bytes: int = _DEFAULT_RENDER_CACHE_BYTES):
+        self._pages: list[_Page] = [
+            _Page(page, pdfium_document, page_num) for page_num, page in enumerate(reader.pages)
         ]
 
+        self._render_scale = render_scale
+        self._render_cache = _RenderCache(render_cache_bytes)
+
+    @property
+    def render_stats(self):
+        return self._render_cache.stats
+
+    def snapshot(self):
+        return list(self._pages)
+
+    def restore(self, pages: list[_Page]):
+        self._pages = list(pages)
+
     def count(self):
-        return len(self._lazy_pages)
+        return len(self._pages)
 
     def get(self, page_num: int):
         assert 0 < page_num <= self.count(), "page number exceeds the document page limit"
-        real_page_num = page_num - 1
-        if callable(self._lazy_pages[real_page_num]):
-            self._lazy_pages[real_page_num] = self._lazy_pages[real_page_num]()
+        count("pages.touched")
+        return self._pages[page_num - 1]
 
-        return cast(_Page, self._lazy_pages[real_page_num])
+    def render(self, page_num: int, scale: Optional[float] = None):
+        page = self.get(page_num)
+        cache_key = (page, scale or self._render_scale)
+        image = self._render_cache.get(cache_key)
+        if image is None:
+            with span("pages.render", page=page_num):
+                image = _render_page(page.document(), page.index, cache_key[1])
+
+            count("pages.rendered")
+            self._render_cache.put(cache_key, image)
+
+        return image
 
     def move(self, from_page_num: int, to_page_num: int):
         assert 0 < from_page_num <= self.count(), "page number (from) exceeds the document page limit"
@@ -39,21 +196,43 @@ class _PageManager:
         real_from = from_page_num - 1
         real_to = to_page_num - 1
         start_page_num, end_page_num = min(real_from, real_to), max(real_from, real_to)
-        start_page = self._lazy_pages[start_page_num]
+        start_page = self._pages[start_page_num]
         for page_num in range(start_page_num, end_page_num):
-            self._lazy_pages[page_num] = self._lazy_pages[page_num + 1]
+            self._pages[page_num] = self._pages[page_num + 1]
 
-        self._lazy_pages[end_page_num] = start_page
+        self._pages[end_page_num] = start_page
 
     def insert(self, page: _Page, page_num: Optional[int] = None):
         real_page_num = page_num or self.count()
         assert 0 <= real_page_num <= self.count(), "page number exceeds the document page limit"
-        self._lazy_pages.insert(real_page_num, page)
+        self._pages.insert(real_page_num, page)
 
     def remove(self, page_num: int):
         assert 0 < page_num <= self.count(), "page number exceeds the document page limit"
-        del self._lazy_pages[page_num - 1]
+        del self._pages[page_num - 1]
+
+    def permute(self, page_order: list[int | _Page]):
+        """
+        Rebuilds the page order in a single pass. `page_order` lists the current page numbers in their new order,
+        with `_Page` objects for inserted pages; current pages left out are removed. Returns the new page index of
+        every current page index, None for removed pages.
+        """
+        page_map: list[Optional[int]] = [None] * self.count()
+        pages: list[_Page] = []
+        for page in page_order:
+            if isinstance(page, _Page):
+                pages.append(page)
+                continue
+
+            assert 0 < page <= self.count(), "page number exceeds the document page limit"
+            assert page_map[page - 1] is None, "page number should not be repeated"
+            page_map[page - 1] = len(pages)
+            pages.append(self._pages[page - 1])
+
+        assert len(pages) > 0, "document should keep at least one page"
+        self._pages = pages
+        return page_map
 
     def save(self, writer: PdfWriter):
-        for page_num in range(1, self.count() + 1):
-            writer.add_page(self.get(page_num).object)
+        for page in self._pages:
+            writer.add_page(page.object)
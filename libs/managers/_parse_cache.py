@@ -0,0 +1,220 @@
+from typing import Optional, Iterable, TYPE_CHECKING
+from contextlib import contextmanager, closing
+from dataclasses import dataclass
+from hashlib import blake2b
+from json import dumps, loads
+import os
+import time
+import zlib
+
+from libs.managers._heading_detector import _TextLine
+from libs.managers.core_profiler import span, count
+from libs.managers.types import Outline, Metadata
+
+if TYPE_CHECKING:
+    from sqlite3 import Connection
+
+# bump whenever the parsed outlines or the entry layout change, so older entries are never served
+_CACHE_FORMAT = 1
+_CACHE_FILE_NAME = "parse-cache.sqlite3"
+_FINGERPRINT_BYTES = 64 * 1024
+_DEFAULT_PARSE_CACHE_BYTES = 256 * 1024 * 1024
+
+
+@dataclass()
+class _ParseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    bytes: int = 0
+    entries: int = 0
+
+
+@dataclass(frozen=True)
+class _ParseCacheEntry:
+    page_count: int
+    # organized outlines with 0-based page numbers, as kept by `_OutlineManager`
+    outlines: list[Outline]
+    metadata: Metadata
+
+
+def _file_key(path: str):
+    """
+    Size, modification time and a hash of the first and last 64 KiB of the file. PDF updates always rewrite the
+    trailer at the end of the file, so together they tell an unchanged file apart without reading all of it.
+    """
+    stat = os.stat(path)
+    fingerprint = blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        fingerprint.update(f.read(_FINGERPRINT_BYTES))
+        if stat.st_size > _FINGERPRINT_BYTES:
+            f.seek(max(_FINGERPRINT_BYTES, stat.st_size - _FINGERPRINT_BYTES))
+            fingerprint.update(f.read())
+
+    return f"{_CACHE_FORMAT}:{stat.st_size}:{stat.st_mtime_ns}:{fingerprint.hexdigest()}"
+
+
+def _encode_outlines(outlines: list[Outline]):
+    rows = [[ol.get("id"), ol.get("parent_id"), ol.get("page_num"), ol.get("title")] for ol in outlines]
+    return zlib.compress(dumps(rows, ensure_ascii=False, separators=(",", ":")).encode())
+
+
+def _decode_outlines(data: bytes):
+    return [
+        Outline(id=outline_id, title=title, page_num=page_num, parent_id=parent_id)
+        for outline_id, parent_id, page_num, title in loads(zlib.decompress(data))
+    ]
+
+
+def _encode_page_lines(lines: list[_TextLine]):
+    rows = [[ln.get("text"), ln.get("size"), ln.get("weight"), ln.get("top"), ln.get("bottom")] for ln in lines]
+    return zlib.compress(dumps(rows, ensure_ascii=False, separators=(",", ":")).encode())
+
+
+def _decode_page_lines(data: bytes):
+    return [
+        _TextLine(text=text, size=size, weight=weight, top=top, bottom=bottom)
+        for text, size, weight, top, bottom in loads(zlib.decompress(data))
+    ]
+
+
+class _ParseCache:
+    """
+    On-disk LRU cache of parsed documents (page count, organized outlines and metadata) and of the text lines of
+    their pages (see `_read_page_lines`) in a sqlite database, shared by every process pointed at the same
+    directory. Entries are keyed by `_file_key`, and the least recently used documents and pages are evicted once
+    they take more than `max_bytes` together.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = _DEFAULT_PARSE_CACHE_BYTES):
+        assert max_bytes > 0, "parse cache size should be greater than 0"
+        os.makedirs(cache_dir, exist_ok=True)
+        self._path = os.path.join(cache_dir, _CACHE_FILE_NAME)
+        self._max_bytes = max_bytes
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, page_count INTEGER NOT NULL, "
+                "outlines BLOB NOT NULL, metadata TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS page_lines (key TEXT NOT NULL, page_num INTEGER NOT NULL, "
+                "lines BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (key, page_num))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS page_lines_last_used ON page_lines (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        # imported here as most runs have no cache
+        import sqlite3
+
+        # a connection per operation keeps the cache usable from any thread or worker process
+        with closing(sqlite3.connect(self._path, timeout=30)) as connection, connection:
+            yield connection
+
+    @property
+    def stats(self):
+        with self._connect() as connection:
+            entries, size = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM "
+                "(SELECT size FROM entries UNION ALL SELECT size FROM page_lines)"
+            ).fetchone()
+
+        return _ParseCacheStats(self._hits, self._misses, self._evictions, size, entries)
+
+    def key(self, path: str):
+        return _file_key(path)
+
+    def get(self, key: str) -> Optional[_ParseCacheEntry]:
+        with span("cache.get"), self._connect() as connection:
+            row = connection.execute(
+                "SELECT page_count, outlines, metadata FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._misses += 1
+                count("cache.misses")
+                return None
+
+            connection.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._hits += 1
+            count("cache.hits")
+            page_count, outlines, metadata = row
+            return _ParseCacheEntry(page_count, _decode_outlines(outlines), Metadata(**loads(metadata)))
+
+    def put(self, key: str, entry: _ParseCacheEntry):
+        outlines = _encode_outlines(entry.outlines)
+        metadata = dumps(entry.metadata)
+        size = len(key) + len(outlines) + len(metadata)
+        if size > self._max_bytes:
+            return
+
+        with span("cache.put", bytes=size), self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, page_count, outlines, metadata, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, entry.page_count, outlines, metadata, size, time.time())
+            )
+            self._evict(connection, key)
+
+    def _evict(self, connection: "Connection", key: str):
+        """
+        Evicts the least recently used documents and pages other than those of `key` while they take more than
+        `max_bytes`.
+        """
+        total_size = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT size FROM entries UNION ALL SELECT size FROM page_lines)"
+        ).fetchone()[0]
+        evicted_entries: list[tuple[str]] = []
+        evicted_pages: list[tuple[str, int]] = []
+        for evicted_key, page_num, evicted_size, _ in connection.execute(
+                "SELECT key, NULL, size, last_used FROM entries WHERE key != ? "
+                "UNION ALL SELECT key, page_num, size, last_used FROM page_lines WHERE key != ? "
+                "ORDER BY last_used", (key, key)):
+            if total_size <= self._max_bytes:
+                break
+
+            if page_num is None:
+                evicted_entries.append((evicted_key,))
+            else:
+                evicted_pages.append((evicted_key, page_num))
+
+            total_size -= evicted_size
+
+        connection.executemany("DELETE FROM entries WHERE key = ?", evicted_entries)
+        connection.executemany("DELETE FROM page_lines WHERE key = ? AND page_num = ?", evicted_pages)
+        self._evictions += len(evicted_entries) + len(evicted_pages)
+
+    def get_page_lines(self, key: str, page_nums: Iterable[int]):
+        """
+        Returns the cached text lines of the 0-based `page_nums`, by page; pages that are not cached are missing.
+        """
+        page_nums = list(page_nums)
+        page_lines: dict[int, list[_TextLine]] = {}
+        with span("cache.get", pages=len(page_nums)), self._connect() as connection:
+            for page_num, lines in connection.execute(
+                    "SELECT page_num, lines FROM page_lines WHERE key = ?", (key,)):
+                page_lines[page_num] = _decode_page_lines(lines)
+
+            page_lines = {page_num: page_lines[page_num] for page_num in page_nums if page_num in page_lines}
+            connection.execute("UPDATE page_lines SET last_used = ? WHERE key = ?", (time.time(), key))
+
+        self._hits += len(page_lines)
+        self._misses += len(page_nums) - len(page_lines)
+        count("cache.hits", len(page_lines))
+        count("cache.misses", len(page_nums) - len(page_lines))
+        return page_lines
+
+    def put_page_lines(self, key: str, page_lines: dict[int, list[_TextLine]]):
+        rows = [(page_num, _encode_page_lines(lines)) for page_num, lines in page_lines.items()]
+        rows = [(key, page_num, lines, len(key) + len(lines)) for page_num, lines in rows]
+        with span("cache.put", pages=len(rows), bytes=sum(row[3] for row in rows)), self._connect() as connection:
+            now = time.time()
+            connection.executemany(
+                "INSERT OR REPLACE INTO page_lines (key, page_num, lines, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                [(*row, now) for row in rows]
+            )
+            self._evict(connection, key)
@@ -0,0 +1,134 @@
+from typing import BinaryIO, Iterable
+from hashlib import md5
+
+from pypdf import PdfReader
+from pypdf.generic import (
+    ArrayObject,
+    ByteStringObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    NullObject,
+    NumberObject,
+    PdfObject,
+    StreamObject,
+)
+
+from libs.managers._incremental_writer import _ObjectWriter, _write_object, _write_xref_table
+from libs.managers.core_profiler import count
+
+_HEADER = b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n"
+
+
+class _StreamingWriter(_ObjectWriter):
+    """
+    Writes a new document whose pages are copied from other documents one at a time: `add_pages` writes every
+    copied page and the objects it references to the output as soon as they are copied, so only the document being
+    copied from has to be in memory. Outline items and document information are added through the usual `PdfWriter`
+    interface once all pages are written, and `finish` writes them with the page tree, catalog and xref table.
+
+    References to pages that are not copied and to the source catalog become null, and document-level structures
+    of the sources (named destinations, forms, structure trees) are not carried over.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        # 1 and 2 are the catalog and the page tree root, written last
+        super().__init__(3)
+        self._stream = stream
+        self._catalog_reference = IndirectObject(1, 0, self)
+        self._pages_reference = IndirectObject(2, 0, self)
+        self._offsets: dict[IndirectObject, int] = {}
+        stream.write(_HEADER)
+
+    def _new_reference(self):
+        reference = IndirectObject(self._next_id, 0, self)
+        self._next_id += 1
+        return reference
+
+    def add_pages(self, reader: PdfReader, page_nums: Iterable[int]):
+        """
+        Copies the pages of `reader` at the 0-based `page_nums`, in order, and returns the number of copied pages.
+        """
+        assert not reader.is_encrypted, "encrypted documents cannot be copied"
+        copied: dict[tuple[int, int], IndirectObject] = {}
+        pending: list[tuple[IndirectObject, IndirectObject]] = []
+
+        def copy_reference(source_reference: IndirectObject):
+            key = (source_reference.idnum, source_reference.generation)
+            if key not in copied:
+                obj = source_reference.get_object()
+                if isinstance(obj, DictionaryObject) and obj.get("/Type") == "/Pages":
+                    return self._pages_reference
+                if isinstance(obj, DictionaryObject) and obj.get("/Type") in ("/Page", "/Catalog"):
+                    return NullObject()
+
+                copied[key] = self._new_reference()
+                pending.append((source_reference, copied[key]))
+
+            return copied[key]
+
+        def copy_value(value: PdfObject):
+            if isinstance(value, IndirectObject):
+                return copy_reference(value)
+            if isinstance(value, StreamObject):
+                stream = value.__class__()
+                stream._data = value._data
+                stream.update({key: copy_value(value.raw_get(key)) for key in value.keys()})
+                return stream
+            if isinstance(value, DictionaryObject):
+                return DictionaryObject({key: copy_value(value.raw_get(key)) for key in value.keys()})
+            if isinstance(value, ArrayObject):
+                return ArrayObject([copy_value(item) for item in value])
+
+            return value
+
+        pages = [reader.pages[page_num] for page_num in page_nums]
+        for page in pages:
+            copied[(page.indirect_reference.idnum, page.indirect_reference.generation)] = self._new_reference()
+
+        for page in pages:
+            page_reference = copied[(page.indirect_reference.idnum, page.indirect_reference.generation)]
+            copied_page = DictionaryObject({
+                key: copy_value(page.raw_get(key)) for key in page.keys() if key != "/Parent"
+            })
+            copied_page[NameObject("/Parent")] = self._pages_reference
+            self._offsets[page_reference] = _write_object(self._stream, page_reference, copied_page)
+            self._page_references.append(page_reference)
+            while len(pending) > 0:
+                source_reference, reference = pending.pop()
+                self._offsets[reference] = _write_object(
+                    self._stream, reference, copy_value(source_reference.get_object())
+                )
+
+        return len(pages)
+
+    def finish(self):
+        assert len(self._page_references) > 0, "document should have at least one page"
+        self._count_outlines()
+        for reference, obj in self._objects.items():
+            self._offsets[reference] = _write_object(self._stream, reference, obj)
+
+        self._offsets[self._pages_reference] = _write_object(self._stream, self._pages_reference, DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Kids"): ArrayObject(self._page_references),
+            NameObject("/Count"): NumberObject(len(self._page_references)),
+        }))
+        catalog = DictionaryObject({
+            NameObject("/Type"): NameObject("/Catalog"),
+            NameObject("/Pages"): self._pages_reference,
+        })
+        if self._outline_root is not None:
+            catalog[NameObject("/Outlines")] = self._outline_root
+
+        self._offsets[self._catalog_reference] = _write_object(self._stream, self._catalog_reference, catalog)
+        document_id = ByteStringObject(md5(f"{self._next_id}:{self._stream.tell()}".encode()).digest())
+        trailer = DictionaryObject({
+            NameObject("/Size"): NumberObject(self._next_id),
+            NameObject("/Root"): self._catalog_reference,
+            NameObject("/ID"): ArrayObject([document_id, document_id]),
+        })
+        if self._info is not None:
+            trailer[NameObject("/Info")] = self._info
+
+        _write_xref_table(self._stream, self._offsets, trailer)
+        count("bytes.written", self._stream.tell())
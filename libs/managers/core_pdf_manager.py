@@ -1,27 +1,207 @@
-from io import BytesIO
+from typing import Optional
+from dataclasses import dataclass
+from time import perf_counter
+import os
+import re
 
-from pypdf import PdfReader, PdfWriter
-from pypdfium2 import PdfDocument
+from pypdf import PdfWriter
 
-from libs.managers._metadata_manager import _MetadataManager
-from libs.managers._outline_manager import _OutlineManager
-from libs.managers._page_manager import _PageManager
+from libs.managers._incremental_writer import _IncrementalWriter, _find_startxref
+from libs.managers._metadata_manager import _MetadataManager, _read_metadata
+from libs.managers._outline_manager import (
+    _OutlineManager,
+    _read_outline_tree,
+    DeletedPagePolicy,
+)
+from libs.managers._outline_tree import _OutlineTree
+from libs.managers._output_optimizer import OptimizeProfile, _optimize
+from libs.managers._page_manager import (
+    _PageManager,
+    _Page,
+    _PageSource,
+    _DEFAULT_RENDER_SCALE,
+    _DEFAULT_RENDER_CACHE_BYTES,
+)
+from libs.managers._parse_cache import _ParseCache, _ParseCacheEntry
+from libs.managers.core_profiler import span, count
+from libs.managers.types import Outline, Metadata, SaveReport
+
+
+@dataclass(frozen=True)
+class _ManagerSnapshot:
+    pages: list[_Page]
+    outlines: list[Outline]
+    metadata: Metadata
+
+
+def _verify_output(path: str, input_bytes: int):
+    """
+    Reads back the end of an incremental save: the last startxref has to point into the appended update, at a
+    cross-reference table or stream. Parsing the whole output again would take most of the save time of a large
+    document, the `save.incremental` benchmark case checks that instead.
+    """
+    with open(path, "rb") as f:
+        startxref = _find_startxref(f)
+        assert input_bytes < startxref < os.path.getsize(path), "saved document startxref is outside the update"
+        f.seek(startxref)
+        assert re.match(rb"xref|\d+ \d+ obj", f.read(32)) is not None, "saved document startxref is invalid"
 
 
 class CorePdfManager:
-    def __init__(self, pdf_path: str, version: str):
-        with open(pdf_path, "rb") as f:
-            self._pdf_buffer = BytesIO(f.read())
-            self._pdf_reader = PdfReader(self._pdf_buffer)
-            self._pdfium_document = PdfDocument(self._pdf_buffer)
-            self.pages = _PageManager(self._pdfium_document, self._pdf_reader)
-            self.outlines = _OutlineManager(self.pages, self._pdf_reader)
-            self.metadata = _MetadataManager(self._pdf_reader, version)
-
-    def save(self, path: str):
-        writer = PdfWriter()
-        self.pages.save(writer)
-        self.outlines.save(writer)
-        self.metadata.save(writer)
-        with open(path, "wb") as f:
-            writer.write(f)
+    """
+    With a `parse_cache`, the outlines, page count and metadata of a cached document are served from the cache and
+    the PDF itself is only opened once its pages are needed, such as to render or save it.
+    """
+
+    def __init__(self, pdf_path: str, version: str, render_scale: float = _DEFAULT_RENDER_SCALE,
+                 render_cache_bytes: int = _DEFAULT_RENDER_CACHE_BYTES, parse_cache: Optional[_ParseCache] = None):
+        self._pdf_path = pdf_path
+        self._render_scale = render_scale
+        self._render_cache_bytes = render_cache_bytes
+        self._source: Optional[_PageSource] = None
+        self._pages: Optional[_PageManager] = None
+        # documents that inserted pages come from, kept open until the manager is closed
+        self._page_sources: dict[str, _PageSource] = {}
+        cache_key = parse_cache.key(pdf_path) if parse_cache is not None else None
+        cache_entry = parse_cache.get(cache_key) if parse_cache is not None else None
+        if cache_entry is not None:
+            self._cached_page_count = cache_entry.page_count
+            outline_tree = _OutlineTree(cache_entry.outlines)
+            metadata = cache_entry.metadata
+        else:
+            self._cached_page_count = self.pages.count()
+            outline_tree = _read_outline_tree(self._get_source().reader)
+            with span("metadata.load"):
+                metadata = _read_metadata(self._get_source().reader)
+
+            if parse_cache is not None:
+                parse_cache.put(cache_key, _ParseCacheEntry(self._cached_page_count, list(outline_tree), metadata))
+
+        self.outlines = _OutlineManager(self._page_count, outline_tree)
+        self.metadata = _MetadataManager(metadata, version)
+
+    @property
+    def path(self):
+        return self._pdf_path
+
+    def _get_source(self):
+        if self._source is None:
+            self._source = _PageSource(self._pdf_path)
+
+        return self._source
+
+    @property
+    def pages(self):
+        if self._pages is None:
+            with span("pages.load"):
+                self._pages = _PageManager(
+                    self._get_source().get_pdfium_document, self._get_source().reader,
+                    render_scale=self._render_scale, render_cache_bytes=self._render_cache_bytes
+                )
+
+        return self._pages
+
+    def _page_count(self):
+        return self._pages.count() if self._pages is not None else self._cached_page_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def snapshot(self):
+        return _ManagerSnapshot(self.pages.snapshot(), self.outlines.snapshot(), self.metadata.snapshot())
+
+    def restore(self, snapshot: _ManagerSnapshot):
+        self.pages.restore(snapshot.pages)
+        self.outlines.restore(snapshot.outlines)
+        self.metadata.restore(snapshot.metadata)
+
+    def reorder_pages(self, page_order: list[int | _Page], deleted_page_policy: DeletedPagePolicy = "drop"):
+        """
+        Applies a new page order (see `_PageManager.permute`) and moves the outlines along with their pages in the
+        same pass. Outlines on removed pages are handled according to `deleted_page_policy`.
+        """
+        with span("pages.reorder", pages=len(page_order)):
+            page_map = self.pages.permute(page_order)
+            self.outlines.remap_pages(page_map, deleted_page_policy)
+
+    def delete_pages(self, page_nums: list[int], deleted_page_policy: DeletedPagePolicy = "drop"):
+        deleted_page_nums = set(page_nums)
+        self.reorder_pages(
+            [page_num for page_num in range(1, self.pages.count() + 1) if page_num not in deleted_page_nums],
+            deleted_page_policy
+        )
+
+    def insert_pages(self, source_path: str, page_ranges: Optional[str] = None, position: Optional[int] = None):
+        """
+        Inserts pages of another document, all of them unless `page_ranges` is given, after page `position`
+        (0 for the beginning, the end by default).
+        """
+        position = self.pages.count() if position is None else position
+        assert 0 <= position <= self.pages.count(), "insert position exceeds the document page limit"
+        real_source_path = os.path.realpath(source_path)
+        source = self._page_sources.get(real_source_path)
+        if source is None:
+            source = self._page_sources[real_source_path] = _PageSource(source_path)
+
+        current_page_nums = list(range(1, self.pages.count() + 1))
+        self.reorder_pages([
+            *current_page_nums[:position], *source.get_pages(page_ranges), *current_page_nums[position:]
+        ])
+
+    @property
+    def supports_incremental_save(self):
+        return not self._get_source().reader.is_encrypted
+
+    def save(self, path: str, incremental: bool = False, optimize: OptimizeProfile = "none"):
+        assert not incremental or optimize == "none", "incremental save cannot be optimized"
+        started_at = perf_counter()
+        source = self._get_source()
+        writer = _IncrementalWriter(source.reader, source.buffer) if incremental else PdfWriter()
+        with span("pages.save"):
+            self.pages.save(writer)
+
+        with span("outlines.save"):
+            self.outlines.save(writer)
+
+        with span("metadata.save"):
+            self.metadata.save(writer)
+
+        if not incremental:
+            _optimize(writer, optimize)
+
+        input_bytes = os.path.getsize(self._pdf_path)
+        # the pages are read from the memory-mapped input while writing, so the output, which may be the input
+        # itself, is only replaced once it is complete
+        temp_path = f"{path}.part"
+        try:
+            with span("pdf.write", incremental=incremental), open(temp_path, "wb") as f:
+                writer.write(f)
+
+            count("bytes.written", os.path.getsize(temp_path))
+            if incremental:
+                with span("pdf.verify"):
+                    _verify_output(temp_path, input_bytes)
+
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        return SaveReport(
+            optimize=optimize,
+            input_bytes=input_bytes,
+            output_bytes=os.path.getsize(path),
+            elapsed=round(perf_counter() - started_at, 6)
+        )
+
+    def close(self):
+        if self._source is not None:
+            self._source.close()
+
+        for source in self._page_sources.values():
+            source.close()
+
+        self._page_sources.clear()
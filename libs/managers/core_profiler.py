@@ -0,0 +1,178 @@
+from typing import Optional, Callable, Literal, Any
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass
+from json import dumps
+import os
+import threading
+import time
+import tracemalloc
+
+from libs.managers.types import ProfileSpan
+
+ProfileFormat = Literal["json", "chrome"]
+
+_active_profiler: ContextVar[Optional["CoreProfiler"]] = ContextVar("active_profiler", default=None)
+
+
+@dataclass()
+class _OpenSpan:
+    name: str
+    memory_peak_bytes: int = 0
+
+
+class CoreProfiler:
+    """
+    Collects the spans and counters recorded through `span` and `count` while it is active:
+
+        with CoreProfiler(trace_memory=True) as profiler:
+            core.load_pdf(path)
+
+        profiler.report()
+
+    The profiler is bound to the current context, so threads started inside it are not profiled. With
+    `trace_memory`, every span records the tracemalloc peak reached while it was open; tracemalloc is process-wide,
+    so concurrent spans from other threads share those numbers.
+    """
+
+    def __init__(self, trace_memory: bool = False, on_span: Optional[Callable[[ProfileSpan], None]] = None):
+        self._trace_memory = trace_memory
+        self._on_span = on_span
+        self._lock = threading.Lock()
+        self._open_spans = threading.local()
+        self._token = None
+        self._started_tracemalloc = False
+        self._started = 0.0
+        self.elapsed = 0.0
+        self.memory_peak_bytes: Optional[int] = None
+        self.spans: list[ProfileSpan] = []
+        self.counters: dict[str, int] = {}
+
+    def __enter__(self):
+        assert self._token is None, "profiler is already active"
+        if self._trace_memory:
+            self._started_tracemalloc = not tracemalloc.is_tracing()
+            if self._started_tracemalloc:
+                tracemalloc.start()
+
+            self.memory_peak_bytes = 0
+
+        self._started = time.perf_counter()
+        self._token = _active_profiler.set(self)
+        return self
+
+    def __exit__(self, *_):
+        _active_profiler.reset(self._token)
+        self._token = None
+        self.elapsed = time.perf_counter() - self._started
+        if self._trace_memory:
+            self.memory_peak_bytes = max(self.memory_peak_bytes, tracemalloc.get_traced_memory()[1])
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+
+    def _get_open_spans(self) -> list[_OpenSpan]:
+        if not hasattr(self._open_spans, "stack"):
+            self._open_spans.stack = []
+
+        return self._open_spans.stack
+
+    @contextmanager
+    def _span(self, name: str, args: dict[str, Any]):
+        open_spans = self._get_open_spans()
+        if self._trace_memory:
+            # the parent keeps the peak reached so far, so the peak can be reset for this span
+            if len(open_spans) > 0:
+                open_spans[-1].memory_peak_bytes = max(
+                    open_spans[-1].memory_peak_bytes, tracemalloc.get_traced_memory()[1]
+                )
+
+            tracemalloc.reset_peak()
+
+        open_span = _OpenSpan(name)
+        open_spans.append(open_span)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started
+            open_spans.pop()
+            memory_peak = None
+            if self._trace_memory:
+                memory_peak = max(open_span.memory_peak_bytes, tracemalloc.get_traced_memory()[1])
+                if len(open_spans) > 0:
+                    open_spans[-1].memory_peak_bytes = max(open_spans[-1].memory_peak_bytes, memory_peak)
+
+            profile_span = ProfileSpan(
+                name=name,
+                start=round(started - self._started, 6),
+                duration=round(duration, 6),
+                thread_id=threading.get_ident(),
+                depth=len(open_spans),
+                memory_peak_bytes=memory_peak,
+                args=args
+            )
+            with self._lock:
+                self.spans.append(profile_span)
+                if memory_peak is not None:
+                    self.memory_peak_bytes = max(self.memory_peak_bytes, memory_peak)
+
+            if self._on_span is not None:
+                self._on_span(profile_span)
+
+    def _count(self, name: str, value: int):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        phases: dict[str, dict[str, float]] = {}
+        for profile_span in self.spans:
+            phase = phases.setdefault(profile_span.get("name"), {"calls": 0, "duration": 0.0})
+            phase["calls"] += 1
+            phase["duration"] = round(phase["duration"] + profile_span.get("duration"), 6)
+
+        return {
+            "elapsed": round(self.elapsed, 6),
+            "memory_peak_bytes": self.memory_peak_bytes,
+            "counters": dict(self.counters),
+            "phases": phases,
+            "spans": sorted(self.spans, key=lambda _: _.get("start"))
+        }
+
+    def chrome_trace(self):
+        """
+        The profile in the Trace Event Format, which chrome://tracing and Perfetto open directly.
+        """
+        pid = os.getpid()
+        events: list[dict[str, Any]] = [{
+            "name": profile_span.get("name"),
+            "ph": "X",
+            "ts": round(profile_span.get("start") * 1e6, 3),
+            "dur": round(profile_span.get("duration") * 1e6, 3),
+            "pid": pid,
+            "tid": profile_span.get("thread_id"),
+            "args": {**profile_span.get("args"), "memory_peak_bytes": profile_span.get("memory_peak_bytes")}
+        } for profile_span in sorted(self.spans, key=lambda _: _.get("start"))]
+        events.append({
+            "name": "counters",
+            "ph": "C",
+            "ts": round(self.elapsed * 1e6, 3),
+            "pid": pid,
+            "args": dict(self.counters)
+        })
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path: str, profile_format: ProfileFormat = "json"):
+        with open(path, "w") as f:
+            f.write(dumps(self.chrome_trace() if profile_format == "chrome" else self.report(), indent=2) + "\n")
+
+
+def span(name: str, **args: Any):
+    profiler = _active_profiler.get()
+    return profiler._span(name, args) if profiler is not None else nullcontext()
+
+
+def count(name: str, value: int = 1):
+    profiler = _active_profiler.get()
+    if profiler is not None:
+        profiler._count(name, value)
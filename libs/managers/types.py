@@ -1,4 +1,4 @@
-from typing import Optional, TypedDict
+from typing import Optional, TypedDict, Any
 
 
 class Outline(TypedDict):
@@ -18,3 +18,20 @@ class Metadata(TypedDict):
     creation_date: Optional[str]
     mod_date: Optional[str]
     trapped: Optional[str]
+
+
+class ProfileSpan(TypedDict):
+    name: str
+    start: float
+    duration: float
+    thread_id: int
+    depth: int
+    memory_peak_bytes: Optional[int]
+    args: dict[str, Any]
+
+
+class SaveReport(TypedDict):
+    optimize: str
+    input_bytes: int
+    output_bytes: int
+    elapsed: float
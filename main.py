@@ -1,8 +1,15 @@
 from typing import Literal, Optional
+from contextlib import nullcontext
+from json import dumps
+import os
+import signal
+import sys
+import threading
+from time import perf_counter
 
 import click
 
-from libs.core_quick_pdf import CoreQuickPdf
+from libs.managers.core_profiler import CoreProfiler
 
 VERSION = "0.0.1"
 
@@ -19,23 +26,334 @@ def verify_options(options: list[tuple[Option, Optional[str]]]):
         raise click.BadParameter(", ".join([f"'{opt}'" for opt in missing_options]))
 
 
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def run_batch(manifest_path: str, output: Optional[str], workers: Optional[int], max_in_flight: Optional[int],
+              resume: bool, cache_dir: Optional[str], cache_max_bytes: int):
+    from libs.core_batch_runner import CoreBatchRunner, read_manifest
+
+    runner = CoreBatchRunner(VERSION, workers=workers, max_in_flight=max_in_flight, resume=resume,
+                             cache_dir=cache_dir, cache_max_bytes=cache_max_bytes)
+    failed_jobs = 0
+    with open(manifest_path, "r") as manifest, click.open_file(output or "-", "w") as results:
+        for result in runner.run(read_manifest(manifest)):
+            failed_jobs += result.get("status") == "error"
+            results.write(dumps(result) + "\n")
+            results.flush()
+
+    return failed_jobs
+
+
+def run_page_export(file: str, output: str, page_ranges: Optional[str], scale: float, image_format: str,
+                    max_size: Optional[int], prefix: str, workers: Optional[int]):
+    from libs.core_page_exporter import CorePageExporter
+
+    exporter = CorePageExporter(workers=workers)
+    failed_pages = 0
+    exported_pages = 0
+    started_at = perf_counter()
+    for result in exporter.run(file, output, page_ranges=page_ranges, scale=scale, image_format=image_format,
+                               max_size=max_size, prefix=prefix):
+        failed_pages += result.get("status") == "error"
+        exported_pages += result.get("status") == "ok"
+        click.echo(dumps(result))
+
+    elapsed = perf_counter() - started_at
+    click.echo(f"exported {exported_pages} pages in {elapsed:.2f}s ({exported_pages / elapsed:.1f} pages/s)", err=True)
+    return failed_pages
+
+
+def run_merge(sources_path: str, output: str):
+    from libs.core_document_binder import CoreDocumentBinder, read_merge_sources
+
+    with open(sources_path, "r") as f:
+        sources = read_merge_sources(f)
+
+    CoreDocumentBinder(VERSION).merge(sources, output)
+
+
+def run_split(file: str, output: str):
+    from libs.core_document_binder import CoreDocumentBinder
+
+    for part in CoreDocumentBinder(VERSION).split(file, output):
+        click.echo(dumps(part))
+
+
+def run_metadata_export(file: str, output: Optional[str], metadata_format: Optional[str], workers: Optional[int]):
+    from libs.core_metadata_scanner import CoreMetadataScanner, write_metadata_records, infer_metadata_format
+
+    scanner = CoreMetadataScanner(VERSION, workers=workers)
+    with click.open_file(output or "-", "w") as records:
+        return write_metadata_records(scanner.scan([file]), records, infer_metadata_format(output, metadata_format))
+
+
+def run_metadata_update(manifest_path: str, output: Optional[str], metadata_format: Optional[str],
+                        workers: Optional[int]):
+    from libs.core_metadata_scanner import CoreMetadataScanner, read_metadata_updates, infer_metadata_format
+
+    scanner = CoreMetadataScanner(VERSION, workers=workers)
+    failed_updates = 0
+    metadata_format = infer_metadata_format(manifest_path, metadata_format)
+    with open(manifest_path, "r", newline="") as manifest, click.open_file(output or "-", "w") as results:
+        for result in scanner.update(read_metadata_updates(manifest, metadata_format)):
+            failed_updates += result.get("status") == "error"
+            results.write(dumps(result) + "\n")
+            results.flush()
+
+    return failed_updates
+
+
+def run_watch(file: str, content: str, output: str, content_format: Optional[str], optimize: Optional[str],
+              interval: float, cache_dir: Optional[str], cache_max_bytes: int):
+    from libs.core_content_watcher import CoreContentWatcher
+
+    watcher = CoreContentWatcher(VERSION, interval=interval, cache_dir=cache_dir, cache_max_bytes=cache_max_bytes)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    click.echo(f"watching {content}, press Ctrl+C to stop", err=True)
+    try:
+        for cycle in watcher.watch(file, content, output, content_format=content_format, optimize=optimize,
+                                   stop=stop):
+            click.echo(dumps(cycle))
+            if cycle.get("status") == "saved":
+                click.echo(f"cycle {cycle.get('cycle')}: +{cycle.get('inserted')} ~{cycle.get('updated')} "
+                           f">{cycle.get('moved')} -{cycle.get('removed')} outlines, {cycle.get('reordered')} "
+                           f"reordered, saved "
+                           f"{'incrementally ' if cycle.get('incremental') else ''}in {cycle.get('elapsed'):.3f}s",
+                           err=True)
+    except KeyboardInterrupt:
+        pass
+
+
+def run_daemon(socket_path: Optional[str], cache_size: int, max_concurrency: int):
+    from libs.core_daemon import CoreDaemonServer
+
+    daemon = CoreDaemonServer(VERSION, socket_path=socket_path, cache_size=cache_size, max_concurrency=max_concurrency)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=daemon.shutdown).start())
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def try_daemon(socket_path: Optional[str], action: str, file: str, output: str, content: Optional[str],
+               incremental: bool, content_format: Optional[str], optimize: Optional[str] = None):
+    """
+    Returns whether the daemon ran the action, and the daemon's result.
+    """
+    from libs.core_daemon import CoreDaemonClient
+
+    # a single connection attempt, a daemon that is not running costs no more than the failed connect
+    try:
+        result = CoreDaemonClient(socket_path).request(
+            action,
+            file=os.path.abspath(file),
+            output=os.path.abspath(output),
+            content=os.path.abspath(content) if content is not None else None,
+            incremental=incremental,
+            format=content_format,
+            optimize=optimize
+        )
+    except (ConnectionError, FileNotFoundError):
+        return False, None
+    except AssertionError as e:
+        raise click.ClickException(f"daemon: {e}")
+
+    return True, result
+
+
+def create_core(cache_dir: Optional[str], cache_max_bytes: int):
+    from libs.core_quick_pdf import CoreQuickPdf
+
+    return CoreQuickPdf(VERSION, cache_dir=cache_dir, cache_max_bytes=cache_max_bytes)
+
+
+def echo_save_report(save_report: Optional[dict]):
+    if save_report is None:
+        return
+
+    input_bytes, output_bytes = save_report.get("input_bytes"), save_report.get("output_bytes")
+    click.echo(f"optimize={save_report.get('optimize')}: {input_bytes / 1024 / 1024:.2f} MiB -> "
+               f"{output_bytes / 1024 / 1024:.2f} MiB ({output_bytes / input_bytes:.1%} of input) "
+               f"in {save_report.get('elapsed'):.2f}s", err=True)
+
+
 @click.command()
-@click.argument("action", type=click.Choice(["EXPORT-CONTENT", "UPDATE-CONTENT"], case_sensitive=False))
-@click.option("--file", "-f", type=click.Path(exists=True), help="Input file path")
-@click.option("--output", "-o", type=click.Path(exists=False), help="Output file path")
-@click.option("--content", "-c", type=click.Path(exists=True), help="Content JSON file path")
-def cli_app(action, file, output, content):
-    core = CoreQuickPdf(VERSION)
-    match action:
-        case "EXPORT-CONTENT":
-            verify_options([("--file", file), ("--output", output)])
-            core.load_pdf(file)
-            core.export_pdf_content(output)
-        case "UPDATE-CONTENT":
-            verify_options([("--file", file), ("--content", content), ("--output", output)])
-            core.load_pdf(file)
-            core.load_pdf_content(content)
-            core.export_pdf(output)
+@click.argument("action", type=click.Choice(["EXPORT-CONTENT", "UPDATE-CONTENT", "PATCH-CONTENT", "GENERATE-CONTENT",
+                                             "WATCH", "EXPORT-PAGES", "EXPORT-THUMBNAILS", "REORDER-PAGES",
+                                             "DELETE-PAGES", "INSERT-PAGES", "MERGE", "SPLIT", "METADATA-EXPORT",
+                                             "METADATA-UPDATE", "BATCH", "SERVE"], case_sensitive=False))
+@click.option("--file", "-f", type=click.Path(exists=True),
+              help="Input file path (job manifest for BATCH, file or directory to scan for METADATA-EXPORT)")
+@click.option("--output", "-o", type=click.Path(exists=False),
+              help="Output file path (job results for BATCH and METADATA-UPDATE, image directory for "
+                   "EXPORT-PAGES/EXPORT-THUMBNAILS, part directory for SPLIT)")
+@click.option("--content", "-c", type=click.Path(exists=True),
+              help="Content JSON file path (outline operations for PATCH-CONTENT, source list for MERGE, update "
+                   "manifest for METADATA-UPDATE)")
+@click.option("--format", "content_format", type=click.Choice(["json", "jsonl", "csv"], case_sensitive=False),
+              help="Content file format, inferred from the content file extension by default (csv or jsonl for "
+                   "METADATA-EXPORT and METADATA-UPDATE)")
+@click.option("--incremental", is_flag=True, default=False,
+              help="Append the changes to a copy of the input instead of rewriting the whole document")
+@click.option("--optimize", type=click.Choice(["none", "fast", "max"]),
+              help="Output size optimization: fast compresses uncompressed streams, max also merges identical objects "
+                   "and drops unreferenced ones. Reports the input and output size and the save time")
+@click.option("--pages", "page_ranges",
+              help="Pages to export, delete or insert, or the new page order, such as 1-10,15,20- (all pages by "
+                   "default for EXPORT-PAGES, EXPORT-THUMBNAILS and INSERT-PAGES)")
+@click.option("--source", type=click.Path(exists=True), help="PDF file to take INSERT-PAGES pages from")
+@click.option("--position", type=click.IntRange(min=0),
+              help="Page after which INSERT-PAGES inserts, 0 for the beginning (the end by default)")
+@click.option("--deleted-outlines", "deleted_page_policy", type=click.Choice(["drop", "previous", "next"]),
+              default="drop", help="Drop outlines of deleted pages or move them to the previous or next page")
+@click.option("--interval", type=click.FloatRange(min=0, min_open=True), default=0.2,
+              help="How often WATCH checks the content file for changes, in seconds")
+@click.option("--heading-ratio", type=click.FloatRange(min=1), default=1.15,
+              help="Font size, relative to body text, from which GENERATE-CONTENT takes lines as headings")
+@click.option("--heading-levels", type=click.IntRange(min=1), default=3,
+              help="Number of heading styles GENERATE-CONTENT nests, largest first")
+@click.option("--bold-headings/--no-bold-headings", default=True,
+              help="Take bold lines at body text size as the lowest GENERATE-CONTENT headings")
+@click.option("--scale", type=click.FloatRange(min=0, min_open=True), default=1, help="Render scale for EXPORT-PAGES")
+@click.option("--dpi", type=click.IntRange(min=1), help="Render resolution for EXPORT-PAGES, overrides --scale")
+@click.option("--image-format", type=click.Choice(["png", "jpeg", "webp"]), default="png", help="Exported image format")
+@click.option("--thumbnail-size", type=click.IntRange(min=1), default=256,
+              help="Longer side of EXPORT-THUMBNAILS images in pixels")
+@click.option("--workers", "-w", type=click.IntRange(min=1),
+              help="Number of worker processes for BATCH, GENERATE-CONTENT, EXPORT-PAGES, EXPORT-THUMBNAILS, "
+                   "METADATA-EXPORT and METADATA-UPDATE")
+@click.option("--max-in-flight", type=click.IntRange(min=1), help="Maximum number of submitted BATCH jobs")
+@click.option("--resume", is_flag=True, default=False, help="Skip BATCH jobs whose output already exists")
+@click.option("--socket", "socket_path", type=click.Path(), help="Daemon socket path")
+@click.option("--daemon/--no-daemon", default=True, help="Use the SERVE daemon when it is running")
+@click.option("--cache-size", type=click.IntRange(min=1), default=8, help="Number of documents the daemon keeps loaded")
+@click.option("--max-concurrency", type=click.IntRange(min=1), default=4, help="Concurrent daemon requests")
+@click.option("--cache-dir", type=click.Path(file_okay=False), envvar="QUICK_PDF_CACHE_DIR",
+              help="Keep parsed tables of contents in this directory, so unchanged documents are not parsed again")
+@click.option("--cache-limit", type=click.IntRange(min=1), default=256, help="Parse cache size limit in MiB")
+@click.option("--verbose", "-v", is_flag=True, default=False, help="Report resource usage to stderr")
+@click.option("--profile", type=click.Path(), help="Write a per-phase profile of the run to this path")
+@click.option("--profile-format", type=click.Choice(["json", "chrome"]), default="json",
+              help="Profile format, chrome writes a trace for chrome://tracing or Perfetto")
+@click.option("--profile-memory", is_flag=True, default=False, help="Record tracemalloc peaks in the profile")
+def cli_app(action, file, output, content, content_format, incremental, optimize, page_ranges, source, position,
+            deleted_page_policy, interval, heading_ratio, heading_levels, bold_headings, scale, dpi, image_format,
+            thumbnail_size, workers, max_in_flight, resume, socket_path, daemon, cache_size, max_concurrency,
+            cache_dir, cache_limit, verbose, profile, profile_format, profile_memory):
+    # every action imports the modules it needs once it runs, so `--help` and the outline actions never load the
+    # renderer or the process pool machinery, and requests the daemon runs never load the PDF libraries
+    core = None
+    cache_max_bytes = cache_limit * 1024 * 1024
+    failed_jobs = 0
+    save_report = None
+    profiler = CoreProfiler(trace_memory=profile_memory) if profile is not None else None
+    # a profiled run has to happen in this process
+    daemon = daemon and profiler is None
+    if content_format == ("json" if action in ("METADATA-EXPORT", "METADATA-UPDATE") else "csv"):
+        raise click.BadParameter(f"'{content_format}' is not supported by {action}", param_hint="'--format'")
+
+    # incremental saves keep the original page order
+    if incremental and action in ("REORDER-PAGES", "DELETE-PAGES", "INSERT-PAGES"):
+        raise click.BadParameter(f"not supported by {action}", param_hint="'--incremental'")
+
+    # optimization rewrites the whole document, which an incremental save does not
+    if incremental and optimize not in (None, "none"):
+        raise click.BadParameter(f"'{optimize}' cannot be combined with '--incremental'", param_hint="'--optimize'")
+
+    with profiler or nullcontext():
+        match action:
+            case "EXPORT-CONTENT":
+                verify_options([("--file", file), ("--output", output)])
+                if not (daemon and try_daemon(socket_path, action, file, output, content, incremental,
+                                              content_format)[0]):
+                    from libs.core_actions import run_document_action
+
+                    core = create_core(cache_dir, cache_max_bytes)
+                    run_document_action(core, action, file, output, content_format=content_format)
+            case "UPDATE-CONTENT" | "PATCH-CONTENT":
+                verify_options([("--file", file), ("--content", content), ("--output", output)])
+                handled, save_report = try_daemon(socket_path, action, file, output, content, incremental,
+                                                  content_format, optimize) if daemon else (False, None)
+                if not handled:
+                    from libs.core_actions import run_document_action
+
+                    core = create_core(cache_dir, cache_max_bytes)
+                    save_report = run_document_action(core, action, file, output, content=content,
+                                                      incremental=incremental, content_format=content_format,
+                                                      optimize=optimize)
+            case "GENERATE-CONTENT":
+                verify_options([("--file", file), ("--output", output)])
+                from libs.core_actions import run_generate_action
+                from libs.core_heading_detector import HeadingOptions
+
+                core = create_core(cache_dir, cache_max_bytes)
+                options = HeadingOptions(min_size_ratio=heading_ratio, max_levels=heading_levels, bold=bold_headings)
+                save_report = run_generate_action(core, file, output, options, workers, incremental=incremental,
+                                                  content_format=content_format, optimize=optimize)
+            case "WATCH":
+                verify_options([("--file", file), ("--content", content), ("--output", output)])
+                run_watch(file, content, output, content_format, optimize, interval, cache_dir, cache_max_bytes)
+            case "EXPORT-PAGES":
+                verify_options([("--file", file), ("--output", output)])
+                failed_jobs = run_page_export(file, output, page_ranges, dpi / 72 if dpi is not None else scale,
+                                              image_format, None, "page", workers)
+            case "EXPORT-THUMBNAILS":
+                verify_options([("--file", file), ("--output", output)])
+                failed_jobs = run_page_export(file, output, page_ranges, scale, image_format, thumbnail_size,
+                                              "thumbnail", workers)
+            case "REORDER-PAGES" | "DELETE-PAGES" | "INSERT-PAGES":
+                verify_options([("--file", file), ("--output", output)])
+                from libs.core_actions import run_page_action
+
+                core = create_core(cache_dir, cache_max_bytes)
+                save_report = run_page_action(core, action, file, output, page_ranges=page_ranges, source=source,
+                                              position=position, deleted_page_policy=deleted_page_policy,
+                                              incremental=incremental, optimize=optimize)
+            case "MERGE":
+                verify_options([("--content", content), ("--output", output)])
+                run_merge(content, output)
+            case "SPLIT":
+                verify_options([("--file", file), ("--output", output)])
+                run_split(file, output)
+            case "METADATA-EXPORT":
+                verify_options([("--file", file)])
+                failed_jobs = run_metadata_export(file, output, content_format, workers)
+            case "METADATA-UPDATE":
+                verify_options([("--content", content)])
+                failed_jobs = run_metadata_update(content, output, content_format, workers)
+            case "BATCH":
+                verify_options([("--file", file)])
+                failed_jobs = run_batch(file, output, workers, max_in_flight, resume, cache_dir, cache_max_bytes)
+            case "SERVE":
+                run_daemon(socket_path, cache_size, max_concurrency)
+
+        if core is not None:
+            core.close()
+
+    if optimize is not None:
+        echo_save_report(save_report)
+    if profiler is not None:
+        profiler.dump(profile, profile_format)
+    if verbose:
+        peak_rss = peak_rss_bytes()
+        click.echo(f"peak RSS: {peak_rss / 1024 / 1024:.1f} MiB" if peak_rss is not None else "peak RSS: n/a", err=True)
+        cache_stats = core.parse_cache_stats if core is not None else None
+        if cache_stats is not None:
+            click.echo(f"parse cache: {cache_stats.hits} hits, {cache_stats.misses} misses, "
+                       f"{cache_stats.evictions} evictions, {cache_stats.entries} entries "
+                       f"({cache_stats.bytes / 1024 / 1024:.1f} MiB)", err=True)
+
+    if failed_jobs > 0:
+        sys.exit(1)
 
 
 if __name__ == '__main__':